@@ -8,7 +8,7 @@
 
 
 from Bio.Blast import NCBIWWW, NCBIXML
-import re, logging
+import re, logging, bisect, subprocess
 
 
 def enum(*sequential, **named):
@@ -37,7 +37,10 @@ class Gene (object):
     def __init__ (self, idString, geneInfo=""):
         """
         Initiates a Gene object.
-        idString - in the format of gi### or gi|<giNumber>|xxx|<accNumber>
+        idString - in the format of gi### or gi|<giNumber>|xxx|<accNumber>,
+                   or any other sequence ID (e.g. an accession number, as in
+                   the sseqid column of a local BLAST), which is then used
+                   instead of the GI number
         geneInfo - Information about this gene. Any string
         """
         m = self._GENE_INFO_REGEXP1.match(idString)
@@ -45,12 +48,14 @@ class Gene (object):
             m = self._GENE_INFO_REGEXP2.match(idString)
         if m:
             self.gi = long(m.group(1))
-            self._idString = idString
-            self._geneInfo = geneInfo
-            if not geneInfo and self in Gene._GENE_INFO:
-                self._geneInfo = Gene._GENE_INFO[self]
+        elif idString:
+            self.gi = idString
         else:
-            raise Exception('Incorrect input: idString is not match')
+            raise Exception('Incorrect input: idString is empty')
+        self._idString = idString
+        self._geneInfo = geneInfo
+        if not geneInfo and self in Gene._GENE_INFO:
+            self._geneInfo = Gene._GENE_INFO[self]
 
     def __hash__ (self):
         return self.gi.__hash__()
@@ -59,6 +64,8 @@ class Gene (object):
         return self.__hash__() == other.__hash__()
 
     def __repr__ (self):
+        if isinstance(self.gi, basestring):
+            return "Gene(%r)"%self.gi
         return "Gene('gi|%ld')"%self.gi
 
     __str__ = __repr__
@@ -86,6 +93,9 @@ class FusedChannel (dict):
     MAX_OVERLAP = 0 # Maximum allowed overlaps between two genes over the fused
     
     _SEARCH_MODE = enum('NEW_ITER','ITER_ID','END_ITER','HIT_ID')
+    
+    # Local BLAST, used by matchLocal. The binary must write XML (-outfmt 5) to stdout.
+    BLAST_COMMAND = ["blastp", "-outfmt", "5"]
 
     def __init__ (self):
         """
@@ -94,6 +104,7 @@ class FusedChannel (dict):
         dict.__init__(self)
         self._usedGenes = set()
         self._pairs = {} # (original gene, fused gene) => (start_hit, end_hit) 
+        self._intervals = {} # fused gene => sorted list of (start, end, original gene)
         
     def __getitem__ (self, item):
         if item not in self:
@@ -128,21 +139,101 @@ class FusedChannel (dict):
                     print "%d%%"%(percent),
                     last_percentage = percent
 
+    def matchLocal (self, fastaFilename, database=None):
+        """
+        Same as match, but runs a local BLAST (BLAST_COMMAND) over all the
+        sequences in a FASTA file, without using the network.
+        The output is parsed while BLAST is still running.
+        """
+        command = self.BLAST_COMMAND + ["-query", fastaFilename,
+                                        "-evalue", str(self.EVAL_CUTOFF)]
+        if database:
+            command += ["-db", database]
+        logging.info('Running local BLAST: %s'%' '.join(command))
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE)
+        try:
+            self.parseBlastXML(proc.stdout)
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode != 0:
+            logging.error('Local BLAST exited with code %d'%proc.returncode)
+
     def parseBlast (self, stream):
         " Inner method, parses blast stream output "
         xml = NCBIXML.read(stream)
-        currHitter = Gene(xml.query_id, xml.query)
-        # Check whether it's already queried
+        self._addRecord(xml)
+    
+    def parseBlastXML (self, stream):
+        """
+        Parses a BLAST XML output which may contain many queries
+        (e.g. of a local blastp run), one query at a time.
+        """
+        for record in NCBIXML.parse(stream):
+            self._addRecord(record)
+    
+    def parseBlastTabular (self, stream):
+        """
+        Parses a BLAST tabular output (-outfmt 6) line by line. The columns are:
+        qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore
+        As in the XML parser, only the first HSP of every (query, subject) is used.
+        """
+        currHitter = None
+        skip = False
+        nHits = 0
+        for line in stream:
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            hitter = Gene(fields[0])
+            if currHitter is None or hitter.gi != currHitter.gi:
+                if currHitter is not None and not skip:
+                    logging.info('Gene: %s ended with %d results'%(currHitter,nHits))
+                currHitter = hitter
+                nHits = 0
+                skip = not self._startQuery(currHitter)
+            if skip or float(fields[10]) > self.EVAL_CUTOFF:
+                continue
+            currGene = Gene(fields[1])
+            if (currHitter,currGene) in self._pairs:
+                continue
+            self._addHit(currHitter, currGene, int(fields[8]), int(fields[9]))
+            nHits += 1
+        if currHitter is not None and not skip:
+            logging.info('Gene: %s ended with %d results'%(currHitter,nHits))
+    
+    def _startQuery (self, currHitter):
+        " Returns False if this gene was already queried "
         if currHitter in self._usedGenes:
             logging.warning('Duplication in gene %s. Given twice. Abort.'%currHitter)
-        else:
-            self._usedGenes.add(currHitter)
-            for hit in xml.alignments:
-                currGene = Gene(hit.hit_id, hit.hit_def)
-                self[currGene].add(currHitter)
-                hsp = hit.hsps[0]
-                self._pairs[(currHitter,currGene)] = (hsp.sbjct_start,hsp.sbjct_end)
-            logging.info('Gene: %s ended with %d results'%(currHitter,len(xml.alignments)))
+            return False
+        self._usedGenes.add(currHitter)
+        return True
+    
+    def _addRecord (self, xml):
+        " Adds the hits of a single BLAST record "
+        currHitter = Gene(xml.query_id, xml.query)
+        if not self._startQuery(currHitter):
+            return
+        for hit in xml.alignments:
+            currGene = Gene(hit.hit_id, hit.hit_def)
+            hsp = hit.hsps[0]
+            self._addHit(currHitter, currGene, hsp.sbjct_start, hsp.sbjct_end)
+        logging.info('Gene: %s ended with %d results'%(currHitter,len(xml.alignments)))
+    
+    def _addHit (self, currHitter, currGene, start, end):
+        """
+        Stores a hit of currHitter on currGene, keeping the intervals sorted.
+        The hit is kept as given (see getIntervals), but its interval is
+        stored as (min, max), since a hit on the minus strand (e.g. of tblastn)
+        has sbjct_start > sbjct_end while covering the same positions. Without
+        this, getFusedPairs would report two overlapping minus-strand hits as
+        disjoint.
+        """
+        self[currGene].add(currHitter)
+        self._pairs[(currHitter,currGene)] = (start,end)
+        bisect.insort(self._intervals.setdefault(currGene, []),
+                      (min(start,end), max(start,end), currHitter.gi))
     
     def getIntervals (self, fusedGene):
         " Returns the positions of all the hits of the blast "
@@ -178,6 +269,23 @@ class FusedChannel (dict):
         logging.info("Found %d clusters of candidates"%len(cluster))
         return cluster.values()
     
+    @staticmethod
+    def canonicalPair (g1, g2):
+        " Returns the pair of genes ordered by GI number "
+        if g1.gi <= g2.gi:
+            return (g1, g2)
+        return (g2, g1)
+    
+    @staticmethod
+    def canonicalPairs (list_of_pairs):
+        """
+        Returns a set of canonically ordered pairs, which can be passed to
+        hasPair and countAllPairs many times without being converted again.
+        """
+        if isinstance(list_of_pairs, frozenset):
+            return list_of_pairs
+        return frozenset(FusedChannel.canonicalPair(g1, g2) for g1, g2 in list_of_pairs)
+    
     def hasPair (self, gene, list_of_pairs):
         """
         Given list of pairs, the method checks whether exists a pair of genes that where fused
@@ -193,16 +301,34 @@ class FusedChannel (dict):
         Given list of pairs, the method counts all possible pairs of genes that where
         found fused on a given gene are in the list of pairs.
         """
-        gene_list = list(self[gene])
+        pairs = self.canonicalPairs(list_of_pairs)
+        gene_list = sorted(self[gene], key=lambda g: g.gi)
         counter = 0
         for i in range(len(gene_list)):
             for j in range(i+1,len(gene_list)):
-                g1 = gene_list[i]
-                g2 = gene_list[j]
-                if (g1,g2) in list_of_pairs or (g2,g1) in list_of_pairs:
+                if (gene_list[i],gene_list[j]) in pairs:
                     counter += 1
         return counter
     
+    def getFusedPairs (self, gene):
+        """
+        Returns the canonical pairs of genes whose hits on the given gene overlap
+        by at most MAX_OVERLAP.
+        A sweep over the hits sorted by their start: the partners of a hit that
+        ends at e are all the hits starting at e-MAX_OVERLAP or later.
+        """
+        intervals = self._intervals.get(gene, [])
+        starts = [start for start, _, _ in intervals]
+        gis = [gi for _, _, gi in intervals]
+        genes = dict((g.gi, g) for g in self[gene])
+        pairs = set()
+        for start, end, gi in intervals:
+            first = bisect.bisect_left(starts, end - self.MAX_OVERLAP)
+            for other in gis[first:]:
+                if other != gi:
+                    pairs.add(self.canonicalPair(genes[gi], genes[other]))
+        return pairs
+    
     def findAllFusedPairs (self, candidates):
         """
         Return a list of all the pairs that where found fused on genes.
@@ -211,21 +337,12 @@ class FusedChannel (dict):
         pairs = set()
         counter = 0
         for gene in candidates:
-            fused_genes = list(self[gene])
-            intervals = [self._pairs[(g, gene)] for g in fused_genes]
-            for i,first in enumerate(intervals):
-                for j,second in enumerate(intervals[i+1:]):
-                    if (first[1]-second[0]<=self.MAX_OVERLAP) or (second[1]-first[0]<=self.MAX_OVERLAP):
-                        pairs.add((fused_genes[i],fused_genes[j+i+1]))
-                        counter += 1
-        # Remove pairs that apear twice
-        new_pairs = set()
-        for p1,p2 in pairs:
-            if (p2,p1) not in new_pairs and p1!=p2:
-                new_pairs.add((p1,p2))
+            gene_pairs = self.getFusedPairs(gene)
+            counter += len(gene_pairs)
+            pairs.update(gene_pairs)
         logging.info('FindAllFusedPairs: Over %d candidates, found %d pairs in which %d are different'
-                     %(len(candidates), counter, len(new_pairs)))
-        return new_pairs
+                     %(len(candidates), counter, len(pairs)))
+        return pairs
         
 
 
@@ -241,6 +358,10 @@ def examples (number):
     elif number == 3:
         # Example three - GyrA and GyrB in e.coli fused into topoisomerase2 in yeast
         f.match(['GI|172073090','GI|91093601'])
+    elif number == 4:
+        # Example four - Using a local BLAST tabular output (blastp -outfmt 6)
+        f.parseBlastTabular(open('channeling/examples/blastRes.tsv'))
+        print f.findAllFusedPairs(f.getCandidatesForChanneling())
             
         
 if __name__ == '__main__':
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+import unittest
+
+from channeling.fusion import FusedChannel, Gene
+
+# importing channeling changes the working directory to src
+BLAST_TSV = 'channeling/examples/blastRes.tsv'
+
+
+class TestFusedChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.fusion = FusedChannel()
+        self.fusion.parseBlastTabular(open(BLAST_TSV))
+        self.a = Gene('gi|16128001|ref|NP_414548.1|')
+        self.b = Gene('gi|16128002|ref|NP_414549.1|')
+        self.c = Gene('gi|16128003|ref|NP_414550.1|')
+        self.gi_fused = Gene('gi|6319594|ref|NP_009676.1|')
+        self.sp_fused = Gene('sp|P07342|ILV2_YEAST')
+        self.acc_fused = Gene('NP_011234.1')
+
+    def testGene(self):
+        self.assertEqual(16128001L, self.a.gi)
+        self.assertEqual(Gene('gi16128001'), self.a)
+        self.assertEqual('NP_011234.1', self.acc_fused.gi)
+        self.assertEqual("Gene('NP_011234.1')", repr(self.acc_fused))
+
+    def testParseTabular(self):
+        self.assertEqual(set([self.gi_fused, self.sp_fused, self.acc_fused]),
+                         set(self.fusion.keys()))
+        # the hit above EVAL_CUTOFF is ignored
+        self.assertEqual(set([self.a, self.b]), self.fusion[self.gi_fused])
+        self.assertEqual(set([self.a, self.b, self.c]),
+                         self.fusion[self.acc_fused])
+        # only the first HSP of every (query, subject) is used
+        self.assertEqual([(10, 300), (250, 500)],
+                         self.fusion.getIntervals(self.sp_fused))
+
+    def testFusedPairs(self):
+        self.assertEqual(set([(self.a, self.b)]),
+                         self.fusion.getFusedPairs(self.gi_fused))
+        self.assertEqual(set(), self.fusion.getFusedPairs(self.sp_fused))
+        candidates = self.fusion.getCandidatesForChanneling()
+        self.assertEqual(set([self.gi_fused, self.acc_fused]), set(candidates))
+        self.assertEqual(set([(self.a, self.b), (self.b, self.c)]),
+                         self.fusion.findAllFusedPairs(candidates))
+
+    def testMinusStrandHits(self):
+        # a (700-300) overlaps both b (900-500) and c (450-100), while
+        # b and c are disjoint, so only (b, c) is a fused pair
+        self.assertEqual([(450, 100), (700, 300), (900, 500)],
+                         self.fusion.getIntervals(self.acc_fused))
+        self.assertEqual(set([(self.b, self.c)]),
+                         self.fusion.getFusedPairs(self.acc_fused))
+
+
+def Suite():
+    return unittest.makeSuite(TestFusedChannel, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
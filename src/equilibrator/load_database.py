@@ -23,7 +23,12 @@ def main():
     draw_thumbnails = True
     ### uncomment this to make things faster (don't draw compounds):
     #draw_thumbnails = False
-    load_kegg_json.LoadAllKeggData(draw_thumbnails=draw_thumbnails)
+    ### load in a single transaction using bulk inserts:
+    bulk_load = True
+    if bulk_load:
+        load_kegg_json.BulkLoadAllKeggData(draw_thumbnails=draw_thumbnails)
+    else:
+        load_kegg_json.LoadAllKeggData(draw_thumbnails=draw_thumbnails)
     
     logging.info('Loading corrections/additions to KEGG')
     load_additional_data.LoadAdditionalCompoundData()    
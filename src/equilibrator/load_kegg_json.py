@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 
@@ -6,6 +7,8 @@ import gzip
 
 django_utils.SetupDjango()
 
+from django.db import transaction
+from django.db.models import Max
 from gibbs import models
 
 # Cache compounds so we can look them up faster.
@@ -230,12 +233,12 @@ def LoadKeggEnzymes(enzymes_json_filename=ENZYME_FILE):
             if not names:
                 raise KeyError('Common names are required for enzymes (EC) %s.' % ec )
             
-            names = GetOrCreateNames(names)
             reactions = GetReactions(reactions)
             if not reactions:
                 logging.info('Ignoring EC %s since we found no reactions.' % ec)
                 continue
             
+            names = GetOrCreateNames(names)
             substrates = GetCompounds(ed.get('substrates'))
             products = GetCompounds(ed.get('products'))
             cofactors = GetCompounds(ed.get('cofactors'))
@@ -295,5 +298,338 @@ def LoadAllKeggData(draw_thumbnails=True):
     LoadKeggEnzymes()
 
 
+class BulkKeggLoader(object):
+    """Loads the KEGG JSON files with a few bulk INSERTs per table.
+    
+    Existing names, sources, compounds, reactants and reactions are fetched
+    into dictionaries once. New rows are given explicit primary keys so that
+    the many-to-many links can be written directly into the through tables
+    without reading the new rows back. This assumes nothing else writes to
+    the database during the load, so it should be run inside a transaction
+    (see BulkLoadAllKeggData).
+    """
+    
+    CHUNK_SIZE = 500
+    
+    # The field stored along with the ID of every new row for Verify().
+    KEY_FIELDS = {models.CommonName: 'name',
+                  models.Compound: 'kegg_id',
+                  models.Specie: 'kegg_id',
+                  models.SpeciesGroup: 'kegg_id',
+                  models.Reactant: 'compound_id',
+                  models.StoredReaction: 'hash',
+                  models.Enzyme: 'ec',
+                  models.ConservationLaw: 'msg'}
+    
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.names = dict((n.name, n.id) for n in
+                          models.CommonName.objects.only('id', 'name'))
+        self.sources = dict((s.name.strip().lower(), s) for s in
+                            models.ValueSource.objects.all())
+        self.compounds = dict((c.kegg_id, c) for c in
+                              models.Compound.objects.only('id', 'kegg_id'))
+        self.reactants = dict(((r.compound_id, r.coeff), r) for r in
+                              models.Reactant.objects.select_related('compound'))
+        self.reactions = dict(models.StoredReaction.objects.values_list('kegg_id', 'id'))
+        
+        # The (ID, key) or (source ID, target ID) of all new rows, for Verify().
+        self.new_rows = {}
+        self._next_ids = {}
+    
+    def _NextId(self, model):
+        """Returns an unused primary key for a new row of the model."""
+        if model not in self._next_ids:
+            max_id = model.objects.aggregate(Max('id'))['id__max']
+            self._next_ids[model] = (max_id or 0) + 1
+        next_id = self._next_ids[model]
+        self._next_ids[model] = next_id + 1
+        return next_id
+    
+    def _BulkCreate(self, model, objs):
+        """Inserts the rows in chunks and records them for Verify()."""
+        for i in xrange(0, len(objs), self.chunk_size):
+            model.objects.bulk_create(objs[i:i + self.chunk_size])
+        key = self.KEY_FIELDS[model]
+        self.new_rows.setdefault(model, []).extend(
+            (o.id, getattr(o, key)) for o in objs)
+    
+    def _BulkLink(self, model, field_name, pairs):
+        """Inserts (source id, target id) pairs into an M2M through table."""
+        field = model._meta.get_field(field_name)
+        through = field.rel.through
+        source_col = field.m2m_column_name()
+        target_col = field.m2m_reverse_name()
+        links = [through(**{source_col: source_id, target_col: target_id})
+                 for source_id, target_id in pairs]
+        for i in xrange(0, len(links), self.chunk_size):
+            through.objects.bulk_create(links[i:i + self.chunk_size])
+        self.new_rows.setdefault(through, []).extend(pairs)
+    
+    def GetOrCreateNames(self, names_list):
+        """Returns the IDs of the names, creating the missing ones."""
+        new_names = []
+        for name in names_list:
+            if name not in self.names:
+                n = models.CommonName(id=self._NextId(models.CommonName),
+                                      name=name)
+                self.names[name] = n.id
+                new_names.append(n)
+        self._BulkCreate(models.CommonName, new_names)
+        return [self.names[name] for name in names_list]
+    
+    def LoadCompounds(self, kegg_json_filename=COMPOUND_FILE,
+                      draw_thumbnails=True):
+        parsed_json = json.load(gzip.open(kegg_json_filename, 'r'))
+        
+        # Create all the names first, since compounds point to them.
+        all_names = []
+        for cd in parsed_json:
+            all_names.append(cd.get('name'))
+            all_names.extend(cd.get('names', []))
+        self.GetOrCreateNames(filter(None, set(all_names)))
+        
+        compounds, species, groups = [], [], []
+        name_links, group_links, species_links = [], [], []
+        for cd in parsed_json:
+            try:
+                cid = cd['CID']
+                mass = cd.get('mass')
+                if mass is not None:
+                    mass = float(mass)
+                c = models.Compound(id=self._NextId(models.Compound),
+                                    kegg_id=cid,
+                                    formula=cd.get('formula'),
+                                    inchi=cd.get('InChI'),
+                                    mass=mass,
+                                    name_id=self.names[cd['name']],
+                                    group_vector=cd.get('group_vector'))
+                num_electrons = cd.get('num_electrons')
+                if num_electrons is not None:
+                    c.num_electrons = int(num_electrons)
+                if draw_thumbnails:
+                    c.WriteStructureThumbnail()
+                
+                pmaps = cd.get('pmaps')
+                if not pmaps and cd.get('error'):
+                    c.no_dg_explanation = cd.get('error')
+                
+                c_species, c_groups = [], []
+                c_species_links, c_group_links = [], []
+                for pmap in pmaps or []:
+                    source = self.sources.get(
+                        (pmap.get('source') or '').strip().lower())
+                    if source is None:
+                        logging.error('Failed to get source %s',
+                                      pmap.get('source'))
+                        continue
+                    if 'priority' not in pmap or 'species' not in pmap:
+                        logging.error('Malformed pmap field for %s', cid)
+                        continue
+                    
+                    sg = models.SpeciesGroup(id=self._NextId(models.SpeciesGroup),
+                                             kegg_id=cid,
+                                             priority=pmap['priority'],
+                                             formation_energy_source=source)
+                    for sdict in pmap['species']:
+                        specie = models.Specie(id=self._NextId(models.Specie),
+                                               kegg_id=cid,
+                                               number_of_hydrogens=sdict['nH'],
+                                               number_of_mgs=sdict['nMg'],
+                                               net_charge=sdict['z'],
+                                               formation_energy=sdict['dG0_f'])
+                        c_species.append(specie)
+                        c_species_links.append((sg.id, specie.id))
+                    c_groups.append(sg)
+                    c_group_links.append((c.id, sg.id))
+                
+                c_name_links = [(c.id, name_id) for name_id in
+                                set(self.names[n] for n in cd['names'])]
+            except Exception, e:
+                logging.error(e)
+                continue
+            
+            compounds.append(c)
+            species.extend(c_species)
+            groups.extend(c_groups)
+            species_links.extend(c_species_links)
+            group_links.extend(c_group_links)
+            name_links.extend(c_name_links)
+            self.compounds[cid] = c
+        
+        self._BulkCreate(models.Compound, compounds)
+        self._BulkCreate(models.Specie, species)
+        self._BulkCreate(models.SpeciesGroup, groups)
+        self._BulkLink(models.SpeciesGroup, 'species', species_links)
+        self._BulkLink(models.Compound, 'species_groups', group_links)
+        self._BulkLink(models.Compound, 'common_names', name_links)
+    
+    def _GetOrCreateReactant(self, kegg_id, coeff, new_reactants):
+        compound = self.compounds[kegg_id]
+        key = (compound.id, coeff)
+        if key not in self.reactants:
+            r = models.Reactant(id=self._NextId(models.Reactant),
+                                compound=compound, coeff=coeff)
+            self.reactants[key] = r
+            new_reactants.append(r)
+        return self.reactants[key]
+    
+    def LoadReactions(self, reactions_json_filename=REACTION_FILE):
+        parsed_json = json.load(gzip.open(reactions_json_filename))
+        
+        reactions, new_reactants = [], []
+        substrate_links, product_links = [], []
+        for rd in parsed_json:
+            try:
+                rid = rd['RID']
+                substrates = []
+                products = []
+                for coeff, cid in rd['reaction']:
+                    reactant = self._GetOrCreateReactant(cid, abs(coeff),
+                                                         new_reactants)
+                    if coeff < 0:
+                        substrates.append(reactant)
+                    else:
+                        products.append(reactant)
+                
+                rxn = models.StoredReaction(id=self._NextId(models.StoredReaction),
+                                            kegg_id=rid)
+                rxn.hash = models.StoredReaction.HashReaction(substrates, products)
+                substrate_links.extend(set((rxn.id, r.id) for r in substrates))
+                product_links.extend(set((rxn.id, r.id) for r in products))
+                reactions.append(rxn)
+                self.reactions[rid] = rxn.id
+            except Exception, e:
+                logging.warning('Missing data for rid %s', rid)
+                logging.warning(e)
+                continue
+        
+        self._BulkCreate(models.Reactant, new_reactants)
+        self._BulkCreate(models.StoredReaction, reactions)
+        self._BulkLink(models.StoredReaction, 'substrates', substrate_links)
+        self._BulkLink(models.StoredReaction, 'products', product_links)
+    
+    def _GetIds(self, keys, id_map, desc):
+        """Maps keys to IDs, skipping (and logging) the missing ones."""
+        ids = []
+        for key in keys or []:
+            if key in id_map:
+                ids.append(id_map[key])
+            else:
+                logging.warning('Failed to retrieve %s %s', desc, key)
+        return ids
+    
+    def LoadEnzymes(self, enzymes_json_filename=ENZYME_FILE):
+        parsed_json = json.load(gzip.open(enzymes_json_filename))
+        compound_ids = dict((kegg_id, c.id)
+                            for kegg_id, c in self.compounds.iteritems())
+        
+        kept = []
+        for ed in parsed_json:
+            ec = ed.get('EC')
+            if not ec:
+                logging.warning('Encountered an enzyme without an EC number.')
+                continue
+            if not ed.get('names'):
+                logging.warning('Common names are required for enzymes (EC) %s.', ec)
+                continue
+            
+            reactions = self._GetIds(ed.get('reaction_ids'), self.reactions,
+                                     'reaction')
+            if not reactions:
+                logging.info('Ignoring EC %s since we found no reactions.' % ec)
+                continue
+            kept.append((ed, reactions))
+        
+        # Only create the names of the enzymes that are stored.
+        all_names = set()
+        for ed, _ in kept:
+            all_names.update(ed['names'])
+        self.GetOrCreateNames(all_names)
+        
+        enzymes = []
+        links = dict((f, []) for f in ('common_names', 'reactions',
+                                       'substrates', 'products', 'cofactors'))
+        for ed, reactions in kept:
+            enz = models.Enzyme(id=self._NextId(models.Enzyme), ec=ed['EC'])
+            related = {'common_names': [self.names[n] for n in ed['names']],
+                       'reactions': reactions}
+            for side in ('substrates', 'products', 'cofactors'):
+                related[side] = self._GetIds(ed.get(side), compound_ids,
+                                             'compound')
+            for field_name, ids in related.iteritems():
+                links[field_name].extend((enz.id, i) for i in set(ids))
+            enzymes.append(enz)
+        
+        self._BulkCreate(models.Enzyme, enzymes)
+        for field_name, pairs in links.iteritems():
+            self._BulkLink(models.Enzyme, field_name, pairs)
+    
+    def LoadGCNullspace(self, gc_nullspace_filename=GC_NULLSPACE_FILENAME):
+        parsed_json = json.load(gzip.open(gc_nullspace_filename))
+        
+        claws = [models.ConservationLaw(id=self._NextId(models.ConservationLaw),
+                                        msg=rd['msg'],
+                                        reactants=json.dumps(rd['reaction']))
+                 for rd in parsed_json]
+        self._BulkCreate(models.ConservationLaw, claws)
+    
+    @staticmethod
+    def _Checksum(rows):
+        md5 = hashlib.md5()
+        for row in sorted(rows):
+            line = u'\t'.join(unicode(v) for v in row) + u'\n'
+            md5.update(line.encode('utf-8'))
+        return md5.hexdigest()
+    
+    def Verify(self):
+        """Checks the row counts and checksums of all the new rows.
+        
+        Raises:
+            ValueError if some table does not contain exactly the new rows.
+        """
+        for model, rows in self.new_rows.iteritems():
+            if model._meta.auto_created:
+                # An M2M through table.
+                source_col, target_col = [f.attname for f in model._meta.fields
+                                          if f.rel is not None]
+                sources = list(set(source_id for source_id, _ in rows))
+            else:
+                source_col, target_col = 'id', self.KEY_FIELDS[model]
+                sources = [row_id for row_id, _ in rows]
+            
+            stored = []
+            for i in xrange(0, len(sources), self.chunk_size):
+                chunk = sources[i:i + self.chunk_size]
+                query = model.objects.filter(**{source_col + '__in': chunk})
+                stored.extend(query.values_list(source_col, target_col))
+            
+            table = model._meta.db_table
+            if len(stored) != len(rows):
+                raise ValueError('%s: expected %d new rows, found %d' %
+                                 (table, len(rows), len(stored)))
+            if self._Checksum(stored) != self._Checksum(rows):
+                raise ValueError('%s: checksum mismatch' % table)
+            logging.info('Verified %d new rows in %s', len(rows), table)
+    
+    def LoadAll(self, draw_thumbnails=True):
+        self.LoadGCNullspace()
+        self.LoadCompounds(draw_thumbnails=draw_thumbnails)
+        self.LoadReactions()
+        self.LoadEnzymes()
+        self.Verify()
+
+
+@transaction.commit_on_success
+def BulkLoadAllKeggData(draw_thumbnails=True, chunk_size=BulkKeggLoader.CHUNK_SIZE):
+    """Same as LoadAllKeggData, but in a single transaction with bulk inserts.
+    
+    Nothing is written if the verification of the new rows fails.
+    """
+    loader = BulkKeggLoader(chunk_size)
+    loader.LoadAll(draw_thumbnails=draw_thumbnails)
+    return loader
+
+
 if __name__ == '__main__':
     LoadAllKeggData()
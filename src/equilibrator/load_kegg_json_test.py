@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from util import django_utils
+
+django_utils.SetupDjango()
+
+# Use a private in-memory database instead of the real one. This has to
+# happen before django.db is first imported.
+from django.conf import settings
+settings.DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3',
+                                  'NAME': ':memory:'}}
+
+from django.core.management import call_command
+from gibbs import models
+import load_kegg_json
+
+
+COMPOUNDS = [
+    {'CID': 'C00001', 'name': 'H2O', 'names': ['H2O', 'Water'],
+     'formula': 'H2O', 'mass': 18.0, 'num_electrons': 10,
+     'pmaps': [{'priority': 1, 'source': 'Alberty',
+                'species': [{'nH': 2, 'nMg': 0, 'z': 0, 'dG0_f': -237.19}]}]},
+    {'CID': 'C00002', 'name': 'ATP',
+     'names': ['ATP', 'Adenosine triphosphate', 'Water'],
+     'formula': 'C10H16N5O13P3', 'mass': 507.0,
+     'pmaps': [{'priority': 1, 'source': 'Alberty',
+                'species': [{'nH': 12, 'nMg': 0, 'z': -4, 'dG0_f': -2768.1},
+                            {'nH': 13, 'nMg': 0, 'z': -3, 'dG0_f': -2811.48}]},
+               {'priority': 2, 'source': 'Unknown source', 'species': []}]},
+    {'CID': 'C00008', 'name': 'ADP', 'names': ['ADP'], 'error': 'no data'},
+    {'CID': 'C00009', 'name': 'Pi', 'names': ['Orthophosphate', 'Pi']}]
+
+REACTIONS = [
+    {'RID': 'R00086', 'reaction': [[-1, 'C00002'], [-1, 'C00001'],
+                                   [1, 'C00008'], [1, 'C00009']]},
+    # C77777 is not a known compound
+    {'RID': 'R99999', 'reaction': [[-1, 'C00002'], [1, 'C77777']]},
+    {'RID': 'R00001', 'reaction': [[-2, 'C00001'], [1, 'C00009']]}]
+
+ENZYMES = [
+    {'EC': '3.6.1.3', 'names': ['ATPase', 'adenosinetriphosphatase'],
+     'reaction_ids': ['R00086', 'R12345'],
+     'substrates': ['C00002', 'C00001'], 'products': ['C00008', 'C00009'],
+     'cofactors': []},
+    # skipped: no known reactions, no EC number, no names
+    {'EC': '1.1.1.1', 'names': ['ADH'], 'reaction_ids': ['R55555']},
+    {'EC': '', 'names': ['No EC'], 'reaction_ids': ['R00086']},
+    {'EC': '2.7.1.1', 'names': [], 'reaction_ids': ['R00086']}]
+
+NULLSPACE = [{'msg': 'law1', 'reaction': [[1, 'C00001']]}]
+
+
+def DumpTables():
+    """Returns the contents of the tables without the primary keys."""
+    compounds = []
+    for c in models.Compound.objects.order_by('kegg_id'):
+        groups = sorted((sg.priority, sg.formation_energy_source.name,
+                         sorted((s.number_of_hydrogens, s.number_of_mgs,
+                                 s.net_charge, s.formation_energy)
+                                for s in sg.species.all()))
+                        for sg in c.species_groups.all())
+        compounds.append((c.kegg_id, c.formula, c.mass, c.num_electrons,
+                          c.name.name, c.no_dg_explanation,
+                          sorted(n.name for n in c.common_names.all()),
+                          groups))
+
+    reactions = []
+    for r in models.StoredReaction.objects.order_by('kegg_id'):
+        reactions.append((r.kegg_id, r.hash,
+                          sorted((x.compound.kegg_id, x.coeff)
+                                 for x in r.substrates.all()),
+                          sorted((x.compound.kegg_id, x.coeff)
+                                 for x in r.products.all())))
+
+    enzymes = []
+    for e in models.Enzyme.objects.order_by('ec'):
+        enzymes.append((e.ec, sorted(n.name for n in e.common_names.all()),
+                        sorted(r.kegg_id for r in e.reactions.all()),
+                        sorted(c.kegg_id for c in e.substrates.all()),
+                        sorted(c.kegg_id for c in e.products.all()),
+                        sorted(c.kegg_id for c in e.cofactors.all())))
+
+    return {'compounds': compounds,
+            'reactions': reactions,
+            'enzymes': enzymes,
+            'names': sorted(n.name for n in models.CommonName.objects.all()),
+            'reactants': sorted((r.compound.kegg_id, r.coeff) for r in
+                                models.Reactant.objects.all()),
+            'species': models.Specie.objects.count(),
+            'claws': sorted((c.msg, c.reactants) for c in
+                            models.ConservationLaw.objects.all())}
+
+
+class LoadKeggJsonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = {}
+        for name, data in (('compounds', COMPOUNDS),
+                           ('reactions', REACTIONS),
+                           ('enzymes', ENZYMES),
+                           ('nullspace', NULLSPACE)):
+            filename = os.path.join(self.tmpdir, name + '.json.gz')
+            f = gzip.open(filename, 'w')
+            json.dump(data, f)
+            f.close()
+            self.filenames[name] = filename
+
+        call_command('syncdb', interactive=False, verbosity=0)
+        call_command('flush', interactive=False, verbosity=0)
+        models.ValueSource(name='Alberty', year=2003).save()
+        load_kegg_json.CITATIONS_CACHE.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def LoadPerRow(self):
+        load_kegg_json.LoadKeggGCNullspace(self.filenames['nullspace'])
+        load_kegg_json.LoadKeggCompounds(self.filenames['compounds'],
+                                         draw_thumbnails=False)
+        load_kegg_json.LoadKeggReactions(self.filenames['reactions'])
+        load_kegg_json.LoadKeggEnzymes(self.filenames['enzymes'])
+
+    def LoadBulk(self, chunk_size=2):
+        loader = load_kegg_json.BulkKeggLoader(chunk_size)
+        loader.LoadGCNullspace(self.filenames['nullspace'])
+        loader.LoadCompounds(self.filenames['compounds'],
+                             draw_thumbnails=False)
+        loader.LoadReactions(self.filenames['reactions'])
+        loader.LoadEnzymes(self.filenames['enzymes'])
+        return loader
+
+    def testSameTables(self):
+        self.LoadPerRow()
+        expected = DumpTables()
+
+        call_command('flush', interactive=False, verbosity=0)
+        models.ValueSource(name='Alberty', year=2003).save()
+        self.LoadBulk().Verify()
+        self.assertEqual(expected, DumpTables())
+
+    def testSkippedEnzymes(self):
+        self.LoadBulk()
+        self.assertEqual(['3.6.1.3'],
+                         [e.ec for e in models.Enzyme.objects.all()])
+        # no orphan names of the skipped enzymes
+        names = set(n.name for n in models.CommonName.objects.all())
+        self.assertTrue('ATPase' in names)
+        self.assertFalse('ADH' in names)
+        self.assertFalse('No EC' in names)
+
+    def testVerify(self):
+        loader = self.LoadBulk()
+        loader.Verify()
+        models.Enzyme.objects.all().update(ec='9.9.9.9')
+        self.assertRaises(ValueError, loader.Verify)
+
+
+def Suite():
+    return unittest.makeSuite(LoadKeggJsonTest, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
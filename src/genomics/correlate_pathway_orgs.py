@@ -8,7 +8,6 @@ import sys
 
 import numpy as np
 
-from collections import Counter
 from genomics import genome_db
 from genomics import pathway
 from toolbox import color
@@ -37,6 +36,10 @@ def MakeOpts():
                           dest="genome_db_filename",
                           default='../res/genomes.sqlite',
                           help="Genome database filename")
+    opt_parser.add_option("-i", "--ec_index_filename",
+                          dest="ec_index_filename",
+                          default=None,
+                          help="Cached organism EC index filename")
     opt_parser.add_option("-o", "--output_filename",
                           dest="output_filename",
                           help="output annotated and pruned tree")
@@ -127,17 +130,12 @@ def Main():
     db = genome_db.GenomeDB(options.genome_db_filename)
     
     pathway_names = [util.slugify(p.name) for p in pathways]
+    index = db.GetECIndex(options.ec_index_filename)
+    pathway_mat = index.PathwayMatrix(pathways)
     org_2_pathways = {}
-    for path in pathways:
-        org_counts = Counter()
-        for enz_set in path.enzyme_sets:
-            orgs_w_enz = set()
-            for ec in enz_set:
-                orgs_w_enz.update(list(db.OrganismsForEC(ec)))                
-            org_counts += Counter(orgs_w_enz)
-            
-        orgs_w_pathway = [o for o,c in org_counts.iteritems()
-                          if c == len(path.enzyme_sets)]
+    for path, has_pathway in zip(pathways, pathway_mat):
+        orgs_w_pathway = [index.organisms[j]
+                          for j in np.flatnonzero(has_pathway)]
         orgs_w_pathway = filter(None, map(db.KEGG2NCBI, orgs_w_pathway))
         
         for org in orgs_w_pathway:
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+
+import os
+
+import numpy as np
+
+
+class OrganismECIndex(object):
+    """An in-memory index of the EC numbers found in each organism.
+
+    Stores one packed bitset over all organisms per EC number, so that the
+    organisms having a pathway can be found with bitwise operations instead
+    of one SQL query per EC number.
+    """
+
+    def __init__(self, organisms, ecs, bits):
+        """Initialize the index.
+
+        Args:
+            organisms: the list of organism names.
+            ecs: the list of EC numbers.
+            bits: a uint8 array with one row of packed organism bits per EC.
+        """
+        self.organisms = list(organisms)
+        self.ecs = list(ecs)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.ec_to_row = dict((ec, i) for i, ec in enumerate(self.ecs))
+        self.n_bytes = (len(self.organisms) + 7) // 8
+
+    @staticmethod
+    def FromPairs(pairs):
+        """Create the index from (organism, EC) pairs."""
+        pairs = [(org, ec) for org, ec in pairs if org and ec]
+        organisms = sorted(set(org for org, _ in pairs))
+        ecs = sorted(set(ec for _, ec in pairs))
+        org_to_col = dict((org, j) for j, org in enumerate(organisms))
+        ec_to_row = dict((ec, i) for i, ec in enumerate(ecs))
+
+        incidence = np.zeros((len(ecs), len(organisms)), dtype=bool)
+        for org, ec in pairs:
+            incidence[ec_to_row[ec], org_to_col[org]] = True
+        return OrganismECIndex(organisms, ecs, np.packbits(incidence, axis=1))
+
+    @staticmethod
+    def FromGenomeDB(db):
+        """Create the index from a GenomeDB with a single query."""
+        q = db.db.Execute("SELECT organism, EC FROM organism_enzymes")
+        return OrganismECIndex.FromPairs(q)
+
+    @staticmethod
+    def Load(filename):
+        """Load an index written by Save."""
+        data = np.load(filename)
+        return OrganismECIndex(data['organisms'].tolist(),
+                               data['ecs'].tolist(), data['bits'])
+
+    def Save(self, filename):
+        """Write the index to a NumPy .npz file."""
+        f = open(filename, 'wb')
+        np.savez(f, organisms=np.array(self.organisms),
+                 ecs=np.array(self.ecs), bits=self.bits)
+        f.close()
+
+    def _Unpack(self, bits):
+        """Returns a boolean array over organisms from packed bits."""
+        return np.unpackbits(bits, axis=-1)[..., :len(self.organisms)].astype(bool)
+
+    def _ECBits(self, ec):
+        if ec not in self.ec_to_row:
+            return np.zeros(self.n_bytes, dtype=np.uint8)
+        return self.bits[self.ec_to_row[ec]]
+
+    def OrganismsForEC(self, ec):
+        """Returns the list of organisms with this EC number."""
+        mask = self._Unpack(self._ECBits(ec))
+        return [self.organisms[j] for j in np.flatnonzero(mask)]
+
+    def _PathwayBits(self, path):
+        """Returns the packed bits of organisms having every enzyme set
+           (none, if the pathway has no enzyme sets)."""
+        if not path.enzyme_sets:
+            return np.zeros(self.n_bytes, dtype=np.uint8)
+        path_bits = np.empty(self.n_bytes, dtype=np.uint8)
+        path_bits.fill(0xff)
+        for enz_set in path.enzyme_sets:
+            set_bits = np.zeros(self.n_bytes, dtype=np.uint8)
+            for ec in enz_set:
+                set_bits |= self._ECBits(ec)
+            path_bits &= set_bits
+        return path_bits
+
+    def PathwayMatrix(self, pathways):
+        """Computes which organisms have each pathway.
+
+        An organism has a pathway if every enzyme set of the pathway
+        contains at least one of its EC numbers.
+
+        Args:
+            pathways: a list of genomics.pathway.Pathway objects.
+
+        Returns:
+            A boolean array of shape (len(pathways), len(self.organisms)).
+        """
+        bits = np.zeros((len(pathways), self.n_bytes), dtype=np.uint8)
+        for i, path in enumerate(pathways):
+            bits[i, :] = self._PathwayBits(path)
+        return self._Unpack(bits)
+
+    def OrganismsWithPathway(self, path):
+        """Returns the list of organisms having this pathway."""
+        mask = self.PathwayMatrix([path])[0]
+        return [self.organisms[j] for j in np.flatnonzero(mask)]
+
+
+def LoadOrCreateIndex(db, cache_filename=None):
+    """Returns the OrganismECIndex of a GenomeDB.
+
+    Args:
+        db: the GenomeDB.
+        cache_filename: if given, the index is loaded from this file when
+            it exists, and written to it otherwise.
+    """
+    if cache_filename and os.path.exists(cache_filename):
+        return OrganismECIndex.Load(cache_filename)
+
+    index = OrganismECIndex.FromGenomeDB(db)
+    if cache_filename:
+        index.Save(cache_filename)
+    return index
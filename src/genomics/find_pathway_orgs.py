@@ -19,6 +19,10 @@ def MakeOpts():
                           dest="genome_db_filename",
                           default='../res/genomes.sqlite',
                           help="Genome database filename")
+    opt_parser.add_option("-i", "--ec_index_filename",
+                          dest="ec_index_filename",
+                          default=None,
+                          help="Cached organism EC index filename")
     return opt_parser
 
 
@@ -28,20 +32,11 @@ def Main():
     
     pathways = pathway.LoadPathways(options.pathways_filename)
     db = genome_db.GenomeDB(options.genome_db_filename)
+    index = db.GetECIndex(options.ec_index_filename)
+    pathway_mat = index.PathwayMatrix(pathways)
     
-    for path in pathways:
-        org_counts = {}
-        for enz_set in path.enzyme_sets:
-            orgs_w_enz = set()
-            for ec in enz_set:
-                q = db.db.Execute("SELECT organism FROM organism_enzymes WHERE EC='%s'" % ec)
-                orgs_w_enz.update([i[0] for i in q])
-                
-            for org in orgs_w_enz:
-                org_counts[org] = org_counts.get(org, 0) + 1
-        
-        orgs = [o for o,c in org_counts.iteritems()
-                if c == len(path.enzyme_sets)]
+    for path, has_pathway in zip(pathways, pathway_mat):
+        orgs = [index.organisms[j] for j in has_pathway.nonzero()[0]]
         broad_oxygen_reqs = []
         energy_srcs = []
         metabolism = []
@@ -4,6 +4,7 @@ import json
 from toolbox import database
 from toolbox import util
 
+from genomics import ec_index
 from pygibbs.kegg import Kegg
 
 
@@ -41,6 +42,15 @@ class GenomeDB(object):
         for i in q:
             yield i[0]
     
+    def GetECIndex(self, cache_filename=None):
+        """Returns an OrganismECIndex of all the organism enzymes.
+        
+        Args:
+            cache_filename: optional .npz file to load the index from or
+                save it to.
+        """
+        return ec_index.LoadOrCreateIndex(self, cache_filename)
+    
     def KEGG2NCBI(self, kegg_id):
         q = self.db.Execute("SELECT ncbi_taxon_id FROM organisms WHERE kegg_id='%s'" % kegg_id)
         q = list(q)
@@ -1,5 +1,6 @@
 import numpy as np
-import scipy
+
+from scipy import special
 
 
 def ln_stirlings(n):
@@ -11,9 +12,58 @@ def ln_stirling_binomial(n, k):
             - ln_stirlings(n-k))
 
 
-def CalcPValues(count_mat, prob_mat=None, exact=False):
+def CalcPValues(count_mat, prob_mat=None, exact=False, dtype=np.float64):
+    """Calculates p-values for the co-incidence matrix of two variables.
+    
+    The upper binomial tail of every (i,j) position is computed at once
+    with the regularized incomplete beta function:
+    
+    sum_{i > k} ((n choose i) * p^i * (1-p)^(n-i)) = I_p(k+1, n-k)
+    
+    which is stable for very large totals. See CalcPValuesLoop for the
+    term-by-term computation and for the meaning of the p-values.
+    
+    Args:
+        count_mat: matrix with independent variable values on rows, dependents on columns.
+        prob_mat: the matrix with probabilities of each (i,j) point. If None, will
+                  computed according to counts.
+        exact: if True, use CalcPValuesLoop with exact binomial coefficients.
+        dtype: the floating point type of the computation (np.float32 or np.float64).
+    
+    Returns:
+        A matrix with the same shape as mat with a p-value at each i,j position.
+    """
+    if exact:
+        return CalcPValuesLoop(count_mat, prob_mat, exact=True)
+    
+    counts = np.asarray(count_mat, dtype=np.float64)
+    total = np.sum(counts)
+    ceil_total = np.ceil(total)
+    
+    if prob_mat is not None:
+        probs = np.asarray(prob_mat, dtype=np.float64)
+    else:
+        total_ind = np.sum(counts, axis=1)
+        total_dep = np.sum(counts, axis=0)
+        probs = np.outer(total_ind, total_dep) / float(total**2)
+    
+    # The tail starts above the observed count and is empty when the
+    # observed count reaches the total.
+    floor_counts = np.floor(counts)
+    tail = floor_counts < ceil_total
+    a = np.where(tail, floor_counts + 1, 1).astype(dtype)
+    b = np.where(tail, ceil_total - floor_counts, 1).astype(dtype)
+    pvals = special.betainc(a, b, probs.astype(dtype))
+    pvals = np.where(tail, pvals, 0).astype(dtype)
+    return np.matrix(pvals)
+
+
+def CalcPValuesLoop(count_mat, prob_mat=None, exact=False):
     """Calculates p-values for the co-incidence matrix of two variables.
     
+    Reference implementation of CalcPValues, summing the binomial terms of
+    each (i,j) position one by one.
+    
     Computes the probability we would observe a greater (i,j) value in mat
     by randomly sampling from the global distribution of row and column values.
     
@@ -63,7 +113,7 @@ def CalcPValues(count_mat, prob_mat=None, exact=False):
             pvals = []
             floor_count = int(np.floor(observed_count))
             for higher_count in xrange(floor_count+1, ceil_total+1):
-                comb = scipy.comb(ceil_total, higher_count, exact=exact)
+                comb = special.comb(ceil_total, higher_count, exact=exact)
                 # If we can't compute the actual value of the binomial coefficient
                 # then approximate the log using stirlings approximation
                 if not np.isfinite(comb):
@@ -84,7 +134,7 @@ def Test():
                  (18, 7),
                  (91, 32)]
     for n, k in test_vals:
-        print np.log(scipy.comb(n, k))
+        print np.log(special.comb(n, k))
         print ln_stirling_binomial(n, k)
     
     m = np.matrix([[50, 39],
@@ -94,6 +144,7 @@ def Test():
     prob_m = np.matrix([[0.25, 0.25],
                         [0.25, 0.25]])
     print CalcPValues(m, prob_m)
+    print CalcPValuesLoop(m, prob_m)
     
     
 if __name__ == '__main__':
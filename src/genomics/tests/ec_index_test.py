@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+import os
+import tempfile
+import unittest
+
+from genomics import ec_index
+from genomics import pathway
+
+
+class TestOrganismECIndex(unittest.TestCase):
+    
+    def setUp(self):
+        pairs = [('eco', '1.1.1.1'), ('eco', '2.7.1.2'),
+                 ('hsa', '1.1.1.1'), ('hsa', '2.7.1.1'),
+                 ('sce', '2.7.1.1')]
+        self.index = ec_index.OrganismECIndex.FromPairs(pairs)
+        
+        kinase = pathway.EnzymeSet('kinase')
+        kinase.update(['2.7.1.1', '2.7.1.2'])
+        dehydrogenase = pathway.EnzymeSet('dehydrogenase')
+        dehydrogenase.update(['1.1.1.1'])
+        missing = pathway.EnzymeSet('missing')
+        missing.update(['9.9.9.9'])
+        self.pathways = [pathway.Pathway('a', [kinase, dehydrogenase]),
+                         pathway.Pathway('b', [kinase]),
+                         pathway.Pathway('c', [kinase, missing])]
+    
+    def testOrganismsForEC(self):
+        self.assertEquals(['eco', 'hsa'], self.index.OrganismsForEC('1.1.1.1'))
+        self.assertEquals([], self.index.OrganismsForEC('9.9.9.9'))
+    
+    def testPathways(self):
+        mat = self.index.PathwayMatrix(self.pathways)
+        self.assertEquals((3, 3), mat.shape)
+        self.assertEquals(['eco', 'hsa'],
+                          self.index.OrganismsWithPathway(self.pathways[0]))
+        self.assertEquals(['eco', 'hsa', 'sce'],
+                          self.index.OrganismsWithPathway(self.pathways[1]))
+        self.assertFalse(mat[2].any())
+    
+    def testEmptyPathway(self):
+        empty = pathway.Pathway('empty', [])
+        self.assertEquals([], self.index.OrganismsWithPathway(empty))
+        self.assertFalse(self.index.PathwayMatrix([empty]).any())
+    
+    def testSaveLoad(self):
+        fd, filename = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            self.index.Save(filename)
+            loaded = ec_index.OrganismECIndex.Load(filename)
+        finally:
+            os.remove(filename)
+        self.assertEquals(self.index.organisms, loaded.organisms)
+        self.assertEquals(self.index.ecs, loaded.ecs)
+        self.assertTrue((self.index.PathwayMatrix(self.pathways) ==
+                         loaded.PathwayMatrix(self.pathways)).all())
+            
+
+def Suite():
+    suites = (unittest.makeSuite(TestOrganismECIndex,'test'),)
+    return unittest.TestSuite(suites)
+
+
+if __name__ == '__main__':
+    unittest.main()
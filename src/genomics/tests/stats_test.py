@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from genomics import stats
+
+
+class TestCalcPValues(unittest.TestCase):
+    
+    def testMatchesLoop(self):
+        m = np.matrix([[50, 39],
+                       [66, 5]])
+        prob_m = np.matrix([[0.25, 0.25],
+                            [0.25, 0.25]])
+        for probs in (None, prob_m):
+            expected = stats.CalcPValuesLoop(m, probs)
+            actual = stats.CalcPValues(m, probs)
+            self.assertEqual(expected.shape, actual.shape)
+            self.assertTrue(np.allclose(expected, actual, rtol=1e-9))
+    
+    def testFloat32(self):
+        m = np.matrix([[50, 39],
+                       [66, 5]])
+        pvals = stats.CalcPValues(m, dtype=np.float32)
+        self.assertEqual(pvals.dtype, np.float32)
+        self.assertTrue(np.allclose(pvals, stats.CalcPValues(m), rtol=1e-4))
+    
+    def testLargeTotals(self):
+        m = np.matrix([[5e6, 3e6],
+                       [1e6, 2e6]])
+        pvals = stats.CalcPValues(m)
+        self.assertTrue(np.isfinite(pvals).all())
+        self.assertTrue((pvals >= 0).all() and (pvals <= 1).all())
+        # The first cell is far above its expectation of 4.4e6 and the
+        # second far below its expectation of 3.6e6.
+        self.assertTrue(pvals[0, 0] < 1e-6)
+        self.assertTrue(pvals[0, 1] > 0.99)
+    
+    def testFullCount(self):
+        # No more extreme value than the total exists.
+        pvals = stats.CalcPValues(np.matrix([[10, 0]]))
+        self.assertEqual(pvals[0, 0], 0)
+            
+
+def Suite():
+    suites = (unittest.makeSuite(TestCalcPValues,'test'),)
+    return unittest.TestSuite(suites)
+
+
+if __name__ == '__main__':
+    unittest.main()
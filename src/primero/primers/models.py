@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models, transaction, IntegrityError
 from math import floor
 
 # Create your models here.
@@ -28,7 +28,9 @@ class Primer(models.Model):
     seq = models.CharField(max_length=100)
     #order= models.ForeignKey(Order)
     comment = models.CharField(max_length=100)
-    loc_id = models.IntegerField(max_length=10)
+    # syncdb does not add the unique index to an existing table, run
+    # scripts/add_loc_id_index.py on those
+    loc_id = models.IntegerField(max_length=10, unique=True)
     
     def __unicode__(self):
         return self.name
@@ -48,15 +50,99 @@ class Primer(models.Model):
     
     @staticmethod
     def GetNextAvailableLocID():
-        existing_primers = Primer.objects.all()
-        set_of_ids = set()
-        for primer in existing_primers:
-            set_of_ids.add(primer.loc_id)
-        if len(set_of_ids) == 0:
-            return 0
-        else:
-            all_ints_in_range = set(range(1, max(set_of_ids) + 2))
-            available_ids = all_ints_in_range.difference(set_of_ids)
-            return min(available_ids)
-
-    
\ No newline at end of file
+        return Primer.GetAvailableLocIDs(1)[0]
+    
+    @staticmethod
+    def _FindGaps(min_length, limit):
+        """
+            Returns up to 'limit' (start, next_used) pairs of the free ranges
+            of loc_ids after existing primers, sorted by start, keeping only
+            ranges with at least min_length free slots. next_used is None for
+            the range after the last primer.
+            
+            A single query walks the primers in loc_id order and keeps those
+            that have no other primer in the next min_length loc_ids. Both
+            the join and the next_used subquery are range lookups on the
+            unique index, and the walk stops after 'limit' gaps, so the cost
+            grows with the number of primers before the returned gaps, not
+            with the size of the whole table.
+        """
+        table = connection.ops.quote_name(Primer._meta.db_table)
+        query = """
+            SELECT p.loc_id + 1,
+                   (SELECT MIN(q.loc_id) FROM %(t)s q WHERE q.loc_id > p.loc_id)
+            FROM %(t)s p
+            LEFT JOIN %(t)s r
+                ON r.loc_id BETWEEN p.loc_id + 1 AND p.loc_id + %%s
+            WHERE r.loc_id IS NULL
+            ORDER BY p.loc_id
+            LIMIT %%s""" % {'t': table}
+        cursor = connection.cursor()
+        cursor.execute(query, [min_length, limit])
+        return [tuple(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def GetAvailableLocIDs(n, contiguous=False):
+        """
+            Returns the n lowest free loc_ids, starting from 1 (or from 0 if
+            there are no primers at all).
+            If contiguous is True, returns the first n consecutive free loc_ids.
+        """
+        used = Primer.objects.aggregate(models.Min('loc_id'))['loc_id__min']
+        if used is None:
+            return range(n)
+        
+        loc_ids = []
+        if used > 1:
+            # the free range before the first primer
+            if not contiguous or used - 1 >= n:
+                loc_ids += range(1, min(used, n + 1))
+        
+        if len(loc_ids) < n:
+            gaps = Primer._FindGaps(min_length=(n if contiguous else 1),
+                                    limit=(1 if contiguous else n))
+            for start, next_used in gaps:
+                start = max(start, 1)
+                end = start + n if next_used is None else next_used
+                loc_ids += range(start, min(end, start + n - len(loc_ids)))
+                if len(loc_ids) >= n:
+                    break
+        return loc_ids[:n]
+    
+    @staticmethod
+    @transaction.commit_manually
+    def StoreInAvailableLocations(names_and_seqs, contiguous=False, max_attempts=10):
+        """
+            Stores new primers in the lowest free locations, in one transaction
+            per attempt.
+            
+            If a concurrent request takes one of the locations first, the unique
+            index on loc_id makes the save fail. The transaction is then rolled
+            back and the allocation is retried in a new one, so that it sees the
+            locations committed in the meantime (at REPEATABLE READ, retrying in
+            the same transaction would read the same free locations again).
+            
+            Returns:
+                The list of new Primer objects.
+        """
+        for _ in xrange(max_attempts):
+            try:
+                loc_ids = Primer.GetAvailableLocIDs(len(names_and_seqs), contiguous)
+                primers = []
+                for (name, seq), loc_id in zip(names_and_seqs, loc_ids):
+                    box, row, col = Primer.LocID2BoxRowCol(loc_id)
+                    primer = Primer(name=name, seq=seq,
+                                    comment='', box=box, row=row, col=col,
+                                    loc_id=loc_id)
+                    primer.save()
+                    primers.append(primer)
+            except IntegrityError:
+                transaction.rollback()
+                continue
+            except:
+                transaction.rollback()
+                raise
+            transaction.commit()
+            return primers
+        raise IntegrityError('Could not allocate %d primer locations' %
+                             len(names_and_seqs))
@@ -5,7 +5,9 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+
+from primers.models import Primer
 
 
 class SimpleTest(TestCase):
@@ -14,3 +16,74 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class AvailableLocationsTest(TestCase):
+    
+    def AddPrimers(self, loc_ids):
+        for loc_id in loc_ids:
+            box, row, col = Primer.LocID2BoxRowCol(loc_id)
+            Primer.objects.create(name='p%d' % loc_id, seq='ACGT', comment='',
+                                  box=box, row=row, col=col, loc_id=loc_id)
+    
+    def testEmpty(self):
+        self.assertEqual([], list(Primer._FindGaps(min_length=1, limit=5)))
+        self.assertEqual(0, Primer.GetNextAvailableLocID())
+        self.assertEqual([0, 1, 2], Primer.GetAvailableLocIDs(3))
+        self.assertEqual([0, 1, 2], Primer.GetAvailableLocIDs(3, contiguous=True))
+    
+    def testContiguous(self):
+        self.AddPrimers(range(1, 6))
+        self.assertEqual([(6, None)], list(Primer._FindGaps(min_length=1, limit=5)))
+        self.assertEqual(6, Primer.GetNextAvailableLocID())
+        self.assertEqual([6, 7], Primer.GetAvailableLocIDs(2))
+        self.assertEqual([6, 7], Primer.GetAvailableLocIDs(2, contiguous=True))
+    
+    def testHoles(self):
+        self.AddPrimers([4, 5, 7, 8, 11])
+        self.assertEqual([(6, 7), (9, 11), (12, None)],
+                         list(Primer._FindGaps(min_length=1, limit=5)))
+        self.assertEqual([(9, 11), (12, None)],
+                         list(Primer._FindGaps(min_length=2, limit=5)))
+        self.assertEqual([(6, 7)], list(Primer._FindGaps(min_length=1, limit=1)))
+        
+        self.assertEqual(1, Primer.GetNextAvailableLocID())
+        self.assertEqual([1, 2, 3, 6, 9, 10, 12], Primer.GetAvailableLocIDs(7))
+        self.assertEqual([1, 2, 3], Primer.GetAvailableLocIDs(3, contiguous=True))
+        self.assertEqual([12, 13, 14, 15],
+                         Primer.GetAvailableLocIDs(4, contiguous=True))
+    
+    def testStore(self):
+        self.AddPrimers([1, 3])
+        primers = Primer.StoreInAvailableLocations([('a', 'AC'), ('b', 'GT')])
+        self.assertEqual([2, 4], [p.loc_id for p in primers])
+        self.assertEqual((1, 'A', 5), (primers[1].box, primers[1].row,
+                                       primers[1].col))
+        self.assertEqual(4, Primer.objects.count())
+
+
+class StoreRetryTest(TransactionTestCase):
+    
+    def testRetry(self):
+        box, row, col = Primer.LocID2BoxRowCol(1)
+        Primer.objects.create(name='taken', seq='ACGT', comment='',
+                              box=box, row=row, col=col, loc_id=1)
+        
+        # the first attempt sees a stale list of free locations
+        GetAvailableLocIDs = Primer.GetAvailableLocIDs
+        attempts = []
+        def StaleFirst(n, contiguous=False):
+            attempts.append(n)
+            if len(attempts) == 1:
+                return [1] + GetAvailableLocIDs(n, contiguous)[:n - 1]
+            return GetAvailableLocIDs(n, contiguous)
+        Primer.GetAvailableLocIDs = staticmethod(StaleFirst)
+        try:
+            primers = Primer.StoreInAvailableLocations([('a', 'AC'), ('b', 'GT')])
+        finally:
+            Primer.GetAvailableLocIDs = staticmethod(GetAvailableLocIDs)
+        
+        self.assertEqual(2, len(attempts))
+        self.assertEqual([2, 3], [p.loc_id for p in primers])
+        self.assertEqual([1, 2, 3], sorted(Primer.objects.values_list('loc_id',
+                                                                      flat=True)))
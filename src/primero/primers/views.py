@@ -86,6 +86,8 @@ def update_location(request):
         if primer.col < 1 or primer.col > 9:
             return error("Column out of range: %d" % primer.col)
         primer.loc_id = Primer.BoxRowCol2LocID(primer.box, primer.row, primer.col)
+        if Primer.objects.filter(loc_id=primer.loc_id).exclude(id=primer.id).exists():
+            return error("Location already taken: %d%s%d" % (primer.box, primer.row, primer.col))
         primer.save()
         #return render_to_response('updated.html',
         #    {'primers_list': primers_list, 'query': query})
@@ -108,20 +110,10 @@ def update_pending(request):
             pending.delete()
         return HttpResponseRedirect('../pending/')
     elif 'Submit' in request.POST:
-        updated_list = []
+        names_and_seqs = [(pending.name, pending.seq) for pending in pending_list]
+        updated_list = Primer.StoreInAvailableLocations(names_and_seqs)
         for pending in pending_list:
-            name = pending.name
-            seq = pending.seq
             pending.delete()
-            
-            loc_id = Primer.GetNextAvailableLocID()
-            # find plate, row, col
-            box, row, col = Primer.LocID2BoxRowCol(loc_id)
-            entry = Primer(name=name, seq=seq,
-                           comment='', box=box, row=row, col=col,
-                           loc_id=loc_id)
-            entry.save()
-            updated_list.append(entry)
         return render_to_response('updated.html', {'primers_list': updated_list})
     
     return error("Unknown Request")
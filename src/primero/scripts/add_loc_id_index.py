@@ -0,0 +1,33 @@
+"""
+    Adds the unique index on primers_primer.loc_id to an existing database.
+
+    syncdb only creates it for new tables, and Primer.StoreInAvailableLocations
+    relies on it to detect concurrent allocations of the same location. The
+    index cannot be created while two primers share a location, so those are
+    listed instead and must be moved (or deleted) first.
+"""
+
+from toolbox.database import MySQLDatabase
+
+def FindDuplicateLocIDs(db):
+    return db.Execute("SELECT loc_id, GROUP_CONCAT(id ORDER BY id) "
+                      "FROM primers_primer GROUP BY loc_id "
+                      "HAVING COUNT(*) > 1 ORDER BY loc_id")
+
+def AddLocIDIndex(db):
+    duplicates = FindDuplicateLocIDs(db)
+    if duplicates:
+        print "Cannot add the index, these locations hold more than one primer:"
+        for loc_id, primer_ids in duplicates:
+            print "\tloc_id %s: primer IDs %s" % (loc_id, primer_ids)
+        return False
+
+    # the name syncdb gives to the index of a unique=True field
+    db.Execute("CREATE UNIQUE INDEX loc_id ON primers_primer (loc_id)")
+    db.Commit()
+    return True
+
+if __name__ == "__main__":
+    db = MySQLDatabase(host='132.77.80.238', user='ronm',
+                       passwd='a1a1a1', db='primero')
+    AddLocIDIndex(db)
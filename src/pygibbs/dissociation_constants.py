@@ -1,4 +1,4 @@
-import csv, logging, sys, time, threading
+import csv, logging, sys
 from pygibbs.kegg import Kegg
 from toolbox.database import SqliteDatabase
 from pygibbs.thermodynamic_constants import R, default_T, dG0_f_Mg, debye_huckel,\
@@ -9,9 +9,10 @@ from pygibbs.pseudoisomer import PseudoisomerMap
 from pygibbs.pseudoisomers_data import PseudoisomerEntry
 from pygibbs.kegg_errors import KeggParseException
 from optparse import OptionParser
-from toolbox.molecule import OpenBabelError
+from toolbox.molecule import OpenBabelError, Molecule
 from pygibbs.nist import Nist
 from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
+from toolbox.pka_pipeline import PkaCache, PkaPipeline
 
 class MissingDissociationConstantError(Exception):
     
@@ -835,49 +836,6 @@ class DissociationTable(object):
 
 ###############################################################################
 
-class DissociationThreads(threading.Thread):
-    
-    def __init__(self, group=None, target=None, name=None, args=(), kwargs={}):
-        """
-            args should contain (cid, smiles, semaphore)
-        """
-        threading.Thread.__init__(self, group, target, name, args, kwargs)
-        self.cid, self.smiles, self.semaphore, self.db_lock, self.options = args
-    
-    def run(self):
-        from toolbox.molecule import Molecule
-        
-        self.semaphore.acquire()
-        
-        start_time = time.time()
-
-        logging.debug("SMILES: " + self.smiles)
-        diss_table = Molecule._GetDissociationTable(self.smiles, fmt='smiles',
-            mid_pH=default_pH, min_pKa=0, max_pKa=14, T=default_T)
-        logging.debug("Min charge: %d" % diss_table.min_charge)
-        logging.debug("Min nH: %d" % diss_table.min_nH)
-        
-        elapsed_time = time.time() - start_time
-        self.db_lock.acquire()
-        db = SqliteDatabase(self.options.db_file)
-        kegg = Kegg.getInstance()
-        name = kegg.cid2name(self.cid)
-        
-        if diss_table is not None:
-            for row in diss_table.ToDatabaseRow():
-                db.Insert(self.options.table_name, [self.cid, name] + row)
-        else:
-            db.Insert(self.options.table_name, [self.cid, name] + [None] * 10)
-        del db
-        self.db_lock.release()
-
-        logging.info("Completed C%05d, elapsed time = %.1f sec" %
-                     (self.cid, elapsed_time))
-
-        self.semaphore.release()
-
-###############################################################################
-
 def MakeOpts():
     """Returns an OptionParser object with all the default options."""
     opt_parser = OptionParser()
@@ -890,10 +848,14 @@ def MakeOpts():
                           dest="override_table",
                           default=False,
                           help="Drop the DB table and start from scratch")
-    opt_parser.add_option("-p", "--threads", action="store", type="int",
-                          dest="n_threads",
+    opt_parser.add_option("-p", "--processes", action="store", type="int",
+                          dest="n_processes",
                           default=1,
-                          help="Number of threads to use in parallel for calculating pKas")
+                          help="Number of cxcalc processes to run in parallel for calculating pKas")
+    opt_parser.add_option("-b", "--batch_size", action="store", type="int",
+                          dest="batch_size",
+                          default=50,
+                          help="Number of molecules to send to each cxcalc process")
     opt_parser.add_option("-d", "--database", action="store",
                           dest="db_file",
                           default="../data/public_data.sqlite",
@@ -902,6 +864,10 @@ def MakeOpts():
                           dest="table_name",
                           default="dissociation_constants",
                           help="The name of the DB table for the results")
+    opt_parser.add_option("-c", "--cache_table_name", action="store",
+                          dest="cache_table_name",
+                          default="pka_cache",
+                          help="The name of the DB table for caching the ChemAxon results")
     return opt_parser
 
 
@@ -952,17 +918,30 @@ def main():
     cids_to_calculate = cid2smiles_and_mw.keys()
     cids_to_calculate.sort(key=lambda(cid):(cid2smiles_and_mw[cid][1], cid))
     
-    db_lock = threading.Lock()
-    semaphore = threading.Semaphore(options.n_threads)
+    smiles2cids = {}
     for cid in cids_to_calculate:
         smiles, _ = cid2smiles_and_mw[cid]
         if not smiles:
             logging.info("The following compound is blacklisted: C%05d" % cid)
             continue
-
-        thread = DissociationThreads(group=None, target=None, name=None,
-                                     args=(cid, smiles, semaphore, db_lock, options), kwargs={})
-        thread.start()
+        smiles2cids.setdefault(smiles, []).append(cid)
+
+    # the ChemAxon results are cached, so stopping and running again
+    # will only calculate the molecules that are still missing.
+    pipeline = PkaPipeline(cache=PkaCache(db, options.cache_table_name),
+                           n_processes=options.n_processes,
+                           batch_size=options.batch_size,
+                           mid_pH=default_pH)
+    for results in pipeline.IterResults(smiles2cids.keys()):
+        for smiles, result in results:
+            diss_table = Molecule._DissociationTableFromPkas(smiles, 'smiles',
+                result, mid_pH=default_pH, min_pKa=0, max_pKa=14, T=default_T)
+            for cid in smiles2cids[smiles]:
+                name = kegg.cid2name(cid)
+                for row in diss_table.ToDatabaseRow():
+                    db.Insert(options.table_name, [cid, name] + row)
+                logging.info("Completed C%05d" % cid)
+        db.Commit()
         
 if __name__ == '__main__':
     logging.getLogger('').setLevel(logging.DEBUG)
@@ -0,0 +1,259 @@
+#!/usr/bin/python
+
+"""A lazy, cached registry of thermodynamic estimators."""
+
+import os
+import sqlite3
+import logging
+import hashlib
+import cPickle as pickle
+
+from toolbox.database import SqliteDatabase
+from toolbox.singletonmixin import Singleton
+
+# Increment this whenever the estimator classes change in a way that makes
+# older pickles invalid.
+ESTIMATOR_CACHE_VERSION = 2
+
+
+def _UpdateWithFile(md5, filename):
+    md5.update('file:%s\n' % os.path.abspath(filename))
+    if not os.path.exists(filename):
+        md5.update('missing\n')
+        return
+    stat = os.stat(filename)
+    md5.update('%d:%r\n' % (stat.st_size, stat.st_mtime))
+
+
+def _UpdateWithTables(md5, db_filename, table_pattern):
+    md5.update('tables:%s:%s\n' % (os.path.abspath(db_filename), table_pattern))
+    if not os.path.exists(db_filename):
+        md5.update('missing\n')
+        return
+    # sqlite3 directly, since SqliteDatabase would create a missing file
+    comm = sqlite3.connect(db_filename)
+    try:
+        tables = comm.execute(
+            "SELECT name, rootpage, sql FROM sqlite_master "
+            "WHERE type='table' AND name GLOB ? ORDER BY name",
+            (table_pattern,)).fetchall()
+        for table_name, rootpage, sql in tables:
+            count, = comm.execute(
+                'SELECT COUNT(*) FROM "%s"' % table_name).fetchone()
+            last_row = comm.execute(
+                'SELECT rowid, * FROM "%s" ORDER BY rowid DESC LIMIT 1' %
+                table_name).fetchone()
+            md5.update('table:%s:%s:%s:%s:%r\n' %
+                       (table_name, rootpage, sql, count, last_row))
+    finally:
+        comm.close()
+
+
+def SourceChecksum(sources):
+    """Returns a checksum of the data the estimators are built from.
+
+    Args:
+        sources: a list of sources, each of which is either the name of a
+            file (e.g. a CSV), or a pair (database filename, table pattern)
+            for the tables of a Sqlite database whose names match the
+            pattern (in GLOB syntax, e.g. 'pgc_*').
+
+    The checksum is cheap to compute: files are represented by their size
+    and modification time, and tables by their schema, number of rows and
+    last row. This catches tables that are rebuilt with CreateTable (which
+    drops them first), as all the training scripts do, but not an in-place
+    UPDATE of rows other than the last one. Writing some other table in the
+    same database does not change the checksum.
+    """
+    md5 = hashlib.md5()
+    for source in sources:
+        if isinstance(source, basestring):
+            _UpdateWithFile(md5, source)
+        else:
+            _UpdateWithTables(md5, *source)
+    return md5.hexdigest()
+
+
+def _PersistentId(obj):
+    """Pickles database connections and singletons (e.g. Kegg) by
+       reference, since they are shared and cannot be pickled."""
+    if isinstance(obj, SqliteDatabase):
+        return 'sqlite:' + obj.filename
+    if isinstance(obj, Singleton):
+        return 'singleton:%s.%s' % (obj.__class__.__module__,
+                                    obj.__class__.__name__)
+    return None
+
+
+def _PersistentLoad(pid):
+    kind, value = pid.split(':', 1)
+    if kind == 'sqlite':
+        return SqliteDatabase(value)
+    if kind == 'singleton':
+        module_name, class_name = value.rsplit('.', 1)
+        module = __import__(module_name, fromlist=[class_name])
+        return getattr(module, class_name).getInstance()
+    raise pickle.UnpicklingError('Unknown persistent ID: ' + pid)
+
+
+class EstimatorRegistry(object):
+    """A dictionary-like collection of estimators, built on first access.
+
+    Every estimator is registered with a factory function, which gets the
+    registry as its only argument (so it can use other estimators), and
+    with the sources it is built from (see SourceChecksum). Once built, an
+    estimator is written to a binary cache file, and as long as its sources
+    have not changed, later runs load it from there instead of calling the
+    factory.
+
+    Estimators are shared read-only between worker processes by building
+    them (with Preload) before the workers are forked.
+    """
+
+    def __init__(self, sources=(), cache_dir=None):
+        """
+            Arguments:
+                sources   - the sources all the estimators are built from
+                            (in addition to their own, see Register)
+                cache_dir - the directory for the cache files
+                            (None for no caching)
+        """
+        self.sources = list(sources)
+        self.cache_dir = cache_dir
+        self._factories = {}
+        self._estimators = {}
+
+    def Register(self, name, factory, is_available=None, cacheable=True,
+                 sources=()):
+        """Registers an estimator.
+
+        Arguments:
+            name         - the name of the estimator
+            factory      - a function that gets the registry and returns
+                           the estimator
+            is_available - a function that gets the registry and returns
+                           False if the estimator cannot be built (default:
+                           always available)
+            cacheable    - False for estimators that are cheap to build from
+                           other estimators, and are not worth caching
+            sources      - the files and database tables the estimator is
+                           built from (the cache is invalidated when they
+                           change, see SourceChecksum)
+        """
+        self._factories[name] = (factory, is_available, cacheable,
+                                 self.sources + list(sources))
+        self._estimators.pop(name, None)
+
+    def IsAvailable(self, name):
+        if name not in self._factories:
+            return False
+        if name in self._estimators:
+            return True
+        _, is_available, _, _ = self._factories[name]
+        return is_available is None or is_available(self)
+
+    def keys(self):
+        return sorted(name for name in self._factories if self.IsAvailable(name))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, name):
+        return self.IsAvailable(name)
+
+    def __getitem__(self, name):
+        if name not in self._estimators:
+            if not self.IsAvailable(name):
+                raise KeyError(name)
+            self._estimators[name] = self._Build(name)
+        return self._estimators[name]
+
+    def __setitem__(self, name, estimator):
+        self.Register(name, lambda registry: estimator, cacheable=False)
+        self._estimators[name] = estimator
+
+    def get(self, name, default=None):
+        if name not in self:
+            return default
+        return self[name]
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def IsLoaded(self, name):
+        """Returns True if the estimator has already been built."""
+        return name in self._estimators
+
+    def Preload(self, names=None):
+        """Builds (or loads) the estimators, e.g. before forking workers."""
+        for name in names or self.keys():
+            self[name]
+
+    def _GetCacheFilename(self, name):
+        return os.path.join(self.cache_dir, '%s.pkl' % name)
+
+    def _Build(self, name):
+        factory, _, cacheable, sources = self._factories[name]
+        if not cacheable or self.cache_dir is None:
+            return factory(self)
+
+        checksum = SourceChecksum(sources)
+        estimator = self._LoadFromCache(name, checksum)
+        if estimator is None:
+            logging.info('Building the estimator %s' % name)
+            estimator = factory(self)
+            # the factory might have written its own source tables
+            self._SaveToCache(name, estimator, SourceChecksum(sources))
+        return estimator
+
+    def _LoadFromCache(self, name, checksum):
+        filename = self._GetCacheFilename(name)
+        if not os.path.exists(filename):
+            return None
+        f = open(filename, 'rb')
+        try:
+            unpickler = pickle.Unpickler(f)
+            unpickler.persistent_load = _PersistentLoad
+            header = unpickler.load()
+            if header != (ESTIMATOR_CACHE_VERSION, checksum):
+                logging.info('The cached estimator %s is out of date' % name)
+                return None
+            estimator = unpickler.load()
+        except Exception, e:
+            logging.warning('Cannot load the estimator %s from %s: %s' %
+                            (name, filename, str(e)))
+            return None
+        finally:
+            f.close()
+        logging.info('Loaded the estimator %s from %s' % (name, filename))
+        return estimator
+
+    def _SaveToCache(self, name, estimator, checksum):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        filename = self._GetCacheFilename(name)
+        # write to a temporary file first, so that concurrent readers never
+        # see a partial cache file.
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        f = open(tmp_filename, 'wb')
+        try:
+            pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = _PersistentId
+            pickler.dump((ESTIMATOR_CACHE_VERSION, checksum))
+            pickler.dump(estimator)
+            f.close()
+            os.rename(tmp_filename, filename)
+        except Exception, e:
+            f.close()
+            logging.warning('Cannot cache the estimator %s: %s' % (name, str(e)))
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
@@ -14,6 +14,7 @@ from pygibbs import kegg_compound, kegg_reaction
 from pygibbs import kegg_enzyme
 from pygibbs import kegg_errors
 from pygibbs import kegg_parser
+from pygibbs.kegg_elements import ElementMatrix
 from pygibbs.thermodynamic_errors import MissingCompoundFormationEnergy
 from pygibbs.kegg_reaction import Reaction
 import openbabel
@@ -48,6 +49,8 @@ class Kegg(Singleton):
         self.mid2name_map = {}
         self.cofactors2names = {}
         self.cid2bounds = {}
+        self.element_matrix = None
+        self.cid2atom_bag = {}
 
         self.db = SqliteDatabase(sqlite_path)
         
@@ -343,6 +346,8 @@ class Kegg(Singleton):
             
     def ReadAdditionsFile(self):
         logging.info("Adding compound data from %s" % self.COMPOUND_ADDITIONS_FILE)
+        self.element_matrix = None
+        self.cid2atom_bag = {}
         for row_dict in csv.DictReader(open(self.COMPOUND_ADDITIONS_FILE)):
             if row_dict['cid']:
                 cid = int(row_dict['cid'])
@@ -398,6 +403,32 @@ class Kegg(Singleton):
         """Returns all the compounds."""
         return self.cid2compound_map.values()
     
+    def GetAtomBag(self, cid):
+        """Returns the atom bag (with electrons) of a compound.
+        
+        The atom bag is computed on the first call for each compound and
+        cached. Raises KeyError if the CID is not in KEGG, and returns None
+        if the compound has no explicit formula.
+        """
+        if cid not in self.cid2atom_bag:
+            self.cid2atom_bag[cid] = ElementMatrix.CompoundAtomBag(
+                self.cid2compound(cid))
+        atom_bag = self.cid2atom_bag[cid]
+        if atom_bag is None:
+            return None
+        return dict(atom_bag)
+    
+    def GetElementMatrix(self):
+        """Returns the ElementMatrix of all the compounds.
+        
+        The matrix is built on the first call and cached, for balancing
+        many reactions at once (see ElementMatrix.Balance).
+        """
+        if self.element_matrix is None:
+            self.element_matrix = ElementMatrix.FromCompounds(
+                self.cid2compound_map.itervalues())
+        return self.element_matrix
+    
     def AllReactions(self):
         """Return all the reactions."""
         return self.rid2reaction_map.values()
@@ -715,6 +746,8 @@ class Kegg(Singleton):
 
         self.name2cid_map[name] = comp.cid
         self.cid2compound_map[comp.cid] = comp
+        self.element_matrix = None
+        self.cid2atom_bag = {}
 
         return comp.cid
     
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+
+import logging
+
+import numpy as np
+from scipy import sparse as sp
+
+from pygibbs.kegg_errors import KeggParseException
+
+
+class ElementMatrix(object):
+    """The elemental composition of many compounds as one sparse matrix.
+
+    Rows are compounds and columns are elements, with an extra last column
+    for the number of electrons. Compounds without a full formula (e.g.
+    with R groups) have an all-zero row and are marked as unknown.
+    """
+
+    ELECTRONS = 'e-'
+    WATER_CID = 1
+    PROTON_CID = 80
+
+    # the composition of the compounds used for auto-balancing
+    WATER_ATOM_BAG = {'H': 2, 'O': 1, ELECTRONS: 10}
+    PROTON_ATOM_BAG = {'H': 1, ELECTRONS: 0}
+
+    def __init__(self, cids, elements, matrix, known):
+        """Initialize the matrix.
+
+        Args:
+            cids: the list of compound IDs (one per row).
+            elements: the list of element symbols (one per column), the
+                last one being ElementMatrix.ELECTRONS.
+            matrix: a sparse len(cids) x len(elements) integer matrix.
+            known: a boolean array, False for compounds with no formula.
+        """
+        self.cids = list(cids)
+        self.elements = list(elements)
+        self.matrix = sp.csr_matrix(matrix, dtype=np.int64)
+        self.known = np.array(known, dtype=bool)
+        self.cid2index = dict((cid, i) for i, cid in enumerate(self.cids))
+        self.element2index = dict((e, j) for j, e in enumerate(self.elements))
+
+    @staticmethod
+    def FromAtomBags(cid2atom_bag):
+        """Create the matrix from a dictionary of atom bags.
+
+        Args:
+            cid2atom_bag: a dictionary from CID to a dictionary of element
+                counts (including the number of electrons), or None if the
+                composition is unknown.
+        """
+        cids = sorted(cid2atom_bag.keys())
+        # hydrogen and oxygen are always included for auto-balancing
+        elements = set(['H', 'O'])
+        for atom_bag in cid2atom_bag.itervalues():
+            elements.update(atom_bag or [])
+        elements.discard(ElementMatrix.ELECTRONS)
+        elements = sorted(elements) + [ElementMatrix.ELECTRONS]
+        element2index = dict((e, j) for j, e in enumerate(elements))
+
+        rows, cols, data = [], [], []
+        known = np.zeros(len(cids), dtype=bool)
+        for i, cid in enumerate(cids):
+            atom_bag = cid2atom_bag[cid]
+            if atom_bag is None:
+                continue
+            known[i] = True
+            for elem, count in atom_bag.iteritems():
+                if count:
+                    rows.append(i)
+                    cols.append(element2index[elem])
+                    data.append(count)
+
+        matrix = sp.coo_matrix((data, (rows, cols)),
+                               shape=(len(cids), len(elements)))
+        return ElementMatrix(cids, elements, matrix, known)
+
+    @staticmethod
+    def CompoundAtomBag(comp):
+        """Returns the atom bag (with electrons) of a kegg_compound.Compound.
+
+        Compounds with a formula but no structure are assumed to be neutral,
+        so their electrons are counted from the formula. Returns None if the
+        composition is unknown.
+        """
+        from toolbox.molecule import Molecule, OpenBabelError
+
+        atom_bag = comp.get_atom_bag()
+        if atom_bag is None:
+            return None
+        try:
+            n_electrons = comp.get_num_electrons()
+        except KeggParseException:
+            atomic_nums = [Molecule.GetAtomicNum(elem) for elem in atom_bag]
+            if not all(atomic_nums):
+                logging.warning('C%05d: unknown element in %s' %
+                                (comp.cid, comp.formula))
+                return None
+            n_electrons = sum(an * count for an, count in
+                              zip(atomic_nums, atom_bag.itervalues()))
+        except OpenBabelError as e:
+            logging.warning('C%05d: %s' % (comp.cid, str(e)))
+            return None
+        if n_electrons is None:
+            return None
+        atom_bag[ElementMatrix.ELECTRONS] = n_electrons
+        return atom_bag
+
+    @staticmethod
+    def FromCompounds(compounds):
+        """Create the matrix from kegg_compound.Compound objects.
+
+        This parses the structure of every compound, so for balancing just a
+        few reactions use Kegg.GetAtomBag instead.
+        """
+        cid2atom_bag = dict((comp.cid, ElementMatrix.CompoundAtomBag(comp))
+                            for comp in compounds)
+        return ElementMatrix.FromAtomBags(cid2atom_bag)
+
+    def GetAtomBag(self, cid):
+        """Returns the atom bag (with electrons) of a compound.
+
+        Raises KeyError if the CID is not in the matrix, and returns None
+        if it has no explicit formula.
+        """
+        i = self.cid2index[cid]
+        if not self.known[i]:
+            return None
+        row = self.matrix.getrow(i)
+        return dict((self.elements[j], int(count))
+                    for j, count in zip(row.indices, row.data))
+
+    def _AtomVector(self, atom_bag):
+        v = np.zeros(len(self.elements), dtype=np.int64)
+        for elem, count in atom_bag.iteritems():
+            v[self.element2index[elem]] = count
+        return v
+
+    def _Selection(self, cids):
+        """Returns a sparse len(cids) x len(self.cids) row selection matrix
+        and a boolean array of the CIDs with a known composition."""
+        idx = np.array([self.cid2index.get(cid, -1) for cid in cids],
+                       dtype=np.int64)
+        found = idx >= 0
+        known = found.copy()
+        known[found] = self.known[idx[found]]
+        P = sp.csr_matrix((np.ones(found.sum(), dtype=np.int64),
+                           (np.flatnonzero(found), idx[found])),
+                          shape=(len(cids), len(self.cids)))
+        return P, known
+
+    def Imbalance(self, S, cids):
+        """Computes the elemental imbalance of many reactions at once.
+
+        Args:
+            S: a stoichiometric matrix (compounds x reactions), dense or
+                sparse.
+            cids: the CIDs of the rows of S.
+
+        Returns:
+            (imbalance, known) - imbalance is a len(self.elements) x
+            reactions array of the net number of atoms of each element
+            (and electrons) produced by each reaction; known is a boolean
+            array, False for reactions involving a compound with an
+            unknown composition.
+        """
+        S = sp.csr_matrix(S)
+        P, known_cids = self._Selection(cids)
+        imbalance = (P.dot(self.matrix)).T.dot(S).toarray()
+
+        unknown_cids = sp.csr_matrix(np.atleast_2d(~known_cids).astype(np.int64))
+        involved = unknown_cids.dot(abs(S)).toarray().flatten()
+        return imbalance, (involved == 0)
+
+    def Balance(self, S, cids, balance_water=False, balance_hydrogens=False):
+        """Balances many reactions at once using water and H+.
+
+        Works like kegg_utils.balance_reaction, on a whole stoichiometric
+        matrix.
+
+        Args:
+            S: a stoichiometric matrix (compounds x reactions).
+            cids: the CIDs of the rows of S.
+            balance_water: if True, oxygen imbalances are fixed by adding
+                water (C00001).
+            balance_hydrogens: if True, hydrogen imbalances are fixed by
+                adding H+ (C00080), otherwise H+ is removed and hydrogen
+                imbalances are ignored.
+
+        Returns:
+            (S, cids, balanced, known) - the new stoichiometric matrix (as
+            a dense array) and its CIDs, which might have gained a row for
+            water or H+, a boolean array of the reactions which are
+            balanced, and a boolean array of the reactions whose balance
+            could be checked.
+        """
+        S = np.array(sp.csr_matrix(S).toarray(), dtype=float)
+        cids = list(cids)
+        imbalance, known = self.Imbalance(S, cids)
+        imbalance = np.array(imbalance, dtype=float)
+
+        if balance_water:
+            delta = -imbalance[self.element2index['O'], :]
+            if (delta != 0).any():
+                S = self._AddRow(S, cids, self.WATER_CID)
+                S[cids.index(self.WATER_CID), :] += delta
+                imbalance += np.outer(self._AtomVector(self.WATER_ATOM_BAG), delta)
+
+        h = self.element2index['H']
+        if balance_hydrogens:
+            delta = -imbalance[h, :]
+            if (delta != 0).any():
+                S = self._AddRow(S, cids, self.PROTON_CID)
+                S[cids.index(self.PROTON_CID), :] += delta
+                imbalance += np.outer(self._AtomVector(self.PROTON_ATOM_BAG), delta)
+        else:
+            if self.PROTON_CID in cids:
+                S[cids.index(self.PROTON_CID), :] = 0
+            imbalance[h, :] = 0
+
+        balanced = (imbalance == 0).all(axis=0)
+        return S, cids, balanced, known
+
+    @staticmethod
+    def _AddRow(S, cids, cid):
+        """Adds a row of zeros for cid to S if it doesn't have one."""
+        if cid in cids:
+            return S
+        cids.append(cid)
+        return np.vstack([S, np.zeros((1, S.shape[1]))])
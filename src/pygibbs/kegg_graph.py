@@ -0,0 +1,222 @@
+#!/usr/bin/python
+
+import logging
+from collections import deque
+
+import numpy as np
+
+
+class KeggCompoundGraph(object):
+    """The substrate-to-product graph of all KEGG compounds.
+
+    Two compounds are neighbours if some reaction has them on opposite
+    sides. The adjacency is stored in CSR form (indptr, indices) over
+    the sorted list of CIDs, so it can be built once, saved next to the
+    KEGG tables and reused for many queries.
+    """
+
+    TABLE_NAME = 'kegg_compound_graph'
+
+    # Currency metabolites which connect almost everything to everything.
+    DEFAULT_COFACTORS = frozenset([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 13,
+                                   14, 20, 28, 30])
+
+    def __init__(self, cids, indptr, indices):
+        """Initialize the graph.
+
+        Args:
+            cids: the sorted list of compound IDs (one per node).
+            indptr: array of length len(cids)+1, the neighbours of node i
+                are indices[indptr[i]:indptr[i+1]].
+            indices: array of node indices.
+        """
+        self.cids = [int(cid) for cid in cids]
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.cid2index = dict((cid, i) for i, cid in enumerate(self.cids))
+
+        # plain lists are much faster than NumPy arrays for
+        # scalar access inside the BFS loop.
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+
+    def __len__(self):
+        return len(self.cids)
+
+    @staticmethod
+    def FromEdges(edges):
+        """Create the graph from a list of (cid, neighbour cid) pairs."""
+        edges = set((int(a), int(b)) for a, b in edges)
+        cids = sorted(set(a for a, _ in edges) | set(b for _, b in edges))
+        cid2index = dict((cid, i) for i, cid in enumerate(cids))
+
+        rows = np.array([cid2index[a] for a, _ in sorted(edges)], dtype=np.int64)
+        cols = np.array([cid2index[b] for _, b in sorted(edges)], dtype=np.int64)
+        indptr = np.zeros(len(cids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(cids)), out=indptr[1:])
+        return KeggCompoundGraph(cids, indptr, cols)
+
+    @staticmethod
+    def FromReactions(sparse_reactions):
+        """Create the graph from reactions given as {cid: coefficient}."""
+        edges = []
+        for sparse in sparse_reactions:
+            substrates = [cid for cid, coeff in sparse.iteritems() if coeff < 0]
+            products = [cid for cid, coeff in sparse.iteritems() if coeff > 0]
+            for s in substrates:
+                for p in products:
+                    edges.append((s, p))
+                    edges.append((p, s))
+        return KeggCompoundGraph.FromEdges(edges)
+
+    @staticmethod
+    def FromKegg(kegg):
+        """Create the graph from all the reactions of a Kegg object."""
+        return KeggCompoundGraph.FromReactions(
+            kegg.rid2reaction(rid).sparse for rid in kegg.get_all_rids())
+
+    def ToDatabase(self, db, table_name=TABLE_NAME):
+        """Write the edges of the graph to a table."""
+        logging.info('Writing the compound graph to %s' % table_name)
+        db.CreateTable(table_name, 'cid INT, neighbour INT')
+        for i, cid in enumerate(self.cids):
+            for j in self._indices[self._indptr[i]:self._indptr[i + 1]]:
+                db.Insert(table_name, [cid, self.cids[j]])
+        db.Commit()
+
+    @staticmethod
+    def FromDatabase(db, table_name=TABLE_NAME):
+        """Read a graph written by ToDatabase."""
+        return KeggCompoundGraph.FromEdges(
+            db.Execute('SELECT cid, neighbour FROM %s' % table_name))
+
+    @staticmethod
+    def LoadOrCreate(kegg, db=None, table_name=TABLE_NAME):
+        """Returns the compound graph of a Kegg object.
+
+        The graph is read from the database if it has been saved there
+        before, otherwise it is built from the reactions and saved.
+
+        Args:
+            kegg: the Kegg object.
+            db: the database for the graph table (default: the KEGG
+                database itself).
+        """
+        db = db or kegg.db
+        if db.DoesTableExist(table_name):
+            return KeggCompoundGraph.FromDatabase(db, table_name)
+        graph = KeggCompoundGraph.FromKegg(kegg)
+        graph.ToDatabase(db, table_name)
+        return graph
+
+    def Neighbours(self, cid):
+        """Returns the list of CIDs adjacent to this one."""
+        i = self.cid2index.get(cid)
+        if i is None:
+            return []
+        return [self.cids[j] for j in
+                self._indices[self._indptr[i]:self._indptr[i + 1]]]
+
+    def _Search(self, sources, max_depth=None, cofactors=DEFAULT_COFACTORS,
+                target=None):
+        """Multi-source BFS from sources.
+
+        Cofactors are never entered (unless they are sources themselves).
+
+        Returns:
+            (distances, parents) - dictionaries from node index to the
+            depth and to the parent node index (-1 for the sources).
+        """
+        indptr, indices = self._indptr, self._indices
+        blocked = set(self.cid2index[c] for c in cofactors
+                      if c in self.cid2index)
+        distances = {}
+        parents = {}
+        queue = deque()
+        for cid in sources:
+            i = self.cid2index.get(cid)
+            if i is not None and i not in distances:
+                distances[i] = 0
+                parents[i] = -1
+                queue.append(i)
+
+        while queue:
+            i = queue.popleft()
+            if i == target:
+                break
+            d = distances[i] + 1
+            if max_depth is not None and d > max_depth:
+                continue
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                if j in distances or j in blocked:
+                    continue
+                distances[j] = d
+                parents[j] = i
+                queue.append(j)
+        return distances, parents
+
+    def Distances(self, sources, max_depth=None,
+                  cofactors=DEFAULT_COFACTORS):
+        """Returns a dictionary from CID to its distance from the sources."""
+        distances, _ = self._Search(sources, max_depth, cofactors)
+        return dict((self.cids[i], d) for i, d in distances.iteritems())
+
+    def Layers(self, sources, max_depth, cofactors=DEFAULT_COFACTORS):
+        """Returns the CIDs at each distance from the sources.
+
+        Returns:
+            A list of max_depth+1 sorted lists, the first one being
+            the sources.
+        """
+        layers = [[] for _ in xrange(max_depth + 1)]
+        for cid, d in self.Distances(sources, max_depth, cofactors).iteritems():
+            layers[d].append(cid)
+        return [sorted(layer) for layer in layers]
+
+    def Neighbourhood(self, cid, k, cofactors=DEFAULT_COFACTORS):
+        """Returns the set of CIDs at most k hops away from cid."""
+        return set(self.Distances([cid], k, cofactors).keys())
+
+    def Neighbourhoods(self, cids, k, cofactors=DEFAULT_COFACTORS):
+        """Returns a dictionary from each CID to its k-hop neighbourhood."""
+        return dict((cid, self.Neighbourhood(cid, k, cofactors))
+                    for cid in cids)
+
+    def ShortestPath(self, source, target, cofactors=DEFAULT_COFACTORS):
+        """Returns the list of CIDs on a shortest path, or None."""
+        if target not in self.cid2index:
+            return None
+        t = self.cid2index[target]
+        _, parents = self._Search([source], cofactors=cofactors, target=t)
+        return self._Path(parents, t)
+
+    def _Path(self, parents, t):
+        if t not in parents:
+            return None
+        path = []
+        while t != -1:
+            path.append(self.cids[t])
+            t = parents[t]
+        path.reverse()
+        return path
+
+    def ShortestPaths(self, pairs, cofactors=DEFAULT_COFACTORS):
+        """Finds shortest paths for many (source, target) pairs.
+
+        Pairs sharing a source are answered from a single BFS.
+
+        Returns:
+            A dictionary from (source, target) to a list of CIDs, or None
+            if the target cannot be reached.
+        """
+        source2targets = {}
+        for source, target in pairs:
+            source2targets.setdefault(source, []).append(target)
+
+        paths = {}
+        for source, targets in source2targets.iteritems():
+            _, parents = self._Search([source], cofactors=cofactors)
+            for target in targets:
+                t = self.cid2index.get(target)
+                paths[(source, target)] = self._Path(parents, t)
+        return paths
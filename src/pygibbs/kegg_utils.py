@@ -83,7 +83,7 @@ def balance_reaction(kegg, sparse, balance_water=False, balance_hydrogens=False,
     atom_bag = {}
     for cid, coeff in sparse.iteritems():
         try:
-            comp = kegg.cid2compound(cid)
+            cid_atom_bag = kegg.GetAtomBag(cid)
         except KeyError:
             if exception_if_unknown:
                 raise kegg_errors.KeggReactionNotBalancedException(
@@ -93,7 +93,6 @@ def balance_reaction(kegg, sparse, balance_water=False, balance_hydrogens=False,
                     ", cannot check if this reaction is balanced" % cid)
                 return
 
-        cid_atom_bag = comp.get_atom_bag()
         if cid_atom_bag == None:
             if exception_if_unknown:
                 raise kegg_errors.KeggReactionNotBalancedException(
@@ -102,7 +101,6 @@ def balance_reaction(kegg, sparse, balance_water=False, balance_hydrogens=False,
                 logging.debug("C%05d has no explicit formula, "
                                 "cannot check if this reaction is balanced" % cid)
                 return
-        cid_atom_bag['e-'] = comp.get_num_electrons()
         
         for atomicnum, count in cid_atom_bag.iteritems():
             atom_bag[atomicnum] = atom_bag.get(atomicnum, 0) + count*coeff    
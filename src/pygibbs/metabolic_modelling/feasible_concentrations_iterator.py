@@ -1,7 +1,10 @@
 #!/usr/bin/python
 
+import multiprocessing
 import numpy as np
 
+import scipy.optimize as opt
+
 from pygibbs.metabolic_modelling import concentration_optimizer
 from pygibbs.metabolic_modelling import mtdf_optimizer
 from pygibbs.thermodynamic_constants import default_T, R
@@ -9,18 +12,186 @@ from pygibbs.thermodynamic_constants import default_T, R
 RT = R * default_T
 
 
+# The polytope of the worker processes, set by _InitWorker.
+_worker_polytope = None
+
+
+def _InitWorker(polytope):
+    global _worker_polytope
+    _worker_polytope = polytope
+
+
+def _OptimizeObjective(c):
+    """Solves the worker's ConcentrationPolytope for one objective.
+
+    Module-level so that it can be used by a multiprocessing.Pool.
+    """
+    return _worker_polytope.Optimize(c)
+
+
+class ConcentrationPolytope(object):
+    """The feasible ln-concentrations of a pathway as a single LP.
+
+    The constraint matrices are built once and only the objective vector
+    is replaced between solves.
+    """
+
+    def __init__(self, S, dG0_r_prime, fluxes, ln_conc_lb, ln_conc_ub):
+        """Initialize the polytope.
+
+        Args:
+            S: MxN stoichiometric matrix (compounds x reactions).
+            dG0_r_prime: 1xN matrix of standard reaction energies.
+            fluxes: the N relative fluxes of the reactions.
+            ln_conc_lb: 1xM matrix of lower bounds on the ln-concentrations.
+            ln_conc_ub: 1xM matrix of upper bounds on the ln-concentrations.
+        """
+        S = np.array(S, dtype=float)
+        dG0 = np.array(dG0_r_prime, dtype=float).flatten()
+        fluxes = np.array(fluxes, dtype=float).flatten()
+        self.Ncompounds = S.shape[0]
+
+        # If the dG0 is unknown, the reaction imposes no constraints.
+        # All other reactions must have dGr <= 0 and reactions with
+        # a flux of 0 must be in equilibrium (dGr == 0).
+        known = np.isfinite(dG0)
+        ieq = known & (fluxes != 0)
+        eq = known & (fluxes == 0)
+        self.A_ub = RT * S[:, ieq].T
+        self.b_ub = -dG0[ieq]
+        self.A_eq = RT * S[:, eq].T
+        self.b_eq = -dG0[eq]
+        if not eq.any():
+            self.A_eq, self.b_eq = None, None
+        if not ieq.any():
+            self.A_ub, self.b_ub = None, None
+
+        lb = np.array(ln_conc_lb, dtype=float).flatten()
+        ub = np.array(ln_conc_ub, dtype=float).flatten()
+        self.bounds = zip(lb, ub)
+
+    def Optimize(self, c):
+        """Minimizes c * ln_conc over the polytope.
+
+        Returns:
+            A 1-d array of the optimal ln-concentrations, or None if
+            the LP is infeasible.
+        """
+        res = opt.linprog(c, A_ub=self.A_ub, b_ub=self.b_ub,
+                          A_eq=self.A_eq, b_eq=self.b_eq,
+                          bounds=self.bounds)
+        if res.status != 0:
+            return None
+        return np.array(res.x, dtype=float)
+
+    def OptimizeMany(self, objectives):
+        """Solves the LP for each row of the objectives matrix.
+
+        Returns:
+            A list of solutions (or None for failed solves).
+        """
+        return [self.Optimize(c) for c in objectives]
+
+    def MinimizeEach(self, signs=(1,), n_processes=1):
+        """Minimizes (or maximizes) each ln-concentration separately.
+
+        Solutions found earlier are used to warm start later ones: when a
+        known vertex already has compound i at its lower bound (for
+        minimization) or upper bound (for maximization), that vertex is
+        optimal and the LP for compound i is not solved again.
+
+        Args:
+            signs: 1 for minimization, -1 for maximization, or both.
+            n_processes: if > 1, the LPs are solved in rounds of this many
+                LPs in parallel. The vertices found in each round are used
+                to skip LPs in the following rounds.
+
+        Returns:
+            A list of (sign, compound index, solution) tuples.
+        """
+        lb = np.array([b[0] for b in self.bounds])
+        ub = np.array([b[1] for b in self.bounds])
+        jobs = [(s, i) for s in signs for i in xrange(self.Ncompounds)]
+
+        pool = None
+        if n_processes > 1:
+            pool = multiprocessing.Pool(n_processes, _InitWorker, (self,))
+        solutions = {}
+        vertices = []
+        pending = jobs
+        try:
+            while pending:
+                # the next LPs that no known vertex answers
+                batch = []
+                for k, (s, i) in enumerate(pending):
+                    if len(batch) == n_processes:
+                        break
+                    target = lb if s > 0 else ub
+                    known = [v for v in vertices if v[i] == target[i]]
+                    if known:
+                        solutions[s, i] = known[0]
+                    else:
+                        batch.append((s, i))
+                else:
+                    k = len(pending)
+                pending = pending[k:]
+
+                objectives = [s * np.eye(1, self.Ncompounds, i).flatten()
+                              for s, i in batch]
+                if pool is None:
+                    batch_solutions = self.OptimizeMany(objectives)
+                else:
+                    batch_solutions = pool.map(_OptimizeObjective, objectives)
+                for job, x in zip(batch, batch_solutions):
+                    if x is not None:
+                        x = np.clip(x, lb, ub)
+                        vertices.append(x)
+                    solutions[job] = x
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return [(s, i, solutions[s, i]) for s, i in jobs]
+
+
 class FeasibleConcentrationsIterator(object):
     
+    # Allowed positive dGr' (in kJ/mol) due to the numeric accuracy of LP
+    # solutions, which lie exactly on the constraint boundaries.
+    FEASIBILITY_TOLERANCE = 1e-9
+
     def __init__(self, pathway_model, thermodynamic_data,
-                 concentration_bounds):
+                 concentration_bounds, include_maxima=False,
+                 n_processes=1):
+        """Initialize the iterator.
+
+        Args:
+            pathway_model: the PathwayModel object.
+            thermodynamic_data: the ThermodynamicData object.
+            concentration_bounds: the Bounds objects setting concentration bounds.
+            include_maxima: if True, also yield the solutions maximizing
+                each concentration separately.
+            n_processes: the number of processes used to solve the
+                per-compound LPs.
+        """
         self._model = pathway_model
         self._thermo = thermodynamic_data
         self._concentration_bounds = concentration_bounds
+        self.include_maxima = include_maxima
+        self.n_processes = n_processes
         self.S = pathway_model.GetStoichiometricMatrix()
         self.Ncompounds, self.Nrxns = self.S.shape
     
         self.dG0_r_prime = thermodynamic_data.GetDGrTagZero_ForModel(
                 self._model)
+        self.vertices = None
+
+    def _MakePolytope(self):
+        ln_conc_lb, ln_conc_ub = self._concentration_bounds.GetLnBounds(
+            self._model.GetCompoundIDs())
+        return ConcentrationPolytope(self.S, self.dG0_r_prime,
+                                     self._model.GetFluxes(),
+                                     ln_conc_lb, ln_conc_ub)
     
     def __iter__(self):
         # First feasible solution: MTDF
@@ -47,15 +218,61 @@ class FeasibleConcentrationsIterator(object):
         if status.IsSuccessful():
             yield np.matrix(res.ln_concentrations)
         
-        # Minimize each concentration separately.
-        for i in xrange(self.Ncompounds):
-            res = conc_opt.MinimizeConcentration(
-                i, concentration_bounds=self._concentration_bounds)
-            status = res.status
-            if status.IsSuccessful():
-                yield np.matrix(res.ln_concentrations)
+        # Minimize (and maximize) each concentration separately,
+        # using one shared LP.
+        signs = (1, -1) if self.include_maxima else (1,)
+        polytope = self._MakePolytope()
+        found = []
+        for _, _, x in polytope.MinimizeEach(signs, self.n_processes):
+            if x is None:
+                continue
+            found.append(x)
+            yield np.matrix(x)
+        self.vertices = self._UniqueRows(found)
+
+    @staticmethod
+    def _UniqueRows(rows):
+        if not rows:
+            return np.zeros((0, 0))
+        unique = []
+        for x in rows:
+            if not any((x == u).all() for u in unique):
+                unique.append(x)
+        return np.array(unique)
+
+    def GetVertices(self):
+        """Returns the distinct vertices found by the per-compound LPs.
+
+        Returns:
+            A Numpy array of ln-concentrations with one vertex per row.
+        """
+        if self.vertices is None:
+            for _ in self:
+                pass
+        return self.vertices
+
+    def FeasibleMany(self, concentrations):
+        """Checks many ln-concentration vectors at once.
+
+        Args:
+            concentrations: a KxM matrix with one ln-concentration
+                vector per row.
+
+        Returns:
+            A 1-d boolean array with one value per row. Reactions with
+            an unknown dG0 impose no constraint.
+        """
+        dG0 = np.array(self.dG0_r_prime, dtype=float)
+        known = np.isfinite(dG0).flatten()
+        x = np.atleast_2d(np.array(concentrations, dtype=float))
+        dgtag = dG0[:, known] + RT * np.dot(x, np.array(self.S)[:, known])
+        return (dgtag <= self.FEASIBILITY_TOLERANCE).all(axis=1)
     
     def Feasible(self, concentrations):
-        """Returns True if these concentrations are feasible."""
-        dgtag = self.dG0_r_prime + RT * concentrations * self.S
-        return (dgtag <= 0).all()
\ No newline at end of file
+        """Returns True if these concentrations are feasible.
+
+        Like the optimizers, this ignores reactions with an unknown dG0,
+        and allows a dGr' of up to FEASIBILITY_TOLERANCE so that the
+        vertices found by the LPs count as feasible.
+        """
+        return bool(self.FeasibleMany(concentrations)[0])
@@ -53,16 +53,26 @@ class FixedVariableInjector(object):
     def Deject(self, injected):
         return np.array(injected[self.variable_i].flat)
     
+    def GetVariableIndices(self):
+        """Returns the (column) indices of the variables in the full vector."""
+        return self.variable_i[-1]
+    
 
 class ConstraintChecker(object):
     """Base class for functions that check constraints.
     
-    All such classes implement a __call__ method returning an np.matrix.
+    All such classes implement a __call__ method returning an np.matrix
+    and a Jacobian method returning the matrix of its derivatives.
     """
     def __call__(self, x):
         """Returns matrix with values >= 0 where constraints are met.""" 
         raise NotImplementedError
     
+    def Jacobian(self, x):
+        """Returns the MxN derivative matrix of the M constraint values
+           with respect to the N variables."""
+        raise NotImplementedError
+    
 
 class MinusDG(ConstraintChecker):
     """A functor checking that thermodynamic requirements are met."""
@@ -92,6 +102,15 @@ class MinusDG(ConstraintChecker):
         minus_max = -(dgtag - self.max_dGr)
         return minus_max
     
+    def Jacobian(self, x):
+        """Returns the derivatives of -dGr w.r.t. the variable ln-concentrations.
+        
+        Since dGr is linear in x, the Jacobian is constant: -RT * S^T
+        restricted to the columns of the non-fixed variables.
+        """
+        variable_i = self.injector.GetVariableIndices()
+        return -RT * np.array(self.S)[variable_i, :].T
+    
 
 class BoundDiffs(ConstraintChecker):
     """Functor checking bounds."""
@@ -116,6 +135,11 @@ class BoundDiffs(ConstraintChecker):
         ub_diff = self.ub - x
         return np.matrix(np.hstack([lb_diff, ub_diff]))
     
+    def Jacobian(self, x):
+        """Returns the (constant) derivatives of the bound differences."""
+        n = np.size(self.lb)
+        return np.vstack([np.eye(n), -np.eye(n)])
+    
 
 class MultiFunctionWrapper(ConstraintChecker):
     """Wraps multiple functors that return constraint-check matrices."""
@@ -135,4 +159,8 @@ class MultiFunctionWrapper(ConstraintChecker):
         out_mat = np.hstack(outs)
         
         # Required to return a 1-d ndarray.
-        return np.array(out_mat.flat)
\ No newline at end of file
+        return np.array(out_mat.flat)
+    
+    def Jacobian(self, x):
+        """Returns the stacked Jacobians of all underlying functors."""
+        return np.vstack([f.Jacobian(x) for f in self.functions])
\ No newline at end of file
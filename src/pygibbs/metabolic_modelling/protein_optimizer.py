@@ -1,7 +1,9 @@
 #!/usr/bin/python
 
 import logging
+import multiprocessing
 import numpy as np
+import time
 
 import scipy.optimize as opt
 
@@ -71,12 +73,15 @@ class ProteinOptimizer(object):
         return np.matrix(mtdf_result.ln_concentrations)
      
     def FindOptimum(self, concentration_bounds=None,
-                    initial_concentrations=None):
+                    initial_concentrations=None,
+                    check_derivatives=False):
         """Finds the Optimum.
         
         Args:
             concentration_bounds: the Bounds objects setting concentration bounds.
             initial_conditions: a starting point for the optimization. Must be feasible.
+            check_derivatives: if True, compare the analytic derivatives of the
+                goal function to a numeric approximation and log the difference.
         """
         # Concentration bounds
         my_bounds = concentration_bounds or self.DefaultConcentrationBounds()
@@ -123,18 +128,20 @@ class ProteinOptimizer(object):
             self.S, self.dG0_r_prime, self.fluxes, kcat,
             km, masses, injector)
         initial_conds = np.array(initial_conds.flat)
-        initial_func_value = optimization_func(initial_conds)
-        initial_deriv = optimization_func.Derivatives(initial_conds)
-        approx_deriv = opt.approx_fprime(initial_conds, optimization_func, 1e-8)
-        initial_dg = optimization_func.GetDGTag(injector(initial_conds))        
-        
-        logging.debug('Initial dG %s', initial_dg)
-        logging.debug('Initial derivative %s', initial_deriv)
-        logging.debug('Approx derivative %s', approx_deriv)
-        logging.debug('Diff %s', np.array(initial_deriv) - np.array(approx_deriv))
-        logging.debug('Initial optimization value: %.2g', initial_func_value)
+        if check_derivatives:
+            initial_func_value = optimization_func(initial_conds)
+            initial_deriv = optimization_func.Derivatives(initial_conds)
+            approx_deriv = opt.approx_fprime(initial_conds, optimization_func, 1e-8)
+            initial_dg = optimization_func.GetDGTag(injector(initial_conds))        
+            
+            logging.debug('Initial dG %s', initial_dg)
+            logging.debug('Initial derivative %s', initial_deriv)
+            logging.debug('Approx derivative %s', approx_deriv)
+            logging.debug('Diff %s', np.array(initial_deriv) - np.array(approx_deriv))
+            logging.debug('Initial optimization value: %.2g', initial_func_value)
         res = opt.fmin_slsqp(optimization_func, initial_conds, 
                              f_ieqcons=f_ieq,
+                             fprime_ieqcons=f_ieq.Jacobian,
                              full_output=1,
                              fprime=optimization_func.Derivatives,
                              iprint=0,
@@ -151,10 +158,10 @@ class ProteinOptimizer(object):
                 optimization_status=status)
             
         ln_conc, optimum = res[:2]
-        final_func_value = optimization_func(ln_conc)
-        final_constraints = (f_ieq(ln_conc) >= 0).all()
-        logging.debug('Optimum meets constraints %s', final_constraints)
-        logging.debug('Final optimization value: %.2g', final_func_value)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            final_constraints = (f_ieq(ln_conc) >= 0).all()
+            logging.debug('Optimum meets constraints %s', final_constraints)
+            logging.debug('Final optimization value: %.2g', optimum)
         
         enzyme_levels = optimization_func.GetEnzymeLevels(ln_conc)
         ln_conc = injector(ln_conc)
@@ -175,4 +182,142 @@ class ProteinOptimizer(object):
             thermo_factors=thermo_factors,
             kinetic_data=self._kinetic_data)
         
-        
\ No newline at end of file
+        
+
+
+def _FindOptimumForJob(job):
+    """Runs a single ProteinOptimizer job (module-level for pickling).
+    
+    Args:
+        job: a tuple (pathway_model, thermodynamic_data, kinetic_data,
+            protein_cost_type, concentration_bounds, initial_concentrations).
+    
+    Returns:
+        A tuple (ProteinCostOptimizedPathway, elapsed time in seconds).
+    """
+    (pathway_model, thermodynamic_data, kinetic_data, protein_cost_type,
+     concentration_bounds, initial_concentrations) = job
+    start_time = time.time()
+    optimizer = ProteinOptimizer(pathway_model, thermodynamic_data,
+                                 kinetic_data,
+                                 protein_cost_type=protein_cost_type)
+    result = optimizer.FindOptimum(
+        concentration_bounds=concentration_bounds,
+        initial_concentrations=initial_concentrations)
+    return result, time.time() - start_time
+
+
+class BatchProteinOptimizer(object):
+    """Optimizes the protein cost of many pathways or kinetic parameter sets."""
+    
+    def __init__(self, thermodynamic_data,
+                 protein_cost_type=protein_cost_functors.ProteinCostFunc,
+                 n_processes=1):
+        """Initialize the BatchProteinOptimizer class.
+        
+        Args:
+            thermodynamic_data: the ThermodynamicData object.
+            protein_cost_type: the functor type for calculating
+              protein cost.
+            n_processes: the number of worker processes. If 1, all the
+              jobs are run serially in the calling process.
+        """
+        self._thermo = thermodynamic_data
+        self.protein_cost_type = protein_cost_type
+        self.n_processes = n_processes
+        self.timing_stats = None
+    
+    def FindOptima(self, pathway_models, kinetic_datas,
+                   concentration_bounds=None,
+                   initial_concentrations=None):
+        """Finds the optimum for every (pathway, kinetic data) pair.
+        
+        Either argument may be a single object, in which case it is used
+        for all the jobs. For example, a single pathway with a list of
+        sampled KineticData objects is a kinetic parameter ensemble.
+        
+        Args:
+            pathway_models: a list of PathwayModel objects (or a single one).
+            kinetic_datas: a list of KineticData objects (or a single one).
+            concentration_bounds: the Bounds objects setting concentration bounds,
+                shared by all jobs.
+            initial_concentrations: a list of starting points (one per job),
+                or None to use the MTDF solution of each pathway. Passing
+                several starting points for the same pathway and kinetic
+                data gives a multi-start optimization.
+        
+        Returns:
+            A list of ProteinCostOptimizedPathway objects, one per job.
+            Timing statistics are stored in self.timing_stats.
+        """
+        if not isinstance(pathway_models, (list, tuple)):
+            pathway_models = [pathway_models]
+        if not isinstance(kinetic_datas, (list, tuple)):
+            kinetic_datas = [kinetic_datas]
+        n_jobs = max(len(pathway_models), len(kinetic_datas))
+        if initial_concentrations is not None:
+            n_jobs = max(n_jobs, len(initial_concentrations))
+        for l in (pathway_models, kinetic_datas, initial_concentrations):
+            if l is not None and len(l) not in (1, n_jobs):
+                raise ValueError('Inconsistent number of jobs: %d != %d'
+                                 % (len(l), n_jobs))
+        
+        def _Get(l, i):
+            if l is None:
+                return None
+            if len(l) == 1:
+                return l[0]
+            return l[i]
+        
+        jobs = [(_Get(pathway_models, i), self._thermo,
+                 _Get(kinetic_datas, i), self.protein_cost_type,
+                 concentration_bounds, _Get(initial_concentrations, i))
+                for i in xrange(n_jobs)]
+        
+        start_time = time.time()
+        if self.n_processes > 1:
+            pool = multiprocessing.Pool(self.n_processes)
+            try:
+                outputs = pool.map(_FindOptimumForJob, jobs)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            outputs = map(_FindOptimumForJob, jobs)
+        total_time = time.time() - start_time
+
+        results = [res for res, _ in outputs]
+        job_times = np.array([t for _, t in outputs])
+        n_successful = len([r for r in results if r.status.IsSuccessful()])
+        self.timing_stats = {'n_jobs': n_jobs,
+                             'n_successful': n_successful,
+                             'total_time': total_time,
+                             'mean_job_time': np.mean(job_times),
+                             'max_job_time': np.max(job_times),
+                             'job_times': job_times}
+        logging.debug('Optimized %d jobs (%d successful) in %.2g seconds',
+                      n_jobs, n_successful, total_time)
+        return results
+    
+    def FindBestOptimum(self, pathway_model, kinetic_data,
+                        initial_concentrations,
+                        concentration_bounds=None):
+        """Multi-start optimization of a single pathway.
+        
+        Args:
+            pathway_model: the PathwayModel object.
+            kinetic_data: the KineticData object.
+            initial_concentrations: a list of feasible starting points.
+            concentration_bounds: the Bounds objects setting concentration bounds.
+        
+        Returns:
+            The successful ProteinCostOptimizedPathway with the lowest cost,
+            or None if all optimizations failed.
+        """
+        results = self.FindOptima(pathway_model, kinetic_data,
+                                  concentration_bounds=concentration_bounds,
+                                  initial_concentrations=initial_concentrations)
+        successful = [r for r in results if r.status.IsSuccessful()]
+        if not successful:
+            return None
+        return min(successful, key=lambda r: r.opt_val)
@@ -7,9 +7,11 @@ from pygibbs.thermodynamic_constants import default_T, R
 from matplotlib.font_manager import FontProperties
 from pygibbs.kegg import Kegg
 from pygibbs.kegg_reaction import Reaction
+from pygibbs.thermodynamics import ReactionProduct
 import types
 import pulp
 
+
 class Pathway(object):
     """Container for doing pathway-level thermodynamic analysis."""
    
@@ -68,29 +70,30 @@ class Pathway(object):
         self.c_range = self.DEFAULT_C_RANGE
 
     def CalculateReactionEnergies(self, dG_f):
-        if np.isnan(dG_f).any():
-            # if there are NaN values in dG_f, multiplying the matrices will not
-            # work, since NumPy will not convert 0*NaN into 0 in the sum. Therefore,
-            # the multiplication must be done explicitly and using only the nonzero
-            # stoichiometric coefficients and their corresponding dG_f.
-            dG_r = np.matrix(np.zeros((1, self.Nr)))
-            for r in xrange(self.Nr):
-                reactants = list(self.S[:, r].nonzero()[0].flat)
-                dG_r[0, r] = dG_f[0, reactants] * self.S[reactants, r]
-            return dG_r
-        else:
-            return dG_f * self.S
+        """Calculates reaction energies from formation energies.
+        
+        Args:
+            dG_f: a 1xNc matrix of formation energies, or a KxNc matrix
+                with one set of formation energies per row.
+        
+        Returns:
+            A KxNr matrix. The energy of a reaction is NaN only if one of
+            its own reactants has a NaN formation energy.
+        """
+        return ReactionProduct(dG_f, self.S)
 
     def CalculateReactionEnergiesUsingConcentrations(self, concentrations):
+        """Calculates reaction energies at the given concentrations.
+        
+        Args:
+            concentrations: an Ncx1 matrix of concentrations, or an NcxK
+                matrix with one concentration profile per column.
+        
+        Returns:
+            A KxNr matrix of dG'_r, one row per concentration profile.
+        """
         log_conc = np.log(concentrations)
-        if np.isnan(self.dG0_r_prime).any(): # see CalculateReactionEnergies
-            dG_r_prime = self.dG0_r_prime.copy()
-            for r in xrange(self.Nr):
-                reactants = list(self.S[:, r].nonzero()[0].flat)
-                dG_r_prime[0, r] += R * self.T * log_conc[reactants, 0].T * self.S[reactants, r]
-            return dG_r_prime
-        else:
-            return self.dG0_r_prime + R * self.T * log_conc.T * self.S
+        return self.dG0_r_prime + R * self.T * ReactionProduct(log_conc.T, self.S)
 
     def GetPhysiologicalConcentrations(self, bounds=None):
         conc = np.matrix(np.ones((self.Nc, 1))) * self.DEFAULT_PHYSIOLOGICAL_CONC
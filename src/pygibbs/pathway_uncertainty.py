@@ -0,0 +1,309 @@
+#!/usr/bin/python
+
+"""Monte Carlo propagation of dG0 uncertainty to pathway MTDF and reversibility.
+
+Formation energies are drawn in batches from a multivariate normal
+distribution (e.g. with the covariance from
+UnifiedGroupContribution.GetFormationEnergyCovariance), and the MTDF of every
+sample is found by re-solving one LP whose constraint matrix is fixed - only
+the right-hand side depends on the sampled dG0_r'.
+"""
+
+import logging
+import multiprocessing
+import numpy as np
+
+import scipy.optimize as opt
+
+from pygibbs.thermodynamic_constants import default_T, R, default_c_range
+from pygibbs.pathway_modelling import DeltaGNormalization
+
+RT = R * default_T
+
+DEFAULT_QUANTILES = (0.025, 0.25, 0.5, 0.75, 0.975)
+
+
+def SampleFormationEnergies(mean, cov, n_samples, random_state=None):
+    """Draws correlated dG0_f vectors.
+
+    Args:
+        mean: a 1xNc vector of formation energies. NaN values (unknown
+            compounds) are kept as NaN in all samples.
+        cov: an NcxNc covariance matrix (positive semi-definite).
+        n_samples: the number of samples to draw.
+        random_state: a numpy RandomState (or None for the global one).
+
+    Returns:
+        An (n_samples x Nc) array, one sample per row.
+    """
+    mean = np.array(mean, dtype=float).flatten()
+    cov = np.array(cov, dtype=float)
+    rand = random_state or np.random
+
+    # Use the eigen-decomposition rather than Cholesky, since the covariance
+    # derived from group contributions is usually singular.
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    L = eigvecs * np.sqrt(np.clip(eigvals, 0, None))
+    z = rand.standard_normal((n_samples, len(mean)))
+    return mean + np.dot(z, L.T)
+
+
+def _SolveMtdfBatch(args):
+    """Module-level wrapper for using MtdfSampler with multiprocessing."""
+    sampler, dG0_r_samples = args
+    return sampler.SolveMany(dG0_r_samples)
+
+
+class MtdfSampler(object):
+    """The MTDF LP of one pathway, re-solved for many dG0_r' vectors.
+
+    The variables are the Nc ln-concentrations and the driving force B.
+    Since dG0_r' only appears in the right-hand side, the constraint matrix
+    is built once.
+    """
+
+    def __init__(self, S, fluxes, ln_conc_lb, ln_conc_ub, known_reactions=None,
+                 normalization=DeltaGNormalization.DEFAULT):
+        """Initialize the sampler.
+
+        Args:
+            S: the stoichiometric matrix (compounds x reactions).
+            fluxes: a 1xNr vector of relative fluxes.
+            ln_conc_lb, ln_conc_ub: 1xNc vectors of ln-concentration bounds.
+            known_reactions: a boolean vector of reactions that constrain the
+                MTDF (i.e. have a known dG0). By default, all reactions.
+            normalization: a DeltaGNormalization value.
+        """
+        S = np.array(S, dtype=float)
+        fluxes = np.array(fluxes, dtype=float).flatten()
+        self.Nc, self.Nr = S.shape
+        if known_reactions is None:
+            known_reactions = np.ones(self.Nr, dtype=bool)
+        known_reactions = np.array(known_reactions, dtype=bool).flatten()
+
+        if normalization == DeltaGNormalization.DIVIDE_BY_FLUX:
+            norm = np.zeros(self.Nr)
+            norm[fluxes != 0] = 1.0 / fluxes[fluxes != 0]
+        elif normalization == DeltaGNormalization.TIMES_FLUX:
+            norm = fluxes
+        elif normalization == DeltaGNormalization.SIGN_FLUX:
+            norm = np.sign(fluxes)
+        else:
+            raise ValueError("bad value for normalization method: "
+                             + str(normalization))
+
+        # -norm_r * (dG0_r + RT * S_r * lnC) >= B, i.e.
+        # RT * norm_r * S_r * lnC + B <= -norm_r * dG0_r
+        self.ieq = np.where(known_reactions & (fluxes != 0))[0]
+        self.ieq_norm = norm[self.ieq]
+        self.A_ub = np.hstack([RT * (S[:, self.ieq] * self.ieq_norm).T,
+                               np.ones((len(self.ieq), 1))])
+
+        # reactions with zero flux must be in equilibrium
+        self.eq = np.where(known_reactions & (fluxes == 0))[0]
+        self.A_eq = np.hstack([RT * S[:, self.eq].T,
+                               np.zeros((len(self.eq), 1))])
+
+        self.c = np.zeros(self.Nc + 1)
+        self.c[-1] = -1.0 # maximize B
+
+        lb = np.array(ln_conc_lb, dtype=float).flatten()
+        ub = np.array(ln_conc_ub, dtype=float).flatten()
+        self.bounds = zip(lb, ub) + [(None, None)]
+
+    @staticmethod
+    def FromPathway(pathway, c_range=None, bounds=None):
+        """Creates the sampler for a pathway_modelling.Pathway object.
+
+        Args:
+            pathway: a Pathway (or KeggPathway) object.
+            c_range: a tuple (min, max) for concentrations (in M). The
+                default is the pathway's own c_range, or else the same
+                default as Pathway._FindMtdf.
+            bounds: a list of (lower bound, upper bound) tuples for compound
+                concentrations.
+        """
+        c_range = c_range or getattr(pathway, 'c_range', None) or \
+            default_c_range
+        if bounds is None:
+            bounds = getattr(pathway, 'bounds', None)
+        ln_conc_lb, ln_conc_ub = LnConcentrationBounds(pathway.Nc, c_range,
+                                                       bounds)
+        known = np.isfinite(np.array(pathway.dG0_r_prime)).flatten()
+        return MtdfSampler(pathway.S, pathway.fluxes, ln_conc_lb, ln_conc_ub,
+                           known_reactions=known,
+                           normalization=pathway.normalization)
+
+    def Solve(self, dG0_r):
+        """Returns the MTDF for one dG0_r' vector (NaN if infeasible)."""
+        if not len(self.ieq):
+            return np.inf # no reaction constrains the driving force
+        
+        dG0_r = np.array(dG0_r, dtype=float).flatten()
+        b_ub = -self.ieq_norm * dG0_r[self.ieq]
+        A_eq, b_eq = None, None
+        if len(self.eq):
+            A_eq, b_eq = self.A_eq, -dG0_r[self.eq]
+
+        res = opt.linprog(self.c, A_ub=self.A_ub, b_ub=b_ub,
+                          A_eq=A_eq, b_eq=b_eq, bounds=self.bounds)
+        if res.status != 0:
+            return np.nan
+        return -res.fun
+
+    def SolveMany(self, dG0_r_samples):
+        """Returns an array of the MTDF for each row of dG0_r_samples."""
+        return np.array([self.Solve(dG0_r) for dG0_r in dG0_r_samples])
+
+    def SolveParallel(self, dG0_r_samples, n_processes=1):
+        """Same as SolveMany, splitting the rows between worker processes."""
+        if n_processes <= 1:
+            return self.SolveMany(dG0_r_samples)
+        chunks = np.array_split(np.array(dG0_r_samples), n_processes)
+        pool = multiprocessing.Pool(n_processes)
+        try:
+            results = pool.map(_SolveMtdfBatch,
+                               [(self, chunk) for chunk in chunks])
+        finally:
+            pool.close()
+            pool.join()
+        return np.hstack(results)
+
+
+def LnConcentrationBounds(Nc, c_range, bounds=None):
+    """Same bounds as Pathway._MakeLnConcentratonBounds, as numpy arrays."""
+    c_lower, c_upper = c_range
+    ln_conc_lb = np.ones(Nc) * np.log(c_lower)
+    ln_conc_ub = np.ones(Nc) * np.log(c_upper)
+    if bounds:
+        for i, (lb, ub) in enumerate(bounds):
+            log_lb = np.log(lb or c_lower)
+            log_ub = np.log(ub or c_upper)
+            if log_lb > log_ub:
+                raise Exception("Lower bound is greater than upper bound: "
+                                "%d > %d" % (log_lb, log_ub))
+            elif abs(log_lb - log_ub) < 1e-2:
+                log_lb = log_ub - 1e-2
+            ln_conc_lb[i] = log_lb
+            ln_conc_ub[i] = log_ub
+    return ln_conc_lb, ln_conc_ub
+
+
+def ReversibilityIndices(S, fluxes, dG0_r_samples, ln_conc):
+    """Computes the reversibility index of every reaction in every sample.
+
+    Uses the logscale definition of reversibility.CalculateReversability:
+        2/N * (-dG0_r/RT - ln Gamma)
+    signed by the flux direction, where N is the sum of absolute
+    stoichiometric coefficients and ln Gamma the ln-concentration term.
+
+    Returns:
+        An (n_samples x Nr) array.
+    """
+    S = np.array(S, dtype=float)
+    sign = np.sign(np.array(fluxes, dtype=float).flatten())
+    ln_gamma = np.dot(np.array(ln_conc, dtype=float).flatten(), S)
+    sum_abs_s = np.abs(S).sum(0)
+    sum_abs_s[sum_abs_s == 0] = np.nan
+    return sign * 2.0 / sum_abs_s * (-np.array(dG0_r_samples) / RT - ln_gamma)
+
+
+class PathwayUncertaintyAnalysis(object):
+    """Propagates formation energy uncertainty to the MTDF of a pathway."""
+
+    def __init__(self, pathway, dG0_f_cov, c_range=None, bounds=None):
+        """Initialize the analysis.
+
+        Args:
+            pathway: a Pathway object created with formation energies.
+            dG0_f_cov: the NcxNc covariance of the formation energies.
+            c_range: a tuple (min, max) for concentrations (in M).
+            bounds: a list of (lower bound, upper bound) tuples for compound
+                concentrations.
+        """
+        if pathway.dG0_f_prime is None:
+            raise ValueError("Uncertainty analysis requires a Pathway with "
+                             "formation energies")
+        self.pathway = pathway
+        self.dG0_f = np.array(pathway.dG0_f_prime, dtype=float).flatten()
+        self.dG0_f_cov = np.array(dG0_f_cov, dtype=float)
+        self.sampler = MtdfSampler.FromPathway(pathway, c_range, bounds)
+
+        # unknown formation energies only appear in unknown reactions,
+        # so they can be set to zero without affecting the result.
+        self.unknown = ~np.isfinite(self.dG0_f)
+        self.dG0_f[self.unknown] = 0.0
+        self.dG0_f_cov[self.unknown, :] = 0.0
+        self.dG0_f_cov[:, self.unknown] = 0.0
+
+        if bounds is None:
+            bounds = getattr(pathway, 'bounds', None)
+        self.ln_conc = np.log(pathway.GetPhysiologicalConcentrations(bounds))
+
+    def Run(self, n_samples=1000, batch_size=1000, quantiles=DEFAULT_QUANTILES,
+            n_processes=1, random_state=None):
+        """Samples the MTDF and reaction reversibilities.
+
+        The samples are drawn and solved in batches, and only the MTDF
+        values and reversibility indices are kept.
+
+        Returns:
+            A dictionary with the quantiles (and mean/std) of the MTDF
+            and the quantiles of the reversibility index of each reaction.
+        """
+        S = np.array(self.pathway.S, dtype=float)
+        known = np.isfinite(np.array(self.pathway.dG0_r_prime)).flatten()
+        mtdf = np.zeros(n_samples)
+        rev = np.zeros((n_samples, self.pathway.Nr))
+
+        for start in xrange(0, n_samples, batch_size):
+            n = min(batch_size, n_samples - start)
+            dG0_f = SampleFormationEnergies(self.dG0_f, self.dG0_f_cov, n,
+                                            random_state=random_state)
+            dG0_r = np.dot(dG0_f, S)
+            dG0_r[:, ~known] = np.nan
+            mtdf[start:start+n] = self.sampler.SolveParallel(dG0_r, n_processes)
+            rev[start:start+n, :] = ReversibilityIndices(
+                S, self.pathway.fluxes, dG0_r, self.ln_conc)
+            logging.debug('Sampled MTDF for %d out of %d samples',
+                          start + n, n_samples)
+
+        solved = np.isfinite(mtdf)
+        q = 100.0 * np.array(quantiles)
+        summary = {'n_samples': n_samples,
+                   'n_failed': int(np.sum(np.isnan(mtdf))),
+                   'quantiles': list(quantiles),
+                   'mtdf_mean': np.nan,
+                   'mtdf_std': np.nan,
+                   'mtdf_quantiles': np.ones(len(q)) * np.nan,
+                   'fraction_feasible': np.nan,
+                   'reversibility_quantiles': np.ones((len(q), self.pathway.Nr)) * np.nan}
+        if solved.any():
+            summary['fraction_feasible'] = np.mean(mtdf[solved] > 0)
+            summary['mtdf_mean'] = np.mean(mtdf[solved])
+            summary['mtdf_std'] = np.std(mtdf[solved])
+            summary['mtdf_quantiles'] = np.array(
+                [np.percentile(mtdf[solved], x) for x in q])
+        for r in np.where(known)[0]:
+            summary['reversibility_quantiles'][:, r] = \
+                [np.percentile(rev[:, r], x) for x in q]
+        return summary
+
+
+def RunForPathways(name_to_pathway_and_cov, **kwargs):
+    """Runs PathwayUncertaintyAnalysis for many pathways.
+
+    Args:
+        name_to_pathway_and_cov: a dictionary mapping pathway names to
+            (Pathway, dG0_f covariance) pairs.
+        kwargs: passed on to PathwayUncertaintyAnalysis.Run().
+
+    Returns:
+        A dictionary mapping each name to its summary.
+    """
+    summaries = {}
+    for name, (pathway, cov) in sorted(name_to_pathway_and_cov.iteritems()):
+        logging.info('Sampling the MTDF of pathway %s', name)
+        analysis = PathwayUncertaintyAnalysis(pathway, cov)
+        summaries[name] = analysis.Run(**kwargs)
+    return summaries
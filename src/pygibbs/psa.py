@@ -1,6 +1,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.optimize as opt
+import time
 from pygibbs.thermodynamic_constants import R, default_T
 
 def phi(x, epsilon, kappa):
@@ -64,7 +65,7 @@ def PSA2(Epsilon, Kappa, dG, T=default_T, verbose=False):
     l = InvPhi(np.exp(dG/(R*T)), Epsilon, Kappa) # solve for the Lagrange multiplier
     
     costs = []
-    for i in xrange(len(M)):
+    for i in xrange(len(Epsilon)):
         costs.append(Epsilon[i] + l/(2 + 2*np.sqrt(1+l/(Epsilon[i]*(1+Kappa[i])))))
     
     if verbose:
@@ -88,6 +89,158 @@ def PSA2_homogenous(N, epsilon, kappa, dG, T=default_T, verbose=False):
 
     return 1 / np.sum(costs)
 
+def _EnsembleArrays(Epsilon, Kappa):
+    """
+        Convert Epsilon and Kappa to 2D arrays of shape (n_samples, n_enzymes).
+        A 1D input is treated as a single sample.
+    """
+    Epsilon = np.atleast_2d(np.array(Epsilon, dtype=float))
+    Kappa = np.atleast_2d(np.array(Kappa, dtype=float))
+    if Epsilon.shape != Kappa.shape:
+        raise ValueError("Epsilon and Kappa must have the same shape: %s != %s"
+                         % (str(Epsilon.shape), str(Kappa.shape)))
+    return Epsilon, Kappa
+
+def EpsilonKappaEnsemble(M, S, k_plus, k_minus):
+    """
+        Same as EpsilonKappa(), for arrays of shape (n_samples, n_enzymes).
+        All arguments are broadcast against each other, so for example M and S
+        can be given once (n_enzymes) while k_plus and k_minus are sampled.
+    """
+    M, S, k_plus, k_minus = [np.array(a, dtype=float)
+                             for a in (M, S, k_plus, k_minus)]
+    return np.atleast_2d(M * S / k_plus), np.atleast_2d(k_plus / k_minus)
+
+def LogPhiEnsemble(x, Epsilon, Kappa):
+    """
+        Input:
+            x - array of floats (length = n_samples)
+            Epsilon, Kappa - arrays of shape (n_samples, n_enzymes)
+        
+        Calculate log(Phi(x[k], Epsilon[k, :], Kappa[k, :])) for all samples k.
+        
+        Since sqrt(z) + sqrt(z + 1) = exp(arcsinh(sqrt(z))), we have:
+            log(phi(x, epsilon, kappa)) = -2 * arcsinh(sqrt(epsilon*(1+kappa)/x))
+        which is stable even when Phi itself underflows.
+    """
+    Epsilon, Kappa = _EnsembleArrays(Epsilon, Kappa)
+    x = np.array(x, dtype=float).reshape(-1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_phi = -2.0 * np.arcsinh(np.sqrt(Epsilon * (1 + Kappa) / x))
+    log_Phi = np.sum(log_phi, axis=1)
+    # x may be a single value that is broadcast against all the samples
+    x = np.broadcast_to(x, (log_Phi.shape[0], 1))
+    log_Phi[x[:, 0] <= 0] = np.inf # same convention as phi()
+    return log_Phi
+
+def PhiEnsemble(x, Epsilon, Kappa):
+    """
+        Vectorized version of Phi(), see LogPhiEnsemble()
+    """
+    return np.exp(LogPhiEnsemble(x, Epsilon, Kappa))
+
+def InvPhiEnsemble(p, Epsilon, Kappa, rtol=1e-12, max_iter=200):
+    """
+        Input:
+            p - array of floats in [0, 1] (length = n_samples), or a scalar
+            Epsilon, Kappa - arrays of shape (n_samples, n_enzymes)
+        
+        Find x[k] such that Phi(x[k], Epsilon[k, :], Kappa[k, :]) = p[k]
+        for all samples at once.
+        
+        Since log(phi_i) = -2 * arcsinh(sqrt(a_i/x)), where a_i = epsilon_i*(1+kappa_i),
+        we need to solve:
+            sum_i arcsinh(sqrt(a_i/x)) = c,  where c = -log(p)/2
+        The left side is monotonically decreasing in x, and is bracketed by:
+            x_low  = max_i a_i / sinh(c)^2     (where the largest term alone is c)
+            x_high = max_i a_i / sinh(c/n)^2   (where all terms are at most c/n)
+        so we run a bisection (in log-space) on all samples simultaneously.
+    """
+    Epsilon, Kappa = _EnsembleArrays(Epsilon, Kappa)
+    n_samples, n_enzymes = Epsilon.shape
+    p = np.array(p, dtype=float) * np.ones(n_samples)
+    if ((p < 0) | (p > 1)).any():
+        raise ValueError("Phi can only take values in [0, 1]")
+    
+    x = np.zeros(n_samples)
+    x[p == 1] = np.inf
+    solve = (p > 0) & (p < 1)
+    if not solve.any():
+        return x
+    
+    A = Epsilon[solve, :] * (1 + Kappa[solve, :])
+    c = -0.5 * np.log(p[solve])
+    a_max = np.max(A, axis=1)
+    log_low = np.log(a_max) - 2 * np.log(np.sinh(c))
+    log_high = np.log(a_max) - 2 * np.log(np.sinh(c / n_enzymes))
+
+    for _ in xrange(max_iter):
+        log_mid = 0.5 * (log_low + log_high)
+        f = np.sum(np.arcsinh(np.sqrt(A / np.exp(log_mid)[:, np.newaxis])), axis=1)
+        too_low = f > c # the root is to the right of log_mid
+        log_low = np.where(too_low, log_mid, log_low)
+        log_high = np.where(too_low, log_high, log_mid)
+        if np.max(log_high - log_low) < rtol:
+            break
+    
+    x[solve] = np.exp(0.5 * (log_low + log_high))
+    return x
+
+def PSA1Ensemble(Epsilon):
+    """
+        Vectorized version of PSA1(), for Epsilon of shape (n_samples, n_enzymes)
+    """
+    Epsilon = np.atleast_2d(np.array(Epsilon, dtype=float))
+    return 1.0 / np.sum(Epsilon, axis=1)
+
+def PSA2Ensemble(Epsilon, Kappa, dG, T=default_T):
+    """
+        Vectorized version of PSA2()
+        
+        Epsilon, Kappa - arrays of shape (n_samples, n_enzymes)
+        dG - the overall change in Gibbs energy of each pathway sample
+             (a scalar or an array of length n_samples)
+    """
+    Epsilon, Kappa = _EnsembleArrays(Epsilon, Kappa)
+    dG = np.array(dG, dtype=float) * np.ones(Epsilon.shape[0])
+    
+    # solve for the Lagrange multipliers of all samples
+    l = InvPhiEnsemble(np.exp(dG/(R*T)), Epsilon, Kappa)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        costs = Epsilon + l/(2 + 2*np.sqrt(1 + l/(Epsilon*(1+Kappa))))
+    psa = 1.0 / np.sum(costs, axis=1)
+    psa[dG == 0] = 0.0
+    return psa
+
+def BenchmarkEnsemble(n_samples=1000, n_enzymes=5, dG=-20.0, seed=0):
+    """
+        Compare the running time and results of PSA2() and PSA2Ensemble()
+        on a random ensemble of kinetic parameters.
+        
+        Returns:
+            A tuple (scalar time, ensemble time, max relative difference).
+    """
+    rand = np.random.RandomState(seed)
+    M = rand.uniform(0.1, 1.0, size=(n_samples, n_enzymes))
+    k_plus = 10 ** rand.uniform(-1, 2, size=(n_samples, n_enzymes))
+    k_minus = 10 ** rand.uniform(-2, 2, size=(n_samples, n_enzymes))
+    Epsilon, Kappa = EpsilonKappaEnsemble(M, 1.0, k_plus, k_minus)
+    
+    t0 = time.time()
+    psa_scalar = np.array([PSA2(Epsilon[k, :], Kappa[k, :], dG)
+                           for k in xrange(n_samples)])
+    t_scalar = time.time() - t0
+    
+    t0 = time.time()
+    psa_ensemble = PSA2Ensemble(Epsilon, Kappa, dG)
+    t_ensemble = time.time() - t0
+    
+    max_diff = np.max(np.abs(psa_ensemble - psa_scalar) / psa_scalar)
+    print "PSA2 for %d samples with %d enzymes:" % (n_samples, n_enzymes)
+    print "scalar: %.3g sec, ensemble: %.3g sec, max relative difference: %.2g" % \
+        (t_scalar, t_ensemble, max_diff)
+    return t_scalar, t_ensemble, max_diff
+
 if __name__ == "__main__":
     dG_vec = np.arange(-50, 1e-10, 2)
 
@@ -13,13 +13,13 @@ from pygibbs.kegg_errors import KeggNonCompoundException
 from pygibbs.kegg_errors import KeggReactionNotBalancedException
 from pygibbs.kegg_reaction import Reaction
 from toolbox import plotting
-from SOAPpy import WSDL 
 from pygibbs.metacyc import MetaCyc, MetaCycNonCompoundException
 import logging
 import matplotlib
 import re
 import numpy as np
 import random
+from scipy import sparse as sp
 from pygibbs.thermodynamic_estimators import LoadAllEstimators
 from pygibbs.thermodynamic_errors import MissingCompoundFormationEnergy
 from pygibbs.thermodynamic_errors import MissingReactionEnergy
@@ -33,6 +33,7 @@ def try_kegg_api():
     G = GroupContribution(db, html_writer=html_writer)
     G.init()
     
+    from SOAPpy import WSDL
     wsdl = 'http://soap.genome.jp/KEGG.wsdl'
     serv = WSDL.Proxy(wsdl)
     
@@ -144,8 +145,150 @@ def CalculateReversabilitydeltaG(reaction, thermo, concentration_map=None):
     cfactor = ConcentrationFactor(reaction, cmap, thermo.c_mid)
     return pylab.exp(dG0 + R * thermo.T * cfactor)
 
-def calculate_reversibility_histogram(G, thermo, cmap, id):
+class ReversibilityEngine(object):
+    """Calculates the reversibility index of many reactions at once.
+    
+    Reactions are balanced only once (the result is cached by reaction ID),
+    and the reversibility of all requested reactions is computed from a
+    sparse stoichiometric matrix and a single call to the estimator's
+    GetTransfromedReactionEnergies(), so the same engine can be reused with
+    different concentration maps.
+    """
+    
+    # the exceptions that mark a reaction as unusable when it is added
+    REACTION_ERRORS = (thermodynamics.MissingCompoundFormationEnergy,
+                       KeggNonCompoundException,
+                       MetaCycNonCompoundException,
+                       KeggReactionNotBalancedException)
+    
+    # the number of reactions per GetTransfromedReactionEnergies() call
+    REACTION_BLOCK_SIZE = 1000
+    
+    def __init__(self, thermo):
+        self.thermo = thermo
+        self.id2sparse = {} # a balanced sparse reaction, or the exception raised
+    
+    def AddReaction(self, id, reaction_factory, balance_water=True):
+        """Adds a reaction, unless its ID was already added.
+        
+        Args:
+            id: a hashable reaction identifier.
+            reaction_factory: a callable returning the Reaction object. Any
+                of the REACTION_ERRORS it raises is stored for this ID.
+            balance_water: whether to balance the reaction with H2O.
+        """
+        if id in self.id2sparse:
+            return
+        try:
+            reaction = reaction_factory()
+            if balance_water:
+                reaction.Balance(balance_water=True)
+            self.id2sparse[id] = dict(reaction.sparse)
+        except self.REACTION_ERRORS, e:
+            self.id2sparse[id] = e
+    
+    def AddKeggReactions(self, rids, balance_water=True):
+        kegg = Kegg.getInstance()
+        for rid in rids:
+            self.AddReaction(rid, lambda rid=rid: kegg.rid2reaction(rid),
+                             balance_water=balance_water)
+    
+    def GetError(self, id):
+        """Returns the exception raised when adding this reaction, or None."""
+        value = self.id2sparse.get(id, None)
+        if isinstance(value, Exception):
+            return value
+        return None
+    
+    def _GetReactionEnergies(self, S, cids):
+        """Returns the dG0_r' of the columns of S (NaN where unknown).
+        
+        Like Reaction.PredictReactionEnergy(), this uses the estimator's own
+        GetTransfromedReactionEnergies() (which group contribution and the
+        merged estimators override) and leaves H+ out of the matrix.
+        
+        The estimators need a dense matrix, so S is passed on in blocks of
+        REACTION_BLOCK_SIZE reactions, each with only the compounds that
+        take part in them.
+        """
+        S = S.tocsc()
+        keep = np.array([cid != HPLUS for cid in cids])
+        dG0_r = np.zeros(S.shape[1])
+        for start in xrange(0, S.shape[1], self.REACTION_BLOCK_SIZE):
+            block = S[:, start:start + self.REACTION_BLOCK_SIZE]
+            rows = np.flatnonzero(keep & (abs(block).sum(1).A1 > 0))
+            block_dG0_r = self.thermo.GetTransfromedReactionEnergies(
+                np.matrix(block[rows, :].todense()), [cids[i] for i in rows])
+            dG0_r[start:start + block.shape[1]] = \
+                np.array(block_dG0_r, dtype=float).flatten()
+        return dG0_r
+    
+    def _MakeStoichiometricMatrix(self, ids):
+        """Returns a sparse (compounds x reactions) matrix and the list of cids."""
+        cids = sorted(set(cid for id in ids for cid in self.id2sparse[id]))
+        cid2index = dict((cid, i) for i, cid in enumerate(cids))
+        rows, cols, vals = [], [], []
+        for r, id in enumerate(ids):
+            for cid, coeff in self.id2sparse[id].iteritems():
+                rows.append(cid2index[cid])
+                cols.append(r)
+                vals.append(coeff)
+        S = sp.csc_matrix((vals, (rows, cols)), shape=(len(cids), len(ids)))
+        return S, cids
+    
+    def Calculate(self, ids, concentration_map=None, logscale=False):
+        """Calculates the reversibility of all the given (added) reactions.
+        
+        Uses the same definition as CalculateReversability().
+        
+        Returns:
+            A dictionary mapping each ID to its reversibility index, to None
+            if all the compounds have a fixed concentration, or to the
+            exception that prevented the calculation.
+        """
+        cmap = concentration_map or GetEmptyConcentrationMap()
+        result = {}
+        good_ids = []
+        for id in ids:
+            error = self.GetError(id)
+            if error is not None:
+                result[id] = error
+            else:
+                good_ids.append(id)
+        if not good_ids:
+            return result
+        
+        S, cids = self._MakeStoichiometricMatrix(good_ids)
+        absS = abs(S)
+        dG0_r = self._GetReactionEnergies(S, cids)
+        
+        ln_conc = np.log([cmap.get(cid, None) or self.thermo.c_mid
+                          for cid in cids])
+        ln_Gamma = S.T * ln_conc
+        not_fixed = np.array([cid not in cmap for cid in cids], dtype=float)
+        sum_abs_s = absS.T * not_fixed
+        
+        for r, id in enumerate(good_ids):
+            if not np.isfinite(dG0_r[r]):
+                result[id] = thermodynamics.MissingCompoundFormationEnergy(
+                    "The dG0_r of reaction %s is unknown" % str(id))
+            elif sum_abs_s[r] == 0:
+                result[id] = None
+            else:
+                ln_rev = -dG0_r[r]/(R*self.thermo.T) - ln_Gamma[r]
+                if logscale: # 2/N * (log K' - log Q'')
+                    result[id] = 2.0 / sum_abs_s[r] * ln_rev
+                else:        # (K' / Q'') ^ (2/N)
+                    result[id] = np.exp(ln_rev) ** (2.0 / sum_abs_s[r])
+        return result
+
+def calculate_reversibility_histogram(G, thermo, cmap, id, engine=None):
+    """
+        Pass the same ReversibilityEngine to repeated calls (e.g. with and
+        without a concentration map) in order to reuse the balanced reactions.
+    """
     kegg = Kegg.getInstance()
+    engine = engine or ReversibilityEngine(thermo)
     histogram = {}
     histogram['Not first'] = []
     histogram['Rest'] = []
@@ -161,6 +304,7 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
     total_rxns = 0
     only_currency = 0
     non_balanced = 0
+    non_compound = 0
     
     n_pathways_with_thermo_data = 0
     n_short_pathways = 0
@@ -171,6 +315,14 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
     
     debug_file = open('../res/kegg_' + id + '_' + ('constrained_' if len(cmap) > 0 else 'non_constrained_') + 'rev.txt', 'w')
     debug_file.write("Module\tPosition\tReaction Name\tDefinition\tEC list\tEquation\tRev IND\n")
+    debug_lines = []
+    
+    all_rids = set()
+    for rid_flux_list in kegg.mid2rid_map.itervalues():
+        if rid_flux_list and len(rid_flux_list) >= 2:
+            all_rids.update([rid for rid, _ in rid_flux_list])
+    engine.AddKeggReactions(all_rids)
+    rid2gamma = engine.Calculate(all_rids, concentration_map=cmap)
     
     for mid, rid_flux_list in kegg.mid2rid_map.iteritems():
         if not rid_flux_list or len(rid_flux_list) < 2:
@@ -188,16 +340,15 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
                 total_rxns += 1
                 
             try:
-                reaction = kegg.rid2reaction(rid)
-                reaction.Balance(balance_water=True)
-                gamma = CalculateReversability(reaction, thermo, 
-                                               concentration_map=cmap)
-                r = pylab.log10(gamma)
-                if r == None:
+                gamma = rid2gamma[rid]
+                if isinstance(gamma, Exception):
+                    raise gamma
+                if gamma == None:
                     if rid not in rxns_map:
                         rxns_map[rid] = 1
                         only_currency += 1
                     continue
+                r = pylab.log10(gamma)
                 
                 r *= flux
                 
@@ -208,7 +359,7 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
                 rxn = kegg.rid2reaction_map[rid]
                 dbg = "%s__DEL__%d__DEL__%s__DEL__%s__DEL__%s__DEL__%s__DEL__%f\n" % (kegg.mid2name_map[mid], i+1, rxn.name, rxn.definition, str(rxn.ec_list), rxn.equation, r)
                 dbg = re.sub ('\t', ' ', dbg)
-                debug_file.write(re.sub('__DEL__', '\t', dbg))
+                debug_lines.append(re.sub('__DEL__', '\t', dbg))
                 
                 if i > 0:
                     histogram['Not first'].append(r)
@@ -239,6 +390,11 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
                         non_balanced += 1
                     #print 'Reaction cannot be balanced, uid: %s' % rxn
                     continue
+            except KeggNonCompoundException:
+                if rid not in rxns_map:
+                    rxns_map[rid] = 1
+                    non_compound += 1
+                continue
         
         if has_thermo_data == 1:
             n_pathways_with_thermo_data += 1
@@ -265,6 +421,7 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
     rxn_reversibilities.sort(reverse=True)
     print rxn_reversibilities[:20]
                                         
+    debug_file.writelines(debug_lines)
     debug_file.close()
     
     debug_file = open('../res/kegg_' + id + '_' + ('constrained_' if len(cmap) > 0 else 'non_constrained_') + 'rev_stats.txt', 'w')
@@ -276,6 +433,7 @@ def calculate_reversibility_histogram(G, thermo, cmap, id):
     debug_file.write("Reactions with known dG0: %d\n" % hits)
     debug_file.write("Reactions with unknown dG0: %d\n" % misses)
     debug_file.write("Non balanced reactions: %d\n" % non_balanced)
+    debug_file.write("Reactions with non-compounds: %d\n" % non_compound)
     debug_file.write("Reactions without unknown concentrations: %d\n" % only_currency)
     debug_file.close()
     
@@ -427,9 +585,13 @@ def plot_bootstrap_stats(histogram, title=''):
 
 
 
-def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
-    
+def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id, engine=None):
+    """
+        Pass the same ReversibilityEngine to repeated calls (e.g. with and
+        without a concentration map) in order to reuse the parsed reactions.
+    """
     kegg = Kegg.getInstance()
+    engine = engine or ReversibilityEngine(thermo)
     histogram = {}
     histogram['Not first'] = []
     histogram['Rest'] = []
@@ -461,6 +623,19 @@ def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
     
     debug_file = open('../res/metacyc_' + id + ('_constrained_' if len(cmap) > 0 else '_non_constrained_') + 'rev.txt', 'w')
     debug_file.write("Pathway\tPosition\tReaction Name\tEC list\tEquation\tRev IND\n")
+    debug_lines = []
+    
+    all_rxns = set()
+    for pathway in metacyc.uid2pathway_map.itervalues():
+        rxns_dict = pathway.GetRxnsOrder()
+        if len(rxns_dict) >= 2:
+            all_rxns.update([rxn for rxn in rxns_dict
+                             if metacyc.rxn_uid2sparse_reaction(rxn)])
+    for rxn in all_rxns:
+        engine.AddReaction(rxn, lambda rxn=rxn: Reaction(str(rxn),
+            sparse=metacyc.sparse2kegg_cids(metacyc.rxn_uid2sparse_reaction(rxn), kegg)),
+            balance_water=False)
+    rxn2gamma = engine.Calculate(all_rxns, concentration_map=cmap)
     
     for pathway in metacyc.uid2pathway_map.itervalues():
         rxns_dict = pathway.GetRxnsOrder()
@@ -497,7 +672,10 @@ def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
                             rxn_map_misses += 1
                         continue
                     
-                    reaction = Reaction(str(rxn), sparse=metacyc.sparse2kegg_cids(sparse, kegg))
+                    gamma = rxn2gamma[rxn]
+                    if isinstance(gamma, (KeggNonCompoundException,
+                                          MetaCycNonCompoundException)):
+                        raise gamma
                     
                     if (rxn in rxn_dirs):
                         flux = rxn_dirs[rxn]
@@ -508,9 +686,9 @@ def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
                         continue
                     
                     # deltaG r = CalculateReversabilitydeltaG(sparse, thermo, c_mid, pH, pMg, I, T, concentration_map=cmap)
-                    gamma = CalculateReversability(reaction, thermo,
-                                                   concentration_map=cmap)
-                    r = pylab.log10(gamma)
+                    if isinstance(gamma, Exception):
+                        raise gamma
+                    r = None if gamma is None else pylab.log10(gamma)
                     
                     has_thermo_data = 1
                     
@@ -529,7 +707,7 @@ def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
                         else:
                             pw_r_map[pos - 1] = str(r)
                             
-                        debug_file.write("%s\t%d\t%s\t%s\t%s\t%f\n" % (str(pathway.name), pos, metacyc.uid2reaction_map[rxn].name, metacyc.uid2reaction_map[rxn].ec_number, metacyc.uid2reaction_map[rxn].equation, r))
+                        debug_lines.append("%s\t%d\t%s\t%s\t%s\t%f\n" % (str(pathway.name), pos, metacyc.uid2reaction_map[rxn].name, metacyc.uid2reaction_map[rxn].ec_number, metacyc.uid2reaction_map[rxn].equation, r))
                         
                         if pos >= 2:
                             histogram['Not first'].append(r)
@@ -586,6 +764,7 @@ def calculate_metacyc_reversibility_histogram(thermo, metacyc, cmap, id):
                     if (first_r == curr_max):
                         n_first_max += 1
                 
+    debug_file.writelines(debug_lines)
     debug_file.close()
     
     debug_file = open('../res/metacyc_' + id + ('_constrained_' if len(cmap) > 0 else '_non_constrained_') + 'rev_stats.txt', 'w')
@@ -677,9 +856,10 @@ def analyse_reversibility(thermo, name):
     logging.info('Writing HTML output to %s', html_fname)
     html_writer = HtmlWriter(html_fname)
     cmap = GetConcentrationMap()
+    engine = ReversibilityEngine(thermo)
     
     histogram, rel_histogram, perc_first_max = calculate_reversibility_histogram(
-        thermo, cmap=cmap, id=name)
+        None, thermo, cmap=cmap, id=name, engine=engine)
     
     html_writer.write('<h1>' + name + ': Constrained co-factors</h1>Percentage of modules where first reaction is the maximal: %f<br>' % perc_first_max)
     # deltaG plot fig1 = plot_histogram(histogram, html_writer, title='With constraints on co-factors', legend_loc='lower right' , xlim=80)
@@ -697,7 +877,7 @@ def analyse_reversibility(thermo, name):
     pylab.savefig('../res/' + name + '_kegg_reversibility1_rel.png', figure=fig1_rel, format='png')
     
     histogram, rel_histogram, perc_first_max = calculate_reversibility_histogram(
-        thermo, cmap={}, id=name)
+        None, thermo, cmap={}, id=name, engine=engine)
 
     html_writer.write('<h1>' + name + ': Non constrained co-factors</h1>Percentage of modules where first reaction is the maximal: %f<br>' % perc_first_max)
     fig2 = plot_histogram(histogram, html_writer, title='No constraints on co-factors', xlim=20)
@@ -725,9 +905,10 @@ def metacyc_data(org, id, thermo, max_pathway_length_for_fig=8):
     html_writer = HtmlWriter('../res/' + org + '_' + id + '_reversibility.html')
     metacyc_inst = MetaCyc(org, db)
     cmap = GetConcentrationMap()
+    engine = ReversibilityEngine(thermo)
     
     (histogram,rel_histogram,perc_first_max, reg_hist) = calculate_metacyc_reversibility_histogram(thermo, metacyc_inst,
-                                                  cmap=cmap, id=(org + '_' + id))
+                                                  cmap=cmap, id=(org + '_' + id), engine=engine)
     
     html_writer.write('<h1>Constrained co-factors</h1>Percentage of modules where first reaction is the maximal: %f<br>' % perc_first_max)
     # deltaG plot fig1 = plot_histogram(histogram, html_writer, title=('%s pathways: With constraints on co-factors' % org), legend_loc='lower right' , xlim=80)
@@ -753,7 +934,7 @@ def metacyc_data(org, id, thermo, max_pathway_length_for_fig=8):
     pylab.savefig('../res/' + org + '_' + id + '_reversibility1_rel.png', figure=fig1_rel, format='png')
     
     (histogram,rel_histogram,perc_first_max, reg_hist) = calculate_metacyc_reversibility_histogram(thermo, metacyc_inst,
-                                                  cmap={}, id=(org + '_' + id))
+                                                  cmap={}, id=(org + '_' + id), engine=engine)
     
     html_writer.write('<h1>Non constrained co-factors</h1>Percentage of modules where first reaction is the maximal: %f<br>' % perc_first_max)
     fig2 = plot_histogram(histogram, html_writer, title=('%s pathways: No constraints on co-factors' % org ), xlim=20)
@@ -3,7 +3,7 @@ import csv
 from optparse import OptionParser
 from pygibbs.thermodynamic_constants import default_I, default_pH, default_pMg,\
     default_T
-from pygibbs.nist_verify import LoadAllEstimators
+from pygibbs.thermodynamic_estimators import LoadAllEstimators
 from pygibbs.thermodynamic_errors import MissingCompoundFormationEnergy
 
 def MakeOpts(estimators):
@@ -2,7 +2,7 @@ import sys
 from optparse import OptionParser
 from pygibbs.thermodynamic_constants import default_I, default_pH, default_pMg,\
     default_T
-from pygibbs.nist_verify import LoadAllEstimators
+from pygibbs.thermodynamic_estimators import LoadAllEstimators
 from pygibbs.kegg_errors import KeggParseException
 from pygibbs.nist import NistRowData
 from pygibbs.kegg import Kegg
@@ -1,25 +1,42 @@
+import os
 import sys
-import libsbml #@UnresolvedImport
-import semanticSBML.annotate
 import csv
+import logging
+import multiprocessing
+import numpy as np
 from toolbox.database import SqliteDatabase
-from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
+from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics,\
+    GetReactionEnergiesFromFormationEnergies
+from pygibbs.thermodynamic_constants import default_pH, default_I,\
+    default_pMg, default_T
 from optparse import OptionParser
-import logging
 from pygibbs.kegg import Kegg
 
+FIELDNAMES = ['Quantity Type', 'SBML Element Name', 'SBML Element ID',
+              'Miriam ID', 'KEGG name', 'Value', 'Unit']
+
 def MakeOpts():
     """Returns an OptionParser object with all the default options."""
     opt_parser = OptionParser()
-    opt_parser.add_option("-s", "--sbml_model_filename", 
+    opt_parser.add_option("-s", "--sbml_model_filename",
                           dest="sbml_model_filename",
                           default=None,
                           help="The SBML model filename")
-    opt_parser.add_option("-o", "--csv_output_filename", 
+    opt_parser.add_option("-D", "--sbml_model_dir",
+                          dest="sbml_model_dir",
+                          default=None,
+                          help="A directory of SBML models to annotate")
+    opt_parser.add_option("-n", "--num_processes",
+                          dest="num_processes",
+                          type="int",
+                          default=None,
+                          help="The number of models to annotate in parallel "
+                          "(default: the number of CPUs)")
+    opt_parser.add_option("-o", "--csv_output_filename",
                           dest="csv_output_filename",
                           default=None,
                           help="The output filename (CSV format)")
-    opt_parser.add_option("-k", "--kegg_database_location", 
+    opt_parser.add_option("-k", "--kegg_database_location",
                           dest="kegg_db_filename",
                           default="../data/public_data.sqlite",
                           help="The KEGG database location")
@@ -31,83 +48,214 @@ def MakeOpts():
                           dest="thermo_filename",
                           default='../data/thermodynamics/dG0.csv',
                           help="Thermodynamics filename")
-    opt_parser.add_option("-d", "--database_location", 
+    opt_parser.add_option("-d", "--database_location",
                           dest="db_filename",
                           default="../res/gibbs.sqlite",
                           help="The Thermodynamic database location")
     opt_parser.add_option("-g", "--gc_table_name",
                           dest="gc_table_name",
                           default='gc_pseudoisomers',
-                          help="Group Contribution Table Name")    
+                          help="Group Contribution Table Name")
+    opt_parser.add_option("-p", "--ph", dest="pH", type="float",
+                          default=default_pH, help="The pH")
+    opt_parser.add_option("-i", "--ionic_strength", dest="I", type="float",
+                          default=default_I, help="The ionic strength, in M")
+    opt_parser.add_option("-m", "--pmg", dest="pMg", type="float",
+                          default=default_pMg, help="The pMg")
     return opt_parser
 
-options, _ = MakeOpts().parse_args(sys.argv)
-if options.sbml_model_filename == None:
-    raise ValueError("Must provide a SBML model")
-
-print 'SBML model filename:', options.sbml_model_filename
-print 'CSV output filename:', options.csv_output_filename
-print 'KEGG Database filename:', options.kegg_db_filename
-print 'Observed Thermodynamics filename:', options.thermo_filename
-print 'Thermodynamic Database filename:', options.db_filename
-print 'Group Contribution Table Name:', options.gc_table_name
-
-db = SqliteDatabase(options.db_filename)
-observed_thermo = PsuedoisomerTableThermodynamics.FromCsvFile(
-    options.thermo_filename)
-if not db.DoesTableExist(options.gc_table_name):
-    raise ValueError('The table %s does not exist in the database. '
-                     'Please run the groups.py script and try again.'
-                     % options.gc_table_name)
-thermo = PsuedoisomerTableThermodynamics.FromDatabase(
-    db, options.gc_table_name)
-thermo.override_data(observed_thermo)
-kegg = Kegg.getInstance()
-
-document = libsbml.readSBML(options.sbml_model_filename)
-if document.getNumErrors():
-    raise Exception('cannot read SBML model from file %s due to error: %s' % 
-                    (options.sbml_model_filename, document.getError(0).getMessage()))
-model = document.getModel()
-logging.info('Done parsing the model: ' + model.getName())
-model_annotation = semanticSBML.annotate.ModelElementsAnnotations(model, suppress_errors=True)
-
-species_ids_to_names = dict([(s.getId(), s.getName()) for s in model.getListOfSpecies()])
-reaction_ids_to_names = dict([(r.getId(), r.getName()) for r in model.getListOfReactions()])
-
-rowdicts = []
-# go through all the elements
-for element_annotation in model_annotation.getElementAnnotations():
-    # and through all their annotations
-    for annotation in element_annotation.getAnnotations():
-        if annotation.db == 'KEGG Compound':
-            rowdict = {}
-            cid = int(annotation.id[1:])
+def LoadThermodynamics(db_filename, gc_table_name, thermo_filename):
+    """Loads the group contribution table, overridden by the observed data."""
+    db = SqliteDatabase(db_filename)
+    observed_thermo = PsuedoisomerTableThermodynamics.FromCsvFile(
+        thermo_filename)
+    if not db.DoesTableExist(gc_table_name):
+        raise ValueError('The table %s does not exist in the database. '
+                         'Please run the groups.py script and try again.'
+                         % gc_table_name)
+    thermo = PsuedoisomerTableThermodynamics.FromDatabase(
+        db, gc_table_name)
+    thermo.override_data(observed_thermo)
+    return thermo
+
+def ReadSBMLAnnotations(sbml_model_filename):
+    """Reads the KEGG annotations of an SBML model.
+
+    Returns:
+        A list of (KEGG database, KEGG ID, SBML element ID,
+        SBML element name) tuples.
+    """
+    import libsbml #@UnresolvedImport
+    import semanticSBML.annotate
+
+    document = libsbml.readSBML(sbml_model_filename)
+    if document.getNumErrors():
+        raise Exception('cannot read SBML model from file %s due to error: %s' %
+                        (sbml_model_filename, document.getError(0).getMessage()))
+    model = document.getModel()
+    logging.info('Done parsing the model: ' + model.getName())
+    model_annotation = semanticSBML.annotate.ModelElementsAnnotations(model, suppress_errors=True)
+
+    ids_to_names = dict([(s.getId(), s.getName()) for s in model.getListOfSpecies()])
+    ids_to_names.update([(r.getId(), r.getName()) for r in model.getListOfReactions()])
+
+    annotations = []
+    # go through all the elements
+    for element_annotation in model_annotation.getElementAnnotations():
+        # and through all their annotations
+        for annotation in element_annotation.getAnnotations():
+            if annotation.db in ('KEGG Compound', 'KEGG Reaction'):
+                annotations.append((annotation.db, annotation.id,
+                                    element_annotation.id,
+                                    ids_to_names.get(element_annotation.id, '')))
+    return annotations
+
+def AnnotateModel(sbml_model_filename, thermo, pH=None, I=None, pMg=None, T=None):
+    """Calculates the energies of all the KEGG annotated elements of a model.
+
+    The KEGG IDs are collected first, so that all the formation energies are
+    transformed once and all the reaction energies are a single product with
+    the stoichiometric matrix.
+
+    Returns:
+        A list of dictionaries, one per CSV row (see FIELDNAMES).
+    """
+    kegg = Kegg.getInstance()
+    annotations = ReadSBMLAnnotations(sbml_model_filename)
+
+    cids = set()
+    rid2reaction = {}
+    for db, kegg_id, _, _ in annotations:
+        if db == 'KEGG Compound':
+            cids.add(int(kegg_id[1:]))
+        else:
+            rid = int(kegg_id[1:])
+            rid2reaction[rid] = kegg.rid2reaction(rid)
+            cids.update(rid2reaction[rid].get_cids())
+
+    cids = sorted(cids)
+    dG0_f = thermo.GetTransformedFormationEnergies(cids, pH=pH, I=I, pMg=pMg, T=T)
+    cid2dG0_f = dict(zip(cids, dG0_f.flat))
+
+    # H+ is not included in the reaction energies
+    rids = sorted(rid2reaction.keys())
+    reaction_cids = [cid for cid in cids if cid != 80]
+    S, _ = kegg.reaction_list_to_S([rid2reaction[rid] for rid in rids],
+                                   cids=reaction_cids)
+    dG0_r = GetReactionEnergiesFromFormationEnergies(
+        S, np.matrix([cid2dG0_f[cid] for cid in reaction_cids]))
+    rid2dG0_r = dict(zip(rids, dG0_r.flat))
+
+    rowdicts = []
+    for db, kegg_id, element_id, element_name in annotations:
+        rowdict = {}
+        rowdict['SBML Element ID'] = element_id
+        rowdict['SBML Element Name'] = element_name
+        if db == 'KEGG Compound':
+            cid = int(kegg_id[1:])
             rowdict['Quantity Type'] = 'standard chemical potential'
-            rowdict['Miriam ID'] = 'urn:miriam:kegg.compound:' + annotation.id
-            rowdict['SBML Element ID'] = element_annotation.id
-            rowdict['SBML Element Name'] = species_ids_to_names.get(element_annotation.id, '')
+            rowdict['Miriam ID'] = 'urn:miriam:kegg.compound:' + kegg_id
             rowdict['KEGG name'] = kegg.cid2name(cid)
-            #rowdict['kegg id'] = annotation.id
-            rowdict['Value'] = '%.1f' % thermo.GetTransformedFormationEnergies(cid)
-            rowdict['Unit'] = 'kJ/mol'
-            rowdicts.append(rowdict)
-        if annotation.db == 'KEGG Reaction':
-            rowdict = {}
-            rid = int(annotation.id[1:])
-            reaction = kegg.rid2reaction(rid)
+            rowdict['Value'] = '%.1f' % cid2dG0_f[cid]
+        else:
+            rid = int(kegg_id[1:])
             rowdict['Quantity Type'] = 'standard Gibbs energy of reaction'
-            rowdict['Miriam ID'] = 'urn:miriam:kegg.reaction:' + annotation.id
-            rowdict['SBML Element ID'] = element_annotation.id
-            rowdict['SBML Element Name'] = reaction_ids_to_names.get(element_annotation.id, '')
-            rowdict['KEGG name'] = reaction.name
-            #rowdict['kegg id'] = annotation.id
-            rowdict['Value'] = '%.1f' % reaction.PredictReactionEnergy(thermo)
-            rowdict['Unit'] = 'kJ/mol'
-            rowdicts.append(rowdict)
-            
-fieldnames=['Quantity Type', 'SBML Element Name', 'SBML Element ID', 
-            'Miriam ID', 'KEGG name', 'Value', 'Unit']            
-csv_writer = csv.DictWriter(open(options.csv_output_filename, 'w'), fieldnames)
-csv_writer.writer.writerow(fieldnames)
-csv_writer.writerows(rowdicts)
\ No newline at end of file
+            rowdict['Miriam ID'] = 'urn:miriam:kegg.reaction:' + kegg_id
+            rowdict['KEGG name'] = rid2reaction[rid].name
+            rowdict['Value'] = '%.1f' % rid2dG0_r[rid]
+        rowdict['Unit'] = 'kJ/mol'
+        rowdicts.append(rowdict)
+    return rowdicts
+
+def WriteModelAnnotations(sbml_model_filename, csv_output_filename, thermo,
+                          pH=None, I=None, pMg=None, T=None):
+    rowdicts = AnnotateModel(sbml_model_filename, thermo,
+                             pH=pH, I=I, pMg=pMg, T=T)
+    csv_writer = csv.DictWriter(open(csv_output_filename, 'w'), FIELDNAMES)
+    csv_writer.writer.writerow(FIELDNAMES)
+    csv_writer.writerows(rowdicts)
+
+# The worker processes inherit the thermodynamic table from the parent
+# (when forked), rather than each of them loading it again.
+_worker_thermo = None
+_worker_conditions = None
+
+def _InitWorker(thermo, conditions):
+    global _worker_thermo, _worker_conditions
+    _worker_thermo = thermo
+    _worker_conditions = conditions
+
+def _AnnotateModelWorker(sbml_model_filename):
+    try:
+        return sbml_model_filename, AnnotateModel(sbml_model_filename,
+            _worker_thermo, **_worker_conditions)
+    except Exception, e:
+        logging.warning('Cannot annotate %s: %s' % (sbml_model_filename, str(e)))
+        return sbml_model_filename, []
+
+def AnnotateDirectory(sbml_model_dir, csv_output_filename, thermo,
+                      num_processes=None, pH=None, I=None, pMg=None, T=None):
+    """Annotates all the SBML models in a directory, in parallel.
+
+    The rows of each model are written to the CSV file as soon as the model
+    is done, with an additional 'SBML Model' column. Models that cannot be
+    annotated are logged and skipped.
+
+    Returns:
+        The number of rows written.
+    """
+    filenames = sorted(os.path.join(sbml_model_dir, f)
+                       for f in os.listdir(sbml_model_dir)
+                       if os.path.splitext(f)[1].lower() in ('.xml', '.sbml'))
+
+    csv_writer = csv.DictWriter(open(csv_output_filename, 'w'),
+                                ['SBML Model'] + FIELDNAMES)
+    csv_writer.writer.writerow(['SBML Model'] + FIELDNAMES)
+
+    conditions = {'pH': pH, 'I': I, 'pMg': pMg, 'T': T}
+    pool = multiprocessing.Pool(num_processes, _InitWorker, (thermo, conditions))
+    n_rows = 0
+    try:
+        for filename, rowdicts in pool.imap_unordered(_AnnotateModelWorker,
+                                                      filenames):
+            logging.info('Annotated %d elements in %s' % (len(rowdicts), filename))
+            model_name = os.path.basename(filename)
+            for rowdict in rowdicts:
+                rowdict['SBML Model'] = model_name
+            csv_writer.writerows(rowdicts)
+            n_rows += len(rowdicts)
+    finally:
+        pool.close()
+        pool.join()
+    return n_rows
+
+def main():
+    options, _ = MakeOpts().parse_args(sys.argv)
+    if options.sbml_model_filename == None and options.sbml_model_dir == None:
+        raise ValueError("Must provide a SBML model or a directory of models")
+
+    print 'SBML model filename:', options.sbml_model_filename
+    print 'SBML model directory:', options.sbml_model_dir
+    print 'CSV output filename:', options.csv_output_filename
+    print 'KEGG Database filename:', options.kegg_db_filename
+    print 'Observed Thermodynamics filename:', options.thermo_filename
+    print 'Thermodynamic Database filename:', options.db_filename
+    print 'Group Contribution Table Name:', options.gc_table_name
+    print 'pH = %.2f, I = %.2f M, pMg = %.2f' % (options.pH, options.I, options.pMg)
+
+    thermo = LoadThermodynamics(options.db_filename, options.gc_table_name,
+                                options.thermo_filename)
+    # load the KEGG singleton before forking, so the workers share it
+    Kegg.getInstance()
+
+    if options.sbml_model_dir is not None:
+        AnnotateDirectory(options.sbml_model_dir, options.csv_output_filename,
+                          thermo, options.num_processes,
+                          pH=options.pH, I=options.I, pMg=options.pMg)
+    else:
+        WriteModelAnnotations(options.sbml_model_filename,
+                              options.csv_output_filename, thermo,
+                              pH=options.pH, I=options.I, pMg=options.pMg)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from toolbox.database import SqliteDatabase
+from pygibbs.estimator_registry import EstimatorRegistry
+
+
+class DummyEstimator(object):
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class TestEstimatorRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.source_filename = os.path.join(self.tmpdir, 'source.txt')
+        open(self.source_filename, 'w').write('1')
+        self.db_filename = os.path.join(self.tmpdir, 'source.sqlite')
+        db = SqliteDatabase(self.db_filename)
+        db.CreateTable('a_values', 'value INT')
+        db.Insert('a_values', [1])
+        db.CreateTable('other', 'value INT')
+        db.Commit()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _MakeRegistry(self):
+        registry = EstimatorRegistry([self.source_filename], self.cache_dir)
+        a_sources = [(self.db_filename, 'a_*')]
+
+        def Build(name, value):
+            def Factory(registry):
+                self.builds.append(name)
+                return DummyEstimator(name, value)
+            return Factory
+
+        registry.Register('A', Build('A', 1), sources=a_sources)
+        registry.Register('B', Build('B', 2), is_available=lambda r: False)
+        registry.Register('A+', lambda r: DummyEstimator('A+', r['A'].value + 1),
+                          cacheable=False)
+        return registry
+
+    def testLazy(self):
+        registry = self._MakeRegistry()
+        self.assertEqual(['A', 'A+'], registry.keys())
+        self.assertFalse('B' in registry)
+        self.assertRaises(KeyError, registry.__getitem__, 'B')
+        self.assertEqual([], self.builds)
+
+        self.assertEqual(2, registry['A+'].value)
+        self.assertEqual(['A'], self.builds)
+        self.assertTrue(registry['A'] is registry['A'])
+        self.assertEqual(['A'], self.builds)
+
+    def testCache(self):
+        self.assertEqual(1, self._MakeRegistry()['A'].value)
+        self.assertEqual(1, self._MakeRegistry()['A'].value)
+        self.assertEqual(['A'], self.builds)
+
+        # changing the source invalidates the cache
+        open(self.source_filename, 'w').write('22')
+        self.assertEqual(1, self._MakeRegistry()['A'].value)
+        self.assertEqual(['A', 'A'], self.builds)
+
+        # and so does touching it, since only the size and time are checked
+        os.utime(self.source_filename, (time.time() + 10, time.time() + 10))
+        self._MakeRegistry()['A']
+        self.assertEqual(['A', 'A', 'A'], self.builds)
+        self._MakeRegistry()['A']
+        self.assertEqual(['A', 'A', 'A'], self.builds)
+
+    def testTableSources(self):
+        self._MakeRegistry()['A']
+        self.assertEqual(['A'], self.builds)
+
+        # writing to other tables of the database does not invalidate it
+        db = SqliteDatabase(self.db_filename)
+        db.Insert('other', [2])
+        db.Commit()
+        self._MakeRegistry()['A']
+        self.assertEqual(['A'], self.builds)
+
+        # adding rows to the estimator's own tables does
+        db.Insert('a_values', [2])
+        db.Commit()
+        self._MakeRegistry()['A']
+        self.assertEqual(['A', 'A'], self.builds)
+
+        # and so does rebuilding them with the same number of rows
+        db.CreateTable('a_values', 'value INT')
+        db.Insert('a_values', [3])
+        db.Insert('a_values', [4])
+        db.Commit()
+        self._MakeRegistry()['A']
+        self.assertEqual(['A', 'A', 'A'], self.builds)
+
+        # or with a different schema
+        db.CreateTable('a_values', 'value INT, other_value INT')
+        db.Insert('a_values', [3, 3])
+        db.Insert('a_values', [4, 4])
+        db.Commit()
+        self._MakeRegistry()['A']
+        self.assertEqual(['A', 'A', 'A', 'A'], self.builds)
+
+def Suite():
+    return unittest.makeSuite(TestEstimatorRegistry, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs.kegg_compound import Compound
+from pygibbs.kegg_elements import ElementMatrix
+
+
+TEST_ATOM_BAGS = {1: {'H': 2, 'O': 1, 'e-': 10},                # H2O
+                  80: {'H': 1, 'e-': 0},                        # H+
+                  22: {'C': 3, 'H': 4, 'O': 3, 'e-': 46},       # pyruvate
+                  24: {'C': 2, 'H': 3, 'O': 1, 'e-': 23},       # acetyl
+                  33: {'C': 2, 'H': 4, 'O': 2, 'e-': 32},       # acetate
+                  11: {'C': 1, 'O': 2, 'e-': 22},               # CO2
+                  67: {'C': 1, 'H': 2, 'O': 2, 'e-': 24},       # formate
+                  999: None}
+
+
+class TestElementMatrix(unittest.TestCase):
+    
+    def setUp(self):
+        self.em = ElementMatrix.FromAtomBags(TEST_ATOM_BAGS)
+    
+    def testAtomBag(self):
+        self.assertEqual(TEST_ATOM_BAGS[22], self.em.GetAtomBag(22))
+        self.assertEqual(None, self.em.GetAtomBag(999))
+        self.assertRaises(KeyError, self.em.GetAtomBag, 12345)
+    
+    def testImbalance(self):
+        # pyruvate => acetate + CO2 (produces an extra O and 8 electrons)
+        # pyruvate + X => acetate (unknown)
+        cids = [22, 33, 11, 999]
+        S = np.array([[-1, -1], [1, 1], [1, 0], [0, -1]])
+        imbalance, known = self.em.Imbalance(S, cids)
+        self.assertEqual([True, False], known.tolist())
+        expected = dict.fromkeys(self.em.elements, 0)
+        expected.update({'O': 1, 'e-': 8})
+        self.assertEqual([expected[e] for e in self.em.elements],
+                         imbalance[:, 0].tolist())
+    
+    def testBalance(self):
+        # pyruvate + H2O => acetate + formate
+        # acetate => acetyl + ?  (cannot be balanced with H2O and H+)
+        cids = [22, 33, 67, 24]
+        S = np.array([[-1, 0], [1, -1], [1, 0], [0, 1]])
+        new_S, new_cids, balanced, known = self.em.Balance(
+            S, cids, balance_water=True, balance_hydrogens=True)
+        self.assertEqual(cids + [1, 80], new_cids)
+        self.assertEqual([True, True], known.tolist())
+        self.assertEqual([True, False], balanced.tolist())
+        self.assertEqual([-1, 1, 1, 0, -1, 0], new_S[:, 0].tolist())
+    
+    def testCompoundAtomBag(self):
+        # compounds with a formula but no InChI are assumed to be neutral
+        methane = Compound(cid=74, name='methane', formula='CH4')
+        self.assertEqual({'C': 1, 'H': 4, 'e-': 10},
+                         ElementMatrix.CompoundAtomBag(methane))
+        protein = Compound(cid=17, name='protein', formula='C2H4NOR')
+        self.assertEqual(None, ElementMatrix.CompoundAtomBag(protein))
+        em = ElementMatrix.FromCompounds([methane, protein])
+        self.assertEqual([17, 74], em.cids)
+        self.assertEqual(None, em.GetAtomBag(17))
+        
+
+def Suite():
+    return unittest.makeSuite(TestElementMatrix, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
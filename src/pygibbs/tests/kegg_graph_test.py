@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+import unittest
+
+from pygibbs.kegg_graph import KeggCompoundGraph
+from toolbox.database import SqliteDatabase
+
+
+# A -> B -> C -> D, with ATP (C00002) -> ADP (C00008) on the first two steps.
+TEST_REACTIONS = [{100: -1, 2: -1, 101: 1, 8: 1},
+                  {101: -1, 2: -1, 102: 1, 8: 1},
+                  {102: -1, 103: 1},
+                  {200: -1, 201: 1}]
+
+
+class TestKeggCompoundGraph(unittest.TestCase):
+    
+    def setUp(self):
+        self.graph = KeggCompoundGraph.FromReactions(TEST_REACTIONS)
+    
+    def testNeighbours(self):
+        self.assertEqual([8, 101], self.graph.Neighbours(100))
+        self.assertEqual([2, 8, 100, 102], self.graph.Neighbours(101))
+        self.assertEqual([], self.graph.Neighbours(999))
+        
+    def testLayers(self):
+        self.assertEqual([[100], [101], [102], [103]],
+                         self.graph.Layers([100], 3))
+        self.assertEqual([[100], [8, 101], [2, 102]],
+                         self.graph.Layers([100], 2, cofactors=[]))
+        self.assertEqual([[100, 200], [101, 201]],
+                         self.graph.Layers([100, 200], 1))
+    
+    def testNeighbourhoods(self):
+        hoods = self.graph.Neighbourhoods([100, 103], 1)
+        self.assertEqual(set([100, 101]), hoods[100])
+        self.assertEqual(set([102, 103]), hoods[103])
+    
+    def testShortestPaths(self):
+        self.assertEqual([100, 101, 102, 103],
+                         self.graph.ShortestPath(100, 103))
+        self.assertEqual(None, self.graph.ShortestPath(100, 8))
+        self.assertEqual([100, 8], self.graph.ShortestPath(100, 8, []))
+        paths = self.graph.ShortestPaths([(100, 102), (100, 200), (103, 101)])
+        self.assertEqual([100, 101, 102], paths[(100, 102)])
+        self.assertEqual(None, paths[(100, 200)])
+        self.assertEqual([103, 102, 101], paths[(103, 101)])
+    
+    def testDatabase(self):
+        db = SqliteDatabase(':memory:')
+        self.graph.ToDatabase(db)
+        graph = KeggCompoundGraph.FromDatabase(db)
+        self.assertEqual(self.graph.cids, graph.cids)
+        self.assertEqual(self.graph.indptr.tolist(), graph.indptr.tolist())
+        self.assertEqual(self.graph.indices.tolist(), graph.indices.tolist())
+
+
+def Suite():
+    return unittest.makeSuite(TestKeggCompoundGraph, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ from pygibbs.metabolic_modelling import bounds
 
 from pygibbs.tests.metabolic_modelling.fake_stoich_model import FakeStoichModel
 from pygibbs.tests.metabolic_modelling.fake_thermo_data import FakeThermoData
+from pygibbs.tests.metabolic_modelling.fake_thermo_data import FakeInfeasibleThermoData
     
 
 class TestFeasibleConcentrationsIterator(unittest.TestCase):
@@ -41,10 +42,82 @@ class TestFeasibleConcentrationsIterator(unittest.TestCase):
             stoich_model, thermo, b)
         for concs in iter:
             self.assertTrue(iter.Feasible(concs))
+            
+    def testVertices(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeThermoData()
+        b = self.NormalBounds()
+        
+        iter = feasible_concentrations_iterator.FeasibleConcentrationsIterator(
+            stoich_model, thermo, b, include_maxima=True)
+        vertices = iter.GetVertices()
+        self.assertEqual(3, vertices.shape[1])
+        self.assertTrue(iter.FeasibleMany(vertices).all())
+    
+    def testFeasibleMany(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeThermoData()
+        b = self.NormalBounds()
+        
+        iter = feasible_concentrations_iterator.FeasibleConcentrationsIterator(
+            stoich_model, thermo, b)
+        concs = np.log(np.array([[1e-3, 1e-3, 1e-3],
+                                 [1e-2, 1e-6, 1e-6],
+                                 [1e-6, 1e-2, 1e-6]]))
+        feasible = iter.FeasibleMany(concs)
+        self.assertEqual([False, True, False], list(feasible))
+        for i, row in enumerate(concs):
+            self.assertEqual(feasible[i], iter.Feasible(np.matrix(row)))
+
+
+class TestConcentrationPolytope(unittest.TestCase):
+    
+    def MakePolytope(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeThermoData()
+        b = bounds.Bounds(default_lb=1e-6, default_ub=1e-2)
+        lb, ub = b.GetLnBounds(stoich_model.GetCompoundIDs())
+        return feasible_concentrations_iterator.ConcentrationPolytope(
+            stoich_model.GetStoichiometricMatrix(),
+            thermo.GetDGrTagZero_ForModel(stoich_model),
+            stoich_model.GetFluxes(), lb, ub)
+    
+    def testMinimizeEach(self):
+        polytope = self.MakePolytope()
+        results = polytope.MinimizeEach(signs=(1, -1))
+        self.assertEqual(6, len(results))
+        
+        for sign, i, x in results:
+            self.assertTrue(x is not None)
+            # No other solve can improve on the objective of compound i.
+            direct = polytope.Optimize(sign * np.eye(1, 3, i).flatten())
+            self.assertAlmostEqual(direct[i], x[i], 6)
+    
+    def testMinimizeEachParallel(self):
+        polytope = self.MakePolytope()
+        serial = polytope.MinimizeEach(signs=(1, -1))
+        parallel = polytope.MinimizeEach(signs=(1, -1), n_processes=2)
+        self.assertEqual([(s, i) for s, i, _ in serial],
+                         [(s, i) for s, i, _ in parallel])
+        for (_, i, x), (_, _, y) in zip(serial, parallel):
+            self.assertAlmostEqual(x[i], y[i], 6)
+    
+    def testInfeasible(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeInfeasibleThermoData()
+        b = bounds.Bounds(default_lb=1e-6, default_ub=1e-2)
+        lb, ub = b.GetLnBounds(stoich_model.GetCompoundIDs())
+        polytope = feasible_concentrations_iterator.ConcentrationPolytope(
+            stoich_model.GetStoichiometricMatrix(),
+            thermo.GetDGrTagZero_ForModel(stoich_model),
+            stoich_model.GetFluxes(), lb, ub)
+        self.assertEqual(None, polytope.Optimize(np.ones(3)))
 
 
 def Suite():
-    return unittest.makeSuite(TestFeasibleConcentrationsIterator,'test')
+    suites = (unittest.makeSuite(TestFeasibleConcentrationsIterator,'test'),
+              unittest.makeSuite(TestConcentrationPolytope,'test'))
+    return unittest.TestSuite(suites)
     
 
 if __name__ == '__main__':
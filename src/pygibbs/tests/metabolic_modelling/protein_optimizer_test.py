@@ -2,11 +2,13 @@
 
 import unittest
 import numpy as np
+import scipy.optimize as opt
 
 from pygibbs.metabolic_modelling import kinetic_data
 from pygibbs.metabolic_modelling import optimized_pathway
 from pygibbs.metabolic_modelling import protein_optimizer
 from pygibbs.metabolic_modelling import bounds
+from pygibbs.metabolic_modelling import general_functors
 
 from pygibbs.tests.metabolic_modelling.fake_stoich_model import FakeStoichModel
 from pygibbs.tests.metabolic_modelling.fake_thermo_data import FakeThermoData
@@ -20,7 +22,7 @@ class TestFixedVariableInjector(unittest.TestCase):
         ub = np.matrix([[5,1,5,5,3]])
         variable_i = np.where(lb != ub)
         
-        injector = protein_optimizer.FixedVariableInjector(
+        injector = general_functors.FixedVariableInjector(
             lb, ub, ub)
         
         variable_lb = lb[variable_i]
@@ -41,7 +43,7 @@ class TestFixedVariableInjector(unittest.TestCase):
         ub = np.matrix([[5,2,5,5,4]])
         variable_i = np.where(lb != ub)
         
-        injector = protein_optimizer.FixedVariableInjector(
+        injector = general_functors.FixedVariableInjector(
             lb, ub, ub)
         
         variable_lb = lb[variable_i]
@@ -63,7 +65,7 @@ class TestFixedVariableInjector(unittest.TestCase):
         init = np.matrix([[-1,1,5,6,4]])
         variable_i = np.where(lb != ub)
         
-        injector = protein_optimizer.FixedVariableInjector(
+        injector = general_functors.FixedVariableInjector(
             lb, ub, init)
         
         variable_lb   = lb[variable_i]
@@ -82,26 +84,7 @@ class TestFixedVariableInjector(unittest.TestCase):
         self.assertTrue((expected_ub == ub).all())
 
 
-class TestEnzymeLevelFunc(unittest.TestCase):
-    
-    def testApproximateDenom(self):
-        RT = protein_optimizer.RT
-        saturating_dg = -2*RT
-        
-        dGr_tags = np.matrix([[saturating_dg/2,
-                               2*saturating_dg,
-                               saturating_dg,
-                               3*saturating_dg,
-                               saturating_dg/3]])
-        
-        expected = np.matrix([[0.5, 1.0, 1.0, 1.0, 1.0/3.0]])
-        actual   = protein_optimizer.EnzymeLevelFunc.ApproximateDenom(dGr_tags)
-        diff     = np.abs(expected - actual) 
-        
-        self.assertTrue((diff < 1e-6).all())        
-        
-
-class DummyInjector(protein_optimizer.FixedVariableInjector):
+class DummyInjector(general_functors.FixedVariableInjector):
     """Dummy injector does nothing."""
     
     def __init__(self):
@@ -122,7 +105,7 @@ class TestMinusDG(unittest.TestCase):
         Ncompounds, _ = S.shape
         injector = DummyInjector()
         
-        minus_dg = protein_optimizer.MinusDG(S, dG0_r_prime, injector)
+        minus_dg = general_functors.MinusDG(S, dG0_r_prime, injector)
         
         # 1M concentrations should have no effect.
         x = np.ones(Ncompounds)
@@ -134,7 +117,7 @@ class TestMinusDG(unittest.TestCase):
         x = np.ones(Ncompounds) * 1e-3
         transformed = minus_dg(x)
         expected_minus_dg = -np.matrix(
-            dG0_r_prime + protein_optimizer.RT * x * S)
+            dG0_r_prime + general_functors.RT * x * S)
         self.assertTrue((transformed == expected_minus_dg).all())
         
         
@@ -143,7 +126,7 @@ class TestBoundDiffs(unittest.TestCase):
     def testBasic(self):
         lb = np.matrix([[0,1,0,0,3]])
         ub = np.matrix([[5,1,5,5,3]])
-        bounder = protein_optimizer.BoundDiffs(lb, ub)
+        bounder = general_functors.BoundDiffs(lb, ub)
 
         self.assertTrue((bounder(ub) >= 0).all())
         self.assertTrue((bounder(lb) >= 0).all())
@@ -165,6 +148,32 @@ class TestBoundDiffs(unittest.TestCase):
             self.assertFalse((bounder(x) >= 0).all())
         
 
+class TestConstraintJacobians(unittest.TestCase):
+    
+    def testMatchesNumericDerivatives(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeThermoData()
+        dG0_r_prime = thermo.GetDGrTagZero_ForModel(stoich_model)
+        S = stoich_model.GetStoichiometricMatrix()
+        
+        lb = np.matrix(np.log([[1e-6, 1e-3, 1e-6]]))
+        ub = np.matrix(np.log([[1e-2, 1e-3, 1e-2]]))
+        x0 = np.matrix(np.log([[1e-4, 1e-3, 1e-5]]))
+        injector = general_functors.FixedVariableInjector(lb, ub, x0)
+        
+        f_ieq = general_functors.MultiFunctionWrapper(
+            [general_functors.MinusDG(S, dG0_r_prime, injector),
+             general_functors.BoundDiffs(injector.GetVariableLowerBounds(),
+                                         injector.GetVariableUpperBounds())])
+        x = np.array(injector.GetVariableInitialConds().flat)
+        jacobian = f_ieq.Jacobian(x)
+        self.assertEqual((f_ieq(x).size, x.size), jacobian.shape)
+        
+        for i in xrange(jacobian.shape[0]):
+            approx = opt.approx_fprime(x, lambda y: f_ieq(y)[i], 1e-7)
+            self.assertTrue((np.abs(approx - jacobian[i, :]) < 1e-5).all())
+
+
 class TestProteinOptimizer(unittest.TestCase):
     
     def MyBounds(self):
@@ -213,10 +222,48 @@ class TestProteinOptimizer(unittest.TestCase):
                          res.status.status)
         
 
+class TestBatchProteinOptimizer(unittest.TestCase):
+    
+    def testMatchesSingleOptimization(self):
+        stoich_model = FakeStoichModel()
+        thermo = FakeThermoData()
+        kdata = kinetic_data.UniformKineticData()
+        
+        single = protein_optimizer.ProteinOptimizer(
+            stoich_model, thermo, kdata).FindOptimum()
+        
+        batch_opt = protein_optimizer.BatchProteinOptimizer(thermo)
+        results = batch_opt.FindOptima([stoich_model] * 3, kdata)
+        self.assertEqual(3, len(results))
+        for res in results:
+            self.assertEqual(optimized_pathway.OptimizationStatus.SUCCESSFUL,
+                             res.status.status)
+            self.assertAlmostEqual(single.opt_val, res.opt_val, 6)
+        
+        stats = batch_opt.timing_stats
+        self.assertEqual(3, stats['n_jobs'])
+        self.assertEqual(3, stats['n_successful'])
+        self.assertEqual(3, len(stats['job_times']))
+    
+    def testInfeasibleJob(self):
+        stoich_model = FakeStoichModel()
+        kdata = kinetic_data.UniformKineticData()
+        
+        batch_opt = protein_optimizer.BatchProteinOptimizer(
+            FakeInfeasibleThermoData())
+        results = batch_opt.FindOptima(stoich_model, kdata)
+        self.assertEqual(optimized_pathway.OptimizationStatus.INFEASIBLE,
+                         results[0].status.status)
+        self.assertEqual(0, batch_opt.timing_stats['n_successful'])
+        
+
+
 def Suite():
     suites = (unittest.makeSuite(TestFixedVariableInjector,'test'),
               unittest.makeSuite(TestMinusDG,'test'),
-              unittest.makeSuite(TestProteinOptimizer,'test'))
+              unittest.makeSuite(TestConstraintJacobians,'test'),
+              unittest.makeSuite(TestProteinOptimizer,'test'),
+              unittest.makeSuite(TestBatchProteinOptimizer,'test'))
     return unittest.TestSuite(suites)
     
 
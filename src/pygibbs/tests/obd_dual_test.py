@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs.obd_dual import ReactionProduct
+
+
+class TestReactionProduct(unittest.TestCase):
+
+    def setUp(self):
+        # 3 compounds x 4 reactions, the last reaction is empty
+        self.S = np.array([[-1,  0,  2, 0],
+                           [ 1, -1,  0, 0],
+                           [ 0,  1, -1, 0]])
+
+    def testBatch(self):
+        rand = np.random.RandomState(0)
+        x = rand.uniform(-10, 10, size=(5, 3))
+        result = ReactionProduct(x, self.S)
+        self.assertEqual((5, 4), result.shape)
+        self.assertTrue(np.allclose(np.dot(x, self.S), result))
+        for k in xrange(x.shape[0]):
+            self.assertTrue(np.allclose(result[k, :],
+                                        ReactionProduct(x[k, :], self.S)))
+
+    def testNaN(self):
+        x = [[1.0, 2.0, 4.0],
+             [1.0, np.nan, 4.0]]
+        result = np.array(ReactionProduct(x, self.S))
+        self.assertEqual([1.0, 2.0, -2.0, 0.0], result[0, :].tolist())
+        # only the reactions involving the unknown compound are unknown
+        self.assertTrue(np.isnan(result[1, 0:2]).all())
+        self.assertEqual([-2.0, 0.0], result[1, 2:].tolist())
+
+    def testInfinity(self):
+        x = [-np.inf, 0.0, 1.0]
+        result = np.array(ReactionProduct(x, self.S)).flatten()
+        self.assertEqual(np.inf, result[0])
+        self.assertEqual(1.0, result[1])
+        self.assertEqual(-np.inf, result[2])
+        self.assertEqual(0.0, result[3])
+
+        # opposite infinities cancel into NaN
+        x = [0.0, np.inf, np.inf]
+        result = np.array(ReactionProduct(x, self.S)).flatten()
+        self.assertTrue(np.isnan(result[1]))
+        self.assertEqual([np.inf, -np.inf, 0.0], result[[0, 2, 3]].tolist())
+
+
+def Suite():
+    return unittest.makeSuite(TestReactionProduct, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
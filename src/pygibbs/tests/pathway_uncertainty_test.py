@@ -0,0 +1,73 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs import pathway_uncertainty
+from pygibbs.pathway_modelling import Pathway
+from pygibbs.thermodynamic_constants import default_T, R
+
+RT = R * default_T
+
+
+class TestPathwayUncertainty(unittest.TestCase):
+    
+    # A -> B -> C
+    S = np.matrix([[-1,  0],
+                   [ 1, -1],
+                   [ 0,  1]])
+    
+    def testSampleFormationEnergies(self):
+        mean = np.array([1.0, np.nan, -3.0])
+        cov = np.array([[4.0, 0.0, 2.0],
+                        [0.0, 0.0, 0.0],
+                        [2.0, 0.0, 4.0]])
+        rand = np.random.RandomState(0)
+        samples = pathway_uncertainty.SampleFormationEnergies(
+            mean, cov, 20000, random_state=rand)
+        self.assertEqual((20000, 3), samples.shape)
+        self.assertTrue(np.isnan(samples[:, 1]).all())
+        
+        known = samples[:, [0, 2]]
+        self.assertTrue(np.allclose([1.0, -3.0], known.mean(0), atol=0.1))
+        self.assertTrue(np.allclose(cov[[0, 2]][:, [0, 2]],
+                                    np.cov(known.T), atol=0.2))
+    
+    def testMtdfSampler(self):
+        c_range = (1e-6, 1e-2)
+        lb, ub = pathway_uncertainty.LnConcentrationBounds(3, c_range)
+        sampler = pathway_uncertainty.MtdfSampler(
+            self.S, np.matrix([[1, 1]]), lb, ub)
+        
+        # with dG0_r = (g, g), the MTDF is -g + RT * ln(c_max/c_min) / 2
+        dG0_r = np.array([[0.0, 0.0], [-5.0, -5.0], [10.0, 10.0]])
+        mtdf = sampler.SolveMany(dG0_r)
+        expected = -dG0_r[:, 0] + RT * np.log(1e4) / 2
+        self.assertTrue(np.allclose(expected, mtdf, atol=1e-6))
+    
+    def testZeroCovariance(self):
+        pathway = Pathway(self.S, formation_energies=np.matrix([[0, 5, 0]]))
+        analysis = pathway_uncertainty.PathwayUncertaintyAnalysis(
+            pathway, np.zeros((3, 3)), c_range=(1e-6, 1e-2))
+        summary = analysis.Run(n_samples=10, batch_size=4)
+        
+        expected = RT * np.log(1e4) / 2
+        self.assertEqual(0, summary['n_failed'])
+        self.assertTrue(np.allclose(expected, summary['mtdf_quantiles']))
+        self.assertAlmostEqual(0.0, summary['mtdf_std'])
+        self.assertEqual((5, 2), summary['reversibility_quantiles'].shape)
+    
+    def testDefaultConcentrationRange(self):
+        # the same default range as Pathway._FindMtdf, i.e. (1e-6, 1e-2)
+        pathway = Pathway(self.S, formation_energies=np.matrix([[0, 5, 0]]))
+        sampler = pathway_uncertainty.MtdfSampler.FromPathway(pathway)
+        mtdf = sampler.Solve(np.array([0.0, 0.0]))
+        self.assertAlmostEqual(RT * np.log(1e4) / 2, mtdf, 6)
+
+
+def Suite():
+    return unittest.makeSuite(TestPathwayUncertainty, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs import psa
+
+
+class TestPSAEnsemble(unittest.TestCase):
+    
+    def RandomEnsemble(self, n_samples=20, n_enzymes=4):
+        rand = np.random.RandomState(1)
+        M = rand.uniform(0.1, 1.0, size=(n_samples, n_enzymes))
+        k_plus = 10 ** rand.uniform(-1, 2, size=(n_samples, n_enzymes))
+        k_minus = 10 ** rand.uniform(-2, 2, size=(n_samples, n_enzymes))
+        return psa.EpsilonKappaEnsemble(M, 1.0, k_plus, k_minus)
+    
+    def testPhi(self):
+        Epsilon, Kappa = self.RandomEnsemble()
+        x = np.logspace(-3, 3, Epsilon.shape[0])
+        expected = [psa.Phi(x[k], Epsilon[k, :], Kappa[k, :])
+                    for k in xrange(len(x))]
+        actual = psa.PhiEnsemble(x, Epsilon, Kappa)
+        self.assertTrue(np.allclose(expected, actual, rtol=1e-10))
+    
+    def testPhiSingleX(self):
+        Epsilon, Kappa = self.RandomEnsemble()
+        for x in [0.5, 0.0]:
+            expected = [psa.Phi(x, Epsilon[k, :], Kappa[k, :])
+                        for k in xrange(Epsilon.shape[0])]
+            actual = psa.PhiEnsemble(x, Epsilon, Kappa)
+            self.assertEqual((Epsilon.shape[0],), actual.shape)
+            self.assertTrue(np.allclose(expected, actual, rtol=1e-10))
+    
+    def testInvPhi(self):
+        Epsilon, Kappa = self.RandomEnsemble()
+        p = np.linspace(0, 1, Epsilon.shape[0])
+        x = psa.InvPhiEnsemble(p, Epsilon, Kappa)
+        self.assertEqual(0.0, x[0])
+        self.assertEqual(np.inf, x[-1])
+        p_inner = psa.PhiEnsemble(x[1:-1], Epsilon[1:-1, :], Kappa[1:-1, :])
+        self.assertTrue(np.allclose(p[1:-1], p_inner, rtol=1e-9))
+
+    def testPSA1(self):
+        Epsilon, _ = self.RandomEnsemble()
+        expected = [psa.PSA1(e) for e in Epsilon]
+        self.assertTrue(np.allclose(expected, psa.PSA1Ensemble(Epsilon)))
+    
+    def testPSA2(self):
+        Epsilon, Kappa = self.RandomEnsemble()
+        dG = np.linspace(-60, 0, Epsilon.shape[0])
+        expected = [psa.PSA2(Epsilon[k, :], Kappa[k, :], dG[k])
+                    for k in xrange(len(dG))]
+        actual = psa.PSA2Ensemble(Epsilon, Kappa, dG)
+        self.assertEqual(0.0, actual[-1])
+        self.assertTrue(np.allclose(expected, actual, rtol=1e-8))
+        
+    def testPSA2Homogenous(self):
+        N, epsilon, kappa, dG = 3, 0.5, 2.0, -15.0
+        expected = psa.PSA2_homogenous(N, epsilon, kappa, dG)
+        actual = psa.PSA2Ensemble([epsilon] * N, [kappa] * N, dG)
+        self.assertAlmostEqual(expected, actual[0], 8)
+
+
+def Suite():
+    return unittest.makeSuite(TestPSAEnsemble, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs.kegg_reaction import Reaction
+from pygibbs.reversibility import ReversibilityEngine, CalculateReversability
+from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
+from pygibbs.thermodynamics import GetReactionEnergiesFromFormationEnergies
+
+
+class OffsetThermodynamics(PsuedoisomerTableThermodynamics):
+    """An estimator whose reaction energies are not just the difference of
+       formation energies (like group contribution), and which does not need
+       the KEGG database for KEGG reactions."""
+
+    def GetTransfromedKeggReactionEnergies(self, kegg_reactions,
+                                           pH=None, I=None, pMg=None, T=None,
+                                           conc=1):
+        cids = set()
+        for reaction in kegg_reactions:
+            cids.update(reaction.get_cids())
+        cids = sorted(cids - set([80]))
+        S = np.matrix([[reaction.sparse.get(cid, 0) for reaction in kegg_reactions]
+                       for cid in cids])
+        return self.GetTransfromedReactionEnergies(S, cids, pH=pH, I=I,
+                                                   pMg=pMg, T=T, conc=conc)
+
+    def GetTransfromedReactionEnergies(self, S, cids,
+                                       pH=None, I=None, pMg=None, T=None,
+                                       conc=1):
+        dG0_f = self.GetTransformedFormationEnergies(cids, pH=pH, I=I,
+                                                     pMg=pMg, T=T)
+        dG0_r = GetReactionEnergiesFromFormationEnergies(S, dG0_f)
+        return dG0_r + abs(S).sum(0)
+
+
+class TestReversibilityEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.thermo = OffsetThermodynamics('offset')
+        self.thermo.AddPseudoisomer(1, nH=2, z=0, nMg=0, dG0=-237.2)
+        self.thermo.AddPseudoisomer(2, nH=12, z=-4, nMg=0, dG0=-2768.1)
+        self.thermo.AddPseudoisomer(8, nH=12, z=-3, nMg=0, dG0=-1906.1)
+        self.thermo.AddPseudoisomer(9, nH=1, z=-2, nMg=0, dG0=-1096.1)
+        self.thermo.AddPseudoisomer(31, nH=12, z=0, nMg=0, dG0=-915.9)
+        self.thermo.AddPseudoisomer(92, nH=11, z=-2, nMg=0, dG0=-1763.9)
+        self.reactions = {
+            'atp': Reaction(['ATP hydrolysis'], {2:-1, 1:-1, 8:1, 9:1, 80:1}),
+            'hk': Reaction(['hexokinase'], {31:-1, 2:-1, 92:1, 8:1, 80:1}),
+            'unknown': Reaction(['unknown'], {31:-1, 99:1}),
+            'fixed': Reaction(['water'], {1:-1, 80:2})}
+        self.engine = ReversibilityEngine(self.thermo)
+        for id, reaction in self.reactions.iteritems():
+            self.engine.AddReaction(id, lambda reaction=reaction: reaction,
+                                    balance_water=False)
+
+    def testEquivalence(self):
+        ids = ['atp', 'hk']
+        for cmap in [None, {1:1, 80:1, 2:5e-3, 9:1e-2}]:
+            for logscale in [False, True]:
+                result = self.engine.Calculate(ids, cmap, logscale=logscale)
+                for id in ids:
+                    expected = CalculateReversability(
+                        self.reactions[id], self.thermo, cmap, logscale=logscale)
+                    self.assertAlmostEqual(1.0, result[id] / expected, 10)
+
+    def testSpecialCases(self):
+        result = self.engine.Calculate(['unknown', 'fixed', 'atp'])
+        self.assertTrue(isinstance(result['unknown'], Exception))
+        self.assertEqual(None, result['fixed'])
+        self.assertTrue(np.isfinite(result['atp']))
+
+    def testBlocks(self):
+        # the same results when every reaction is in its own block
+        ids = ['atp', 'hk', 'unknown', 'fixed']
+        expected = self.engine.Calculate(ids)
+        self.engine.REACTION_BLOCK_SIZE = 1
+        result = self.engine.Calculate(ids)
+        for id in ['atp', 'hk']:
+            self.assertAlmostEqual(expected[id], result[id])
+        self.assertTrue(isinstance(result['unknown'], Exception))
+        self.assertEqual(None, result['fixed'])
+
+
+def Suite():
+    return unittest.makeSuite(TestReversibilityEngine, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,11 +3,20 @@
 import logging
 import unittest
 
+from pygibbs.tests import estimator_registry_test
 from pygibbs.tests import kegg_compound_test
+from pygibbs.tests import kegg_elements_test
 from pygibbs.tests import kegg_enzyme_test
+from pygibbs.tests import kegg_graph_test
+from pygibbs.tests import obd_dual_test
 from pygibbs.tests import pathway_test
+from pygibbs.tests import pathway_uncertainty_test
 from pygibbs.tests import thermo_json_output_test
 from pygibbs.tests import group_decomposition_test
+from pygibbs.tests import psa_test
+from pygibbs.tests import reversibility_test
+from pygibbs.tests import sbml_io_test
+from pygibbs.tests import thermodynamics_test
 
 from pygibbs.tests.metabolic_modelling import bounds_test
 from pygibbs.tests.metabolic_modelling import concentration_optimizer_test
@@ -20,11 +29,20 @@ from pygibbs.tests.metabolic_modelling import thermodynamic_data_test
 
 
 def main():
-    test_modules = (kegg_compound_test,
+    test_modules = (estimator_registry_test,
+                    kegg_compound_test,
+                    kegg_elements_test,
                     kegg_enzyme_test,
+                    kegg_graph_test,
+                    obd_dual_test,
                     pathway_test,
+                    pathway_uncertainty_test,
                     thermo_json_output_test,
                     group_decomposition_test,
+                    psa_test,
+                    reversibility_test,
+                    sbml_io_test,
+                    thermodynamics_test,
                     bounds_test,
                     concentration_optimizer_test,
                     feasible_concentrations_iterator_test,
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+
+import os
+import csv
+import imp
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pygibbs.kegg import Kegg
+from pygibbs.kegg_reaction import Reaction
+from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
+
+sbml_io = imp.load_source('sbml_io', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'sbml_io.py'))
+
+
+class StubKegg(object):
+    """Just the parts of Kegg that AnnotateModel uses."""
+    
+    def __init__(self, reactions, names):
+        self.reactions = dict((r.rid, r) for r in reactions)
+        self.names = names
+    
+    def rid2reaction(self, rid):
+        return self.reactions[rid]
+    
+    def cid2name(self, cid):
+        return self.names[cid]
+    
+    reaction_list_to_S = Kegg.reaction_list_to_S.im_func
+
+
+class TestAnnotateModel(unittest.TestCase):
+    
+    def setUp(self):
+        self.thermo = PsuedoisomerTableThermodynamics('test')
+        self.thermo.AddPseudoisomer(1, nH=2, z=0, nMg=0, dG0=-237.2)
+        self.thermo.AddPseudoisomer(2, nH=12, z=-4, nMg=0, dG0=-2768.1)
+        self.thermo.AddPseudoisomer(8, nH=12, z=-3, nMg=0, dG0=-1906.1)
+        self.thermo.AddPseudoisomer(9, nH=1, z=-2, nMg=0, dG0=-1096.1)
+        
+        reactions = [Reaction(['ATP hydrolysis'],
+                              {2:-1, 1:-1, 8:1, 9:1, 80:1}, rid=86),
+                     Reaction(['unknown'], {2:-1, 999:1}, rid=99999)]
+        stub_kegg = StubKegg(reactions, {2: 'ATP', 999: 'X'})
+        # the annotations of each model file, other files cannot be read
+        self.annotations = {
+            'model.xml': [('KEGG Compound', 'C00002', 'atp_c', 'ATP'),
+                          ('KEGG Reaction', 'R00086', 'ATPase', 'ATP hydrolysis'),
+                          ('KEGG Reaction', 'R99999', 'R_X', 'X synthase'),
+                          ('KEGG Compound', 'C00999', 'x_c', 'X')],
+            'small.SBML': [('KEGG Compound', 'C00002', 'atp', 'ATP')]}
+        
+        self._ReadSBMLAnnotations = sbml_io.ReadSBMLAnnotations
+        self._Kegg = sbml_io.Kegg
+        sbml_io.ReadSBMLAnnotations = \
+            lambda filename: self.annotations[os.path.basename(filename)]
+        sbml_io.Kegg = type('StubKeggClass', (object,),
+                            {'getInstance': staticmethod(lambda: stub_kegg)})
+    
+    def tearDown(self):
+        sbml_io.ReadSBMLAnnotations = self._ReadSBMLAnnotations
+        sbml_io.Kegg = self._Kegg
+    
+    def testAnnotateModel(self):
+        rowdicts = sbml_io.AnnotateModel('model.xml', self.thermo, pH=7.0)
+        self.assertEqual(['atp_c', 'ATPase', 'R_X', 'x_c'],
+                         [r['SBML Element ID'] for r in rowdicts])
+        for r in rowdicts:
+            self.assertEqual(set(sbml_io.FIELDNAMES), set(r.keys()))
+        
+        dG0_f = self.thermo.GetTransformedFormationEnergies([1, 2, 8, 9], pH=7.0)
+        dG0_r = float(dG0_f * np.matrix([[-1], [-1], [1], [1]]))
+        self.assertEqual('%.1f' % dG0_f[0, 1], rowdicts[0]['Value'])
+        self.assertEqual('urn:miriam:kegg.compound:C00002',
+                         rowdicts[0]['Miriam ID'])
+        self.assertEqual('%.1f' % dG0_r, rowdicts[1]['Value'])
+        self.assertEqual('ATP hydrolysis', rowdicts[1]['KEGG name'])
+        
+        # unknown formation energies make only their own rows NaN
+        self.assertEqual('nan', rowdicts[2]['Value'])
+        self.assertEqual('nan', rowdicts[3]['Value'])
+
+    
+    def testAnnotateDirectory(self):
+        model_dir = tempfile.mkdtemp()
+        try:
+            for filename in ['model.xml', 'small.SBML', 'broken.xml',
+                             'notes.txt']:
+                open(os.path.join(model_dir, filename), 'w').close()
+            csv_filename = os.path.join(model_dir, 'out.csv')
+            
+            n_rows = sbml_io.AnnotateDirectory(model_dir, csv_filename,
+                                               self.thermo, num_processes=2,
+                                               pH=7.0)
+            self.assertEqual(5, n_rows)
+            
+            rows = list(csv.DictReader(open(csv_filename)))
+            self.assertEqual(5, len(rows))
+            self.assertEqual(['SBML Model'] + sbml_io.FIELDNAMES,
+                             csv.reader(open(csv_filename)).next())
+            # broken.xml is skipped, and notes.txt is not a model
+            self.assertEqual(['model.xml'] * 4 + ['small.SBML'],
+                             sorted(r['SBML Model'] for r in rows))
+            
+            # the same rows as annotating each model on its own
+            for model in ['model.xml', 'small.SBML']:
+                expected = sbml_io.AnnotateModel(model, self.thermo, pH=7.0)
+                for rowdict in expected:
+                    rowdict['SBML Model'] = model
+                self.assertEqual(expected,
+                                 [r for r in rows if r['SBML Model'] == model])
+        finally:
+            shutil.rmtree(model_dir)
+
+
+def Suite():
+    return unittest.makeSuite(TestAnnotateModel, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from pygibbs.thermodynamics import GetReactionEnergiesFromFormationEnergies
+from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
+
+
+class TestReactionEnergies(unittest.TestCase):
+
+    def setUp(self):
+        # H2O, ATP, ADP, Pi and AMP, in the order of cids
+        self.cids = [1, 2, 8, 9, 20]
+        self.thermo = PsuedoisomerTableThermodynamics('test')
+        self.thermo.AddPseudoisomer(1, nH=2, z=0, nMg=0, dG0=-237.2)
+        self.thermo.AddPseudoisomer(2, nH=12, z=-4, nMg=0, dG0=-2768.1)
+        self.thermo.AddPseudoisomer(8, nH=12, z=-3, nMg=0, dG0=-1906.1)
+        self.thermo.AddPseudoisomer(9, nH=1, z=-2, nMg=0, dG0=-1096.1)
+        # ATP + H2O = ADP + Pi, ATP + AMP = 2 ADP, 2 Pi = 2 Pi
+        self.S = np.matrix([[-1,  0, 0],
+                            [-1, -1, 0],
+                            [ 1,  2, 0],
+                            [ 1,  0, 0],
+                            [ 0, -1, 0]])
+
+    def testMatrixOnly(self):
+        dG0_f = np.matrix(np.zeros((1, 5)))
+        self.assertRaises(AssertionError,
+                          GetReactionEnergiesFromFormationEnergies,
+                          np.array(self.S), dG0_f)
+
+    def testKnownEnergies(self):
+        dG0_f = self.thermo.GetTransformedFormationEnergies(self.cids[:4])
+        S = self.S[:4, :1]
+        dG0_r = GetReactionEnergiesFromFormationEnergies(S, dG0_f)
+        self.assertEqual(np.matrix, type(dG0_r))
+        self.assertEqual((1, 1), dG0_r.shape)
+        self.assertAlmostEqual(float(dG0_f * S), dG0_r[0, 0])
+
+    def testMissingCompound(self):
+        # there is no formation energy for AMP, so only the adenylate
+        # kinase reaction is unknown
+        dG0_f = self.thermo.GetTransformedFormationEnergies(self.cids)
+        self.assertTrue(np.isnan(dG0_f[0, 4]))
+        dG0_r = GetReactionEnergiesFromFormationEnergies(self.S, dG0_f)
+        self.assertEqual((1, 3), dG0_r.shape)
+        self.assertAlmostEqual(float(dG0_f[0, :4] * self.S[:4, 0]),
+                               dG0_r[0, 0])
+        self.assertTrue(np.isnan(dG0_r[0, 1]))
+        self.assertEqual(0.0, dG0_r[0, 2])
+
+        # the same through the estimator
+        dG0_r_thermo = self.thermo.GetTransfromedReactionEnergies(self.S,
+                                                                  self.cids)
+        self.assertEqual(np.isnan(dG0_r).tolist(),
+                         np.isnan(dG0_r_thermo).tolist())
+        self.assertAlmostEqual(dG0_r[0, 0], dG0_r_thermo[0, 0])
+
+
+def Suite():
+    return unittest.makeSuite(TestReactionEnergies, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
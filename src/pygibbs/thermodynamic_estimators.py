@@ -2,11 +2,13 @@
 
 """Functions relating to our different thermodynamic_esimators."""
 
+import os
 import logging
 
 from toolbox.database import SqliteDatabase
+from pygibbs.estimator_registry import EstimatorRegistry
 from pygibbs.groups import GroupContribution
-from pygibbs.hatzimanikatis import Hatzi
+from pygibbs.hatzimanikatis import Hatzi, HATZI_CSV_FNAME
 from pygibbs.thermodynamics import PsuedoisomerTableThermodynamics
 from pygibbs.thermodynamics import BinaryThermodynamics
 from pygibbs.thermodynamics import ReactionThermodynamics
@@ -15,58 +17,112 @@ from pygibbs.unified_group_contribution import UnifiedGroupContribution
 
 ESTIMATOR_NAMES = ('hatzi_gc', 'BGC', 'PGC', 'UGC', 'merged', 'C1', 'merged_C1')
 
+PUBLIC_DB_FILENAME = '../data/public_data.sqlite'
+GIBBS_DB_FILENAME = '../res/gibbs.sqlite'
+C1_FILENAME = '../data/thermodynamics/c1_reaction_thermodynamics.csv'
+BOUNDS_FILENAME = '../data/thermodynamics/concentration_bounds.csv'
+ESTIMATOR_CACHE_DIR = '../res/estimators'
+
+# the group contribution methods decompose every KEGG compound
+KEGG_COMPOUNDS = (PUBLIC_DB_FILENAME, 'kegg_compound')
+
 def EstimatorNames():
     return ESTIMATOR_NAMES
 
 
-def LoadAllEstimators():
-    db_public = SqliteDatabase('../data/public_data.sqlite')
-    db_gibbs = SqliteDatabase('../res/gibbs.sqlite')
-    
+def _TableExists(db_filename, table_name):
+    return lambda registry: os.path.exists(db_filename) and \
+        SqliteDatabase(db_filename).DoesTableExist(table_name)
+
+def _WithBounds(factory):
+    def BuildWithBounds(registry):
+        thermo = factory(registry)
+        thermo.load_bounds(BOUNDS_FILENAME)
+        return thermo
+    return BuildWithBounds
+
+def _PseudoisomerTable(db_filename, table_name, thermo_name):
+    def Build(registry):
+        db = SqliteDatabase(db_filename)
+        return PsuedoisomerTableThermodynamics.FromDatabase(
+                                        db, table_name, name=thermo_name)
+    return Build
+
+def _PRC(registry):
+    db_gibbs = SqliteDatabase(GIBBS_DB_FILENAME)
     if not db_gibbs.DoesTableExist('prc_pseudoisomers'):
         nist_regression = NistRegression(db_gibbs)
         nist_regression.Train()
+    return PsuedoisomerTableThermodynamics.FromDatabase(
+                    db_gibbs, 'prc_pseudoisomers', name='our method (PRC)')
+
+def _GroupContribution(transformed, name):
+    def Build(registry):
+        gc = GroupContribution(db=SqliteDatabase(GIBBS_DB_FILENAME),
+                               transformed=transformed)
+        gc.init()
+        gc.name = name
+        return gc
+    return Build
+
+def _UGC(registry):
+    ugc = UnifiedGroupContribution(db=SqliteDatabase(GIBBS_DB_FILENAME))
+    ugc.init()
+    ugc.name = 'our method (UGC)'
+    return ugc
+
+def _C1(registry):
+    return ReactionThermodynamics.FromCsv(C1_FILENAME, registry['alberty'])
+
+def _Merged(first, second):
+    return lambda registry: BinaryThermodynamics(registry[first],
+                                                 registry[second])
+
+
+def LoadAllEstimators(cache_dir=ESTIMATOR_CACHE_DIR):
+    """Returns a registry of all the estimators.
+
+    The registry behaves like a dictionary from estimator name to estimator,
+    but each estimator is only built when it is first accessed, and is then
+    cached in cache_dir (None for no caching) until the tables it is built
+    from change.
+    """
+    registry = EstimatorRegistry(sources=[BOUNDS_FILENAME], cache_dir=cache_dir)
+
+    has_alberty = _TableExists(PUBLIC_DB_FILENAME, 'alberty_pseudoisomers')
+    has_PGC = _TableExists(GIBBS_DB_FILENAME, 'pgc_pseudoisomers')
+
+    registry.Register('alberty', _WithBounds(_PseudoisomerTable(
+        PUBLIC_DB_FILENAME, 'alberty_pseudoisomers', 'Alberty')),
+        is_available=has_alberty,
+        sources=[(PUBLIC_DB_FILENAME, 'alberty_pseudoisomers')])
+    registry.Register('PRC', _WithBounds(_PRC),
+        sources=[(GIBBS_DB_FILENAME, 'prc_pseudoisomers')])
+    registry.Register('hatzi_gc', _WithBounds(lambda registry: Hatzi(use_pKa=False)),
+        sources=[HATZI_CSV_FNAME, KEGG_COMPOUNDS])
+    #registry.Register('hatzi_gc_pka', _WithBounds(lambda registry: Hatzi(use_pKa=True)))
+    registry.Register('BGC', _WithBounds(_GroupContribution(
+        True, 'our method (BGC)')),
+        is_available=_TableExists(GIBBS_DB_FILENAME, 'bgc_pseudoisomers'),
+        sources=[(GIBBS_DB_FILENAME, 'groups'), (GIBBS_DB_FILENAME, 'bgc_*'),
+                 KEGG_COMPOUNDS])
+    registry.Register('PGC', _WithBounds(_GroupContribution(
+        False, 'our method (PGC)')), is_available=has_PGC,
+        sources=[(GIBBS_DB_FILENAME, 'groups'), (GIBBS_DB_FILENAME, 'pgc_*'),
+                 KEGG_COMPOUNDS])
+    registry.Register('UGC', _WithBounds(_UGC),
+        sources=[(GIBBS_DB_FILENAME, 'groups'), (GIBBS_DB_FILENAME, 'ugc_*'),
+                 KEGG_COMPOUNDS])
+
+    # these are cheap to build from the others, so they are not cached
+    registry.Register('C1', _WithBounds(_C1), is_available=has_alberty,
+                      cacheable=False)
+    registry.Register('merged', _WithBounds(_Merged('alberty', 'PGC')),
+        is_available=lambda r: has_alberty(r) and has_PGC(r), cacheable=False)
+    registry.Register('merged_C1', _WithBounds(_Merged('C1', 'PGC')),
+        is_available=lambda r: has_alberty(r) and has_PGC(r), cacheable=False)
 
-    tables = {'alberty': (db_public, 'alberty_pseudoisomers', 'Alberty'),
-              'PRC': (db_gibbs, 'prc_pseudoisomers', 'our method (PRC)')}
-    estimators = {}
-    for key, (db, table_name, thermo_name) in tables.iteritems():
-        if db.DoesTableExist(table_name):
-            estimators[key] = PsuedoisomerTableThermodynamics.FromDatabase(
-                                            db, table_name, name=thermo_name)
-        else:
-            logging.warning('The table %s does not exist in %s' % (table_name, str(db)))
-    
-    estimators['hatzi_gc'] = Hatzi(use_pKa=False)
-    #estimators['hatzi_gc_pka'] = Hatzi(use_pKa=True)
-    
-    if db.DoesTableExist('bgc_pseudoisomers'):
-        estimators['BGC'] = GroupContribution(db=db_gibbs, transformed=True)
-        estimators['BGC'].init()
-        estimators['BGC'].name = 'our method (BGC)'
-
-    if db.DoesTableExist('pgc_pseudoisomers'):
-        estimators['PGC'] = GroupContribution(db=db_gibbs, transformed=False)
-        estimators['PGC'].init()
-        estimators['PGC'].name = 'our method (PGC)'
-
-    
-    estimators['UGC'] = UnifiedGroupContribution(db=db_gibbs)
-    estimators['UGC'].init()
-    estimators['UGC'].name = 'our method (UGC)'
-
-    
-    estimators['C1'] = ReactionThermodynamics.FromCsv(
-        '../data/thermodynamics/c1_reaction_thermodynamics.csv',
-        estimators['alberty'])
-
-    if 'PGC' in estimators:    
-        estimators['merged'] = BinaryThermodynamics(estimators['alberty'],
-                                                    estimators['PGC'])
-        estimators['merged_C1'] = BinaryThermodynamics(estimators['C1'],
-                                                       estimators['PGC'])
-
-    for thermo in estimators.values():
-        thermo.load_bounds('../data/thermodynamics/concentration_bounds.csv')
-
-    return estimators
\ No newline at end of file
+    if not registry.IsAvailable('alberty'):
+        logging.warning('The table alberty_pseudoisomers does not exist in %s'
+                        % PUBLIC_DB_FILENAME)
+    return registry
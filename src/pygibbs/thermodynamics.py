@@ -20,6 +20,36 @@ from pygibbs import kegg_errors
 from toolbox.molecule import OpenBabelError
 
 
+def ReactionProduct(x, S):
+    """Multiplies compound values by a stoichiometric matrix.
+    
+    NumPy does not convert 0*NaN (or 0*inf) into 0 in a matrix product, so
+    a single unknown formation energy would spoil every reaction. Here,
+    non-finite values only affect the reactions whose own stoichiometric
+    coefficient for that compound is nonzero.
+    
+    Args:
+        x: a KxNc matrix of values per compound (e.g. formation energies
+            or log-concentrations), one set of values per row.
+        S: the NcxNr stoichiometric matrix.
+    
+    Returns:
+        A KxNr matrix.
+    """
+    x = np.atleast_2d(np.array(x, dtype=float))
+    S = np.array(S, dtype=float)
+    finite = np.isfinite(x)
+    result = np.dot(np.where(finite, x, 0), S)
+    
+    # add the non-finite terms one compound at a time, only where the
+    # compound takes part in the reaction.
+    for c in np.flatnonzero(~finite.all(axis=0)):
+        mask = np.outer(~finite[:, c], S[c, :] != 0)
+        with np.errstate(invalid='ignore'):
+            result[mask] += np.outer(x[:, c], S[c, :])[mask]
+    return np.matrix(result)
+
+
 def GetReactionEnergiesFromFormationEnergies(S, dG0_f):
     """Calculate reaction energies from the stoichiometric matrix
        and formation energies.
@@ -27,7 +57,7 @@ def GetReactionEnergiesFromFormationEnergies(S, dG0_f):
     Technically, this simply performs np.dot(dG0_f, S).
     However, since some values in dG0_f might be NaN, this makes sure
     that the rows which are not affected by these NaNs are correctly
-    calculated.
+    calculated (see ReactionProduct).
 
     Args:
         S: stoichiometric matrix - An MxN numpy.matrix
@@ -38,13 +68,7 @@ def GetReactionEnergiesFromFormationEnergies(S, dG0_f):
         A 1xN numpy.matrix of reaction energies (dG0_r)  
     """
     assert type(S) == np.matrix
-    
-    dG0_r = np.matrix(np.zeros((1, S.shape[1])))
-    for r in xrange(S.shape[1]):
-        nonzero_c = list(S[:, r].nonzero()[0].flat)
-        dG0_r[0, r] = dG0_f[0, nonzero_c] * S[nonzero_c, r]
-        
-    return dG0_r
+    return ReactionProduct(dG0_f, S)
 
 def AddConcentrationsToReactionEnergies(S, cids, T, conc):
     logc = np.ones((1, S.shape[0])) * (R * T * np.log(conc))
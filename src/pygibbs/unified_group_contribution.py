@@ -191,6 +191,29 @@ class UnifiedGroupContribution(PsuedoisomerTableThermodynamics):
                 G[i, :] = self.cid2groupvec[cid].Flatten()
         return G, has_groupvec
 
+    def GetFormationEnergyCovariance(self, cids):
+        """Estimates the covariance of the group contribution dG0_f of 'cids'.
+        
+        Uses the residuals of the group regression over the observed
+        reactions (only reactions where all compounds have group vectors).
+        Compounds without a group vector have zero variance.
+        
+        Returns:
+            A len(cids) x len(cids) matrix.
+        """
+        obs_G, has_groupvec = self._GenerateGroupMatrix(self.cids)
+        bad_compounds = list(np.where(has_groupvec == False)[0].flat)
+        reactions_with_groupvec = []
+        for i in xrange(self.S.shape[1]):
+            if np.all(abs(self.S[bad_compounds, i]) < self.epsilon):
+                reactions_with_groupvec.append(i)
+        obs_GS = obs_G.T * self.S[:, reactions_with_groupvec]
+        _g_pgc, group_cov = LinearRegression.LeastSquaresCovariance(
+                                obs_GS, self.b[:, reactions_with_groupvec])
+        
+        G, _ = self._GenerateGroupMatrix(cids)
+        return G * group_cov * G.T
+
     def LoadData(self, FromDatabase=False):
         if FromDatabase and self.db.DoesTableExist(self.STOICHIOMETRIC_TABLE_NAME):
             logging.info("Reading group matrices from database")
@@ -1,4 +1,7 @@
 #import cv2.cv as cv
+import glob
+import multiprocessing
+import os
 import scipy.misc as misc
 import scipy.ndimage as ndimage
 import numpy as np
@@ -18,67 +21,165 @@ def GetCircle(center, radius):
             x_points += [int(np.floor(center[0] + radius - x))]*len(r_y)
     return (x_points, y_points)
 
-def NumpyDetectEdge(fname, color_filter=(1, 1, 1), 
-                    radius=510, center=(582, 791), show=False):
-    plate_circle = GetCircle(center, radius)
+# The colors used for marking colonies according to their darkest pixel,
+# as (lower bound, upper bound, RGB). The bounds are exclusive.
+COLONY_COLOR_MARKS = [(None, 100, (255, 0, 0)), # red
+                      (100, 110, (255, 255, 0)), # yellow
+                      (110, 120, (0, 255, 0)), # green
+                      (120, 130, (0, 255, 255)), # cyan
+                      (130, 140, (0, 0, 255)), # blue
+                      (140, 150, (255, 0, 255)), # magenta
+                      (150, None, (255, 255, 255))] # white
+
+_CIRCLE_MASKS = {}
+
+def CircleMask(shape, center, radius):
+    """Returns a boolean array which is True on the points of GetCircle.
     
-    im = misc.imread(fname)
+    The masks are cached, since all the plates in a batch usually share
+    the same shape, center and radius.
+    """
+    key = (tuple(shape), tuple(center), radius)
+    if key not in _CIRCLE_MASKS:
+        mask = np.zeros(shape, dtype=bool)
+        mask[GetCircle(center, radius)] = True
+        _CIRCLE_MASKS[key] = mask
+    return _CIRCLE_MASKS[key]
+
+def CircleMinimum(im, centers_x, centers_y, radius):
+    """Returns the minimum of im over GetCircle(center, radius) for many centers.
+    
+    Computes the same points as GetCircle, one row offset at a time for all
+    the centers together.
+    """
+    centers_x = np.asarray(centers_x, dtype=float)
+    centers_y = np.asarray(centers_y, dtype=float)
+    result = np.empty(len(centers_x))
+    result.fill(np.inf)
+    for x in xrange(radius+1):
+        l = np.sqrt(2*x*radius - x**2)
+        y_start = np.floor(centers_y - l).astype(int)
+        y_end = np.floor(centers_y + l).astype(int)
+        offsets = np.arange(int(np.ceil(2*l)) + 1)
+        ys = y_start[:, np.newaxis] + offsets[np.newaxis, :]
+        valid = ys < y_end[:, np.newaxis]
+        ys = np.where(valid, ys, 0)
+        rows = [np.floor(centers_x - radius + x)]
+        if x < radius:
+            rows.append(np.floor(centers_x + radius - x))
+        for row in rows:
+            xs = np.repeat(row.astype(int)[:, np.newaxis], ys.shape[1], axis=1)
+            values = np.where(valid, im[xs, ys], np.inf)
+            result = np.minimum(result, values.min(axis=1))
+    return result
+
+def FindColonies(im, color_filter=(1, 1, 1), radius=510, center=(582, 791),
+                 threshold=100, perimeter_margin=5, colony_radius=3):
+    """Finds the colonies in a plate image.
+    
+    Args:
+        im: the RGB image as an array.
+        color_filter: the weights of the color channels.
+        radius: the radius of the plate in pixels.
+        center: the center of the plate in pixels.
+        threshold: inverted intensities below this are ignored.
+        perimeter_margin: colonies this close to the plate edge are ignored.
+        colony_radius: the radius of the disk around each colony center
+            whose darkest pixel gives the colony color.
+    
+    Returns:
+        A tuple (x, y, colors) of arrays with the center of each colony
+        in image coordinates and its color (the minimal inverted intensity).
+    """
     im_gray = np.dot(im, color_filter) / sum(color_filter)
 
     imf = ndimage.gaussian_filter(im_gray, sigma=2)
     imf = 256 - imf # invert color
 
     imc = np.zeros(imf.shape, dtype=np.int32)
-    imc[plate_circle] = imf[plate_circle]
+    plate = CircleMask(imf.shape, center, radius)
+    imc[plate] = imf[plate]
     imc = imc[center[0]-radius:center[0]+radius, center[1]-radius:center[1]+radius]
-
-    T = 100
-    imc[np.where(imc < T)] = 0
+    imc[imc < threshold] = 0
     
     rmax = pymorph.regmax(imc)
     seeds, n_colonies = ndimage.label(rmax) # gives a unique integer number to each region and fills it with that number
+    if n_colonies == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    labels = np.arange(1, n_colonies + 1)
+    
+    # filter seeds which are touching the perimeter (or 5 pixel away from it)
+    x, y = np.ogrid[:imc.shape[0], :imc.shape[1]]
+    dist = np.sqrt((radius - x)**2 + (radius - y)**2)
+    max_dist = np.array(ndimage.maximum(dist, seeds, labels))
+    labels = labels[max_dist <= radius - perimeter_margin]
+    if len(labels) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    
+    centers = np.array(ndimage.center_of_mass(rmax > 0, seeds, labels))
+    meanx = centers[:, 0] + center[0] - radius
+    meany = centers[:, 1] + center[1] - radius
     
-    count = 0
-    for i in xrange(n_colonies):
-        seed = np.where(seeds==i)
-        l = len(seed[0])
-        # filter seeds which are touching the perimeter (or 5 pixel away from it) 
-        perimeter = False
-        for j in xrange(l):
-            if np.sqrt((radius-seed[0][j])**2 + (radius-seed[1][j])**2) > radius-5:
-                perimeter = True
-        if perimeter:
-            continue
+    # the darkest pixel in a small disk around each colony
+    colors = CircleMinimum(imf, meanx, meany, colony_radius)
+    return meanx.astype(int), meany.astype(int), colors
 
-        seedx = [(x + center[0] - radius) for x in seed[0]]
-        seedy = [(y + center[1] - radius) for y in seed[1]]
-        meanx = np.mean(seedx)
-        meany = np.mean(seedy)
-        
-        colony_circle = GetCircle((meanx, meany), 3)
-        colony_color = np.min(imf[colony_circle])
-        if colony_color >= 110:
-            count += 1
-        if colony_color < 100:
-            im[meanx, meany, :] = (255, 0, 0) # red
-        elif 100 < colony_color < 110:
-            im[meanx, meany, :] = (255, 255, 0) # yellow
-        elif 110 < colony_color < 120:
-            im[meanx, meany, :] = (0, 255, 0) # green 
-        elif 120 < colony_color < 130:
-            im[meanx, meany, :] = (0, 255, 255) # cyan
-        elif 130 < colony_color < 140:
-            im[meanx, meany, :] = (0, 0, 255) # blue
-        elif 140 < colony_color < 150:
-            im[meanx, meany, :] = (255, 0, 255) # magenta
-        elif 150 < colony_color:
-            im[meanx, meany, :] = (255, 255, 255) # white
+def MarkColonies(im, x, y, colors):
+    """Colors the center pixel of each colony according to COLONY_COLOR_MARKS."""
+    for low, high, rgb in COLONY_COLOR_MARKS:
+        mask = np.ones(len(colors), dtype=bool)
+        if low is not None:
+            mask &= colors > low
+        if high is not None:
+            mask &= colors < high
+        im[x[mask], y[mask], :] = rgb
+
+def NumpyDetectEdge(fname, color_filter=(1, 1, 1), 
+                    radius=510, center=(582, 791), show=False,
+                    min_color=110):
+    im = misc.imread(fname)
+    x, y, colors = FindColonies(im, color_filter, radius, center)
+    count = int(np.sum(colors >= min_color))
     
     if show:
+        MarkColonies(im, x, y, colors)
         plt.imshow(im)
         plt.show()
     return count
 
+def _CountPlate(args):
+    """Counts the colonies of one plate (for use with multiprocessing)."""
+    fname, kwargs = args
+    return NumpyDetectEdge(fname, **kwargs)
+
+def CountPlates(fnames, n_processes=1, **kwargs):
+    """Counts the colonies in many plate images.
+    
+    Args:
+        fnames: the image filenames.
+        n_processes: the number of worker processes.
+        kwargs: passed on to NumpyDetectEdge.
+    
+    Returns:
+        A dictionary mapping each filename to its colony count.
+    """
+    jobs = [(fname, kwargs) for fname in fnames]
+    if n_processes > 1:
+        pool = multiprocessing.Pool(n_processes)
+        try:
+            counts = pool.map(_CountPlate, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counts = map(_CountPlate, jobs)
+    return dict(zip(fnames, counts))
+
+def CountPlatesInDirectory(dirname, pattern='*.jpg', n_processes=1, **kwargs):
+    """Counts the colonies in all the images in a directory matching pattern."""
+    fnames = sorted(glob.glob(os.path.join(dirname, pattern)))
+    return CountPlates(fnames, n_processes=n_processes, **kwargs)
+
 if __name__ == "__main__":
     fnames = []
     #fnames += ['/home/eladn/Dropbox/Experiments/ace-plates/2011-12-29 ace- 10^5.jpg']
@@ -86,8 +187,9 @@ if __name__ == "__main__":
     fnames += ['/home/eladn/Dropbox/Experiments/ace-plates/2012-01-03 ace- 10^3.jpg']
     fnames += ['/home/eladn/Dropbox/Experiments/ace-plates/2012-01-03 ace+ 10^3.jpg']
     
+    counts = CountPlates(fnames, color_filter=(0, 0, 1)) # take only the blue color
     for fname in fnames:
-        print fname, NumpyDetectEdge(fname, color_filter=(0, 0, 1)) # take only the blue color
+        print fname, counts[fname]
     #img = cv.LoadImage(fname)
     #DetectHough(img)
     #DetectEdge(img, 7)
@@ -1,18 +1,119 @@
+import binascii
 import itertools
 import numpy as np
 
 NucleotideMap = {'A':'T', 'C':'G', 'G':'C', 'T':'A'}
 
+# Nucleotide codes in which the complement of x is 3-x
+NucleotideCode = {'A':0, 'C':1, 'G':2, 'T':3}
+
+def BindingMatrix(seqs, chunk_size=256):
+    """Returns the NxN matrix of DNAssmebler._GetPairBindingEnergy.
+    
+    With the complement of x being 3-x, the direct binding of two sequences
+    counts the positions where x+y == 3, and the binding of a sequence to the
+    complement of another counts the positions where x == y. The pair energy
+    is the larger of the two.
+    """
+    codes = np.array([[NucleotideCode[x] for x in seq] for seq in seqs],
+                     dtype=np.int8).reshape(len(seqs), -1)
+    mat = np.zeros((len(seqs), len(seqs)), dtype=np.int32)
+    for i in xrange(0, len(seqs), chunk_size):
+        rows = codes[i:i+chunk_size, np.newaxis, :]
+        direct = (rows + codes[np.newaxis, :, :] == 3).sum(axis=2)
+        comp = (rows == codes[np.newaxis, :, :]).sum(axis=2)
+        mat[i:i+chunk_size, :] = np.maximum(direct, comp)
+    return mat
+
+def _PopCount(bits):
+    return bin(bits).count('1')
+
+def _BoolsToBits(row):
+    """Converts a boolean vector to an integer whose bit j is row[j]."""
+    packed = np.packbits(np.asarray(row, dtype=bool)[::-1])
+    value = int(binascii.hexlify(packed.tostring()) or '0', 16)
+    return value >> ((-len(row)) % 8)
+
+class OverhangSearch(object):
+    """Finds a subset of overhangs with the minimal maximal pair binding energy.
+    
+    The pairwise energies are computed once. For each possible energy t and
+    each overhang i, the overhangs binding i with energy at most t are kept
+    as the bits of an integer, so that the candidates of a partial subset are
+    updated with a single AND. A depth-first branch-and-bound then drops any
+    partial subset which cannot beat the best subset found so far.
+    """
+    
+    def __init__(self, seqs):
+        self.seqs = list(seqs)
+        self.energies = BindingMatrix(self.seqs)
+        n = len(self.seqs)
+        max_energy = int(self.energies.max()) if n else 0
+        self.compatible = []
+        for t in xrange(max_energy + 1):
+            below = self.energies <= t
+            np.fill_diagonal(below, False)
+            self.compatible.append([_BoolsToBits(row) for row in below])
+        self.all_bits = (1 << n) - 1
+    
+    def _Candidates(self, cands, i, best):
+        """Filters the candidates that bind i with less than the best energy."""
+        if best > len(self.compatible):
+            return cands & self.all_bits & ~(1 << i)
+        if best <= 0:
+            return 0
+        return cands & self.compatible[int(best) - 1][i]
+    
+    def Search(self, size, target_energy=None):
+        """Returns (energy, subset) with the minimal energy of all subsets of the given size.
+        
+        Args:
+            size: the number of overhangs in the subset.
+            target_energy: if given, stop at the first subset with at most this energy.
+        """
+        self._best = (np.inf, None)
+        self._size = size
+        self._target = target_energy
+        if size <= len(self.seqs):
+            try:
+                self._Extend([], 0, self.all_bits)
+            except StopIteration:
+                pass
+        energy, subset = self._best
+        if subset is not None:
+            subset = tuple(self.seqs[i] for i in subset)
+        return energy, subset
+    
+    def _Extend(self, chosen, energy, cands):
+        if len(chosen) == self._size:
+            self._best = (energy, tuple(chosen))
+            if self._target is not None and energy <= self._target:
+                raise StopIteration
+            return
+        
+        need = self._size - len(chosen)
+        while cands:
+            if _PopCount(cands) < need:
+                return
+            low = cands & -cands
+            i = low.bit_length() - 1
+            cands ^= low
+            
+            if chosen:
+                new_energy = max(energy, self.energies[i, chosen].max())
+            else:
+                new_energy = energy
+            if new_energy >= self._best[0]:
+                continue
+            self._Extend(chosen + [i], new_energy,
+                         self._Candidates(cands, i, self._best[0]))
+
 class DNAssmebler(object):
 
     def __init__(self, length=4):
-        self.binding_mat = {}
         self.all_sense_sequences = [''.join(x) for x in 
                                itertools.product(['A','C','G','T'], repeat=length)
                                if x[-1] not in ['G','T']]
-        for seq1 in self.all_sense_sequences:
-            for seq2 in self.all_sense_sequences:
-                self.binding_mat[seq1, seq2] = DNAssmebler._GetPairBindingEnergy(seq1, seq2)
     
     @staticmethod
     def Complement(seq):
@@ -36,11 +137,8 @@ class DNAssmebler(object):
                     DNAssmebler._GetDirectBindingEnergy(comp1, comp2)])
     
     def GetBindingEnergy(self, seq1, seq2):
-        if seq1 not in self.all_sense_sequences:
-            seq1 = DNAssmebler.Complement(seq1)
-        if seq2 not in self.all_sense_sequences:
-            seq2 = DNAssmebler.Complement(seq2)
-        return self.binding_mat[seq1, seq2]
+        # the energy is the same for the complements of the sequences
+        return DNAssmebler._GetPairBindingEnergy(seq1, seq2)
     
     def GetSubsetEnergy(self, subset):
         total_energy = 0
@@ -48,7 +146,18 @@ class DNAssmebler(object):
             total_energy = max(total_energy, self.GetBindingEnergy(seq1, seq2))
         return total_energy
     
-    def FindSubsetWithMinEnergy(self, size=3, fullset=None):
+    def FindSubsetWithMinEnergy(self, size=3, fullset=None, target_energy=2):
+        """Returns (energy, subset) for a subset of overhangs with minimal energy.
+        
+        The search stops at the first subset whose energy is at most
+        target_energy (None for the exact minimum).
+        """
+        if fullset is None:
+            fullset = self.all_sense_sequences
+        return OverhangSearch(fullset).Search(size, target_energy)
+    
+    def FindSubsetWithMinEnergyExhaustive(self, size=3, fullset=None):
+        """Same as FindSubsetWithMinEnergy, by scanning all the subsets."""
         best = (np.inf, None)
         if fullset is None:
             fullset = self.all_sense_sequences
@@ -92,9 +201,6 @@ if __name__ == "__main__":
     #print assembler.FindSubsetWithMinEnergy(7)
     
     h = Hamming()
-    bindmat = np.zeros((len(h.code), len(h.code)))
-    for i in xrange(len(h.code)):
-        for j in xrange(len(h.code)):
-            bindmat[i,j] = assembler.GetBindingEnergy(h.code[i], h.code[j])
+    bindmat = BindingMatrix(h.code)
     for i in xrange(4, 10):
         print i, assembler.FindSubsetWithMinEnergy(i, h.code)
@@ -1,44 +1,68 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
-def simulate(S0, Sn, k_plus, k_minus):
-    n = len(k_plus)
-    assert len(k_minus) == n
-
-    S = np.zeros((n+1))
-    S[0] = S0
-    S[n] = Sn
+def simulate_batch(S0, Sn, k_plus, k_minus):
+    """Steady state of a linear pathway S0 <=> S1 <=> ... <=> Sn for many parameter sets.
     
-    # shift k's so the index will start at 1
-    k_plus = np.array([1.0] + k_plus, dtype='float')
-    k_minus = np.array([1.0] + k_minus, dtype='float')
-    q = k_plus/k_minus
-    Q = lambda i,j : np.prod(q[i:j+1])
+    Arguments:
+        S0, Sn  - the fixed concentrations at both ends (scalars or arrays of length N)
+        k_plus  - N x n array of the forward rate constants (one parameter set per row)
+        k_minus - N x n array of the backward rate constants
     
-    J = (S[0] * Q(1,n) - S[n]) / (np.sum([Q(i,n)/k_plus[i] for i in xrange(1, n+1)]))
-    
-    for i in xrange(1, n+1):
-        S[i] = (S[i-1] - J/k_plus[i]) * q[i]
+    Returns:
+        J - array of the N fluxes
+        S - N x (n+1) array of the concentrations S0, S1, ..., Sn
+    """
+    k_plus = np.atleast_2d(np.array(k_plus, dtype='float'))
+    k_minus = np.atleast_2d(np.array(k_minus, dtype='float'))
+    assert k_plus.shape == k_minus.shape
+    N, n = k_plus.shape
+    S0 = np.ones(N) * S0
+    Sn = np.ones(N) * Sn
 
+    q = k_plus / k_minus
+    
+    # Q(i,n) = q[i]*...*q[n] is the reversed cumulative product of q
+    Q_to_end = np.cumprod(q[:, ::-1], axis=1)[:, ::-1]
+    J = (S0 * Q_to_end[:, 0] - Sn) / np.sum(Q_to_end / k_plus, axis=1)
+    
+    # S[i] = (S[i-1] - J/k_plus[i]) * q[i] unrolls to
+    # S[i] = C[i] * (S0 - J * sum_{m<=i} 1/(k_plus[m]*C[m-1])) with C the cumulative product of q
+    C = np.cumprod(q, axis=1)
+    C_prev = np.hstack([np.ones((N, 1)), C[:, :-1]])
+    S = np.zeros((N, n+1))
+    S[:, 0] = S0
+    S[:, 1:] = C * (S0[:, np.newaxis] -
+                    J[:, np.newaxis] * np.cumsum(1.0 / (k_plus * C_prev), axis=1))
     return J, S
 
-def calc(k_1, k_2, k_m2):
+def simulate(S0, Sn, k_plus, k_minus):
+    n = len(k_plus)
+    assert len(k_minus) == n
+    J, S = simulate_batch(S0, Sn, [k_plus], [k_minus])
+    return J[0], S[0, :]
+
+def calc_batch(k_1, k_2, k_m2):
+    """Same as calc, for arrays of rate constants."""
+    k_1, k_2, k_m2 = np.broadcast_arrays(np.array(k_1, dtype='float'),
+                                         np.array(k_2, dtype='float'),
+                                         np.array(k_m2, dtype='float'))
     S0, Sn = 1.0, 1.0
     Q = 100.0
     k_m1 = k_1*k_2/(k_m2 * Q)
-    J, S = simulate(S0, Sn, [k_1, k_2], [k_m1, k_m2])
-    return J, S[1]
+    J, S = simulate_batch(S0, Sn, np.vstack([k_1.flat, k_2.flat]).T,
+                          np.vstack([k_m1.flat, k_m2.flat]).T)
+    return J.reshape(k_1.shape), S[:, 1].reshape(k_1.shape)
+
+def calc(k_1, k_2, k_m2):
+    J, S1 = calc_batch(k_1, k_2, k_m2)
+    return float(J), float(S1)
 
 if __name__ == "__main__":
-    ks = [10**x for x in np.arange(-3, 3, 0.1)]
+    ks = 10**np.arange(-3, 3, 0.1)
     
-    Js = []
-    S1s = []
-    for k in ks:
-        #J, S1 = calc(10, 1, k_m2)
-        J, S1 = calc(k, 1, 0.1)
-        Js.append(J)
-        S1s.append(S1)
+    #Js, S1s = calc_batch(10, 1, ks)
+    Js, S1s = calc_batch(ks, 1, 0.1)
 
     fig = plt.figure()
     plt.plot(ks, Js, figure=fig, label='$J$')
@@ -48,4 +72,4 @@ if __name__ == "__main__":
     #plt.xlabel('$k_{-2}$')
     plt.xlabel('$k_1$')
     plt.legend()
-    plt.show()
\ No newline at end of file
+    plt.show()
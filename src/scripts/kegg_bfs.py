@@ -1,32 +1,18 @@
 from pygibbs.kegg import Kegg
+from pygibbs.kegg_graph import KeggCompoundGraph
 from toolbox.html_writer import HtmlWriter
 from pygibbs.kegg_errors import KeggParseException
 from toolbox.molecule import OpenBabelError
 
 if __name__ == "__main__":
     kegg = Kegg.getInstance()
+    graph = KeggCompoundGraph.LoadOrCreate(kegg)
     
-    
-    graph = {}
-    for rid in kegg.get_all_rids():
-        r = kegg.rid2reaction(rid)
-        for cid1 in r.sparse.keys():
-            for cid2 in r.sparse.keys():
-                if r.sparse[cid1] * r.sparse[cid2] < 0:
-                    graph.setdefault(cid1, set()).add(cid2)
-    
-    queue = [355]
     cofactors = set([1,2,3,4,5,6,7,8,9,10,11,13,14,20,28,30])
     html_writer = HtmlWriter('../res/kegg_bfs.html')
     
-    for i in xrange(3):
-        next_queue = set()
-        cofactors.update(queue)
-        while queue:
-            cid = queue.pop(0)
-            next_queue.update(graph[cid])
-        queue = list(next_queue.difference(cofactors))
-        
+    layers = graph.Layers([355], 3, cofactors)
+    for queue in layers[1:]:
         for cid in queue:
             try:
                 html_writer.write(kegg.cid2mol(cid).ToSVG())
@@ -1,37 +1,150 @@
-import csv, itertools
+import csv
 from pygibbs.kegg_reaction import Reaction
 
-def combine(fname, text_out):
+def read_modules(fname):
+	"""
+		Reads the modules and their options from a CSV file.
+		
+		Returns:
+			A list with one item per module (sorted by name). Each item is a list
+			of (option name, enzymes, enzyme names, net sparse reaction), where
+			enzymes is a list of (enzyme, formula, flux) and the net reaction is
+			the flux-weighted sum of the option's reactions.
+	"""
 	modules = {}
 	for row in csv.DictReader(open(fname, 'r')):
 		options = modules.setdefault(row['Module'], {})
 		enzymes = options.setdefault(row['Option'], [])
 		reaction = Reaction.FromFormula(row['Formula'])
 		reaction.Balance(balance_water=False, exception_if_unknown=False)
-		enzymes.append((row['Enzyme'], row['Formula'], float(row['Flux'])))
+		enzymes.append((row['Enzyme'], row['Formula'], float(row['Flux']), reaction))
 	
 	l_mod = []
 	for module, options in sorted(modules.iteritems()):
 		l_opt = []
 		for option, enzymes in sorted(options.iteritems()):
-			l_opt.append(("%s%s" % (module, option), enzymes))
+			net = {}
+			for _, _, flux, reaction in enzymes:
+				for cid, coeff in reaction.sparse.iteritems():
+					net[cid] = net.get(cid, 0) + flux * coeff
+			l_opt.append(("%s%s" % (module, option),
+						  [(enzyme, formula, flux) for enzyme, formula, flux, _ in enzymes],
+						  frozenset(enzyme for enzyme, _, _, _ in enzymes),
+						  net))
 		l_mod.append(l_opt)
+	return l_mod
+
+def _balance_bounds(l_mod, balanced_cids):
+	"""
+		For each module index i, returns the minimal and maximal total net
+		stoichiometry that modules i, i+1, ... can add to each balanced compound.
+	"""
+	bounds = [None] * (len(l_mod) + 1)
+	bounds[len(l_mod)] = (dict((cid, 0) for cid in balanced_cids),
+						  dict((cid, 0) for cid in balanced_cids))
+	for i in xrange(len(l_mod) - 1, -1, -1):
+		lower, upper = bounds[i + 1]
+		lower, upper = dict(lower), dict(upper)
+		for cid in balanced_cids:
+			values = [net.get(cid, 0) for _, _, _, net in l_mod[i]]
+			lower[cid] += min(values)
+			upper[cid] += max(values)
+		bounds[i] = (lower, upper)
+	return bounds
+
+def iter_combinations(l_mod, max_enzymes=None, balanced_cids=None, tolerance=1e-9):
+	"""
+		Lazily yields the combinations of one option per module (in the same
+		order as itertools.product).
+		
+		Arguments:
+			l_mod - the modules, as returned by read_modules
+			max_enzymes - skip combinations using more distinct enzymes than this
+			balanced_cids - compounds whose net stoichiometry must be zero
+			tolerance - the allowed imbalance
+		
+		A partial combination is dropped as soon as it uses too many enzymes, or
+		when the remaining modules cannot bring a balanced compound back to zero.
+		
+		Yields:
+			Lists of (option name, enzymes, enzyme names, net sparse reaction).
+	"""
+	balanced_cids = list(balanced_cids or [])
+	bounds = _balance_bounds(l_mod, balanced_cids)
+	
+	def feasible(net, i):
+		lower, upper = bounds[i]
+		for cid in balanced_cids:
+			x = net.get(cid, 0)
+			if x + lower[cid] > tolerance or x + upper[cid] < -tolerance:
+				return False
+		return True
+	
+	def extend(i, combination, enzyme_names, net):
+		if i == len(l_mod):
+			yield list(combination)
+			return
+		for option in l_mod[i]:
+			names = enzyme_names | option[2]
+			if max_enzymes is not None and len(names) > max_enzymes:
+				continue
+			new_net = dict(net)
+			for cid, coeff in option[3].iteritems():
+				new_net[cid] = new_net.get(cid, 0) + coeff
+			if not feasible(new_net, i + 1):
+				continue
+			combination.append(option)
+			for result in extend(i + 1, combination, names, new_net):
+				yield result
+			combination.pop()
 	
-	for combination in itertools.product(*l_mod):
-		entry = '_'.join([mod for mod, enzymes in combination])
-		text_out.write('ENTRY       %s\n' % entry)
-		text_out.write('THERMO      merged\n')
-		firstrow = True
-		for mod, enzymes in combination:
+	if feasible({}, 0):
+		for result in extend(0, [], frozenset(), {}):
+			yield result
+
+def write_text(combination, text_out):
+	entry = '_'.join([mod for mod, _, _, _ in combination])
+	text_out.write('ENTRY       %s\n' % entry)
+	text_out.write('THERMO      merged\n')
+	firstrow = True
+	for mod, enzymes, _, _ in combination:
+		for enzyme, formula, flux in enzymes:
+			if firstrow:
+				text_out.write('REACTION    %-6s %s (x%g)\n' %
+							   (enzyme, formula, flux))
+				firstrow = False
+			else:
+				text_out.write('            %-6s %s (x%g)\n' %
+							   (enzyme, formula, flux))
+	text_out.write('///\n')
+
+def combine(fname, text_out, max_enzymes=None, balanced_cids=None):
+	l_mod = read_modules(fname)
+	for combination in iter_combinations(l_mod, max_enzymes, balanced_cids):
+		write_text(combination, text_out)
+
+CSV_HEADER = ['Entry', 'Enzymes', 'Enzyme', 'Formula', 'Flux']
+
+def combine_csv(fname, csv_out, max_enzymes=None, balanced_cids=None):
+	"""
+		Same as combine, but writes one CSV row per enzyme of every combination,
+		one combination at a time.
+		
+		Returns:
+			The number of combinations written.
+	"""
+	writer = csv.writer(csv_out)
+	writer.writerow(CSV_HEADER)
+	l_mod = read_modules(fname)
+	count = 0
+	for combination in iter_combinations(l_mod, max_enzymes, balanced_cids):
+		entry = '_'.join([mod for mod, _, _, _ in combination])
+		n_enzymes = len(frozenset().union(*[names for _, _, names, _ in combination]))
+		for mod, enzymes, _, _ in combination:
 			for enzyme, formula, flux in enzymes:
-				if firstrow:
-					text_out.write('REACTION    %-6s %s (x%g)\n' %
-								   (enzyme, formula, flux))
-					firstrow = False
-				else:
-					text_out.write('            %-6s %s (x%g)\n' %
-								   (enzyme, formula, flux))
-		text_out.write('///\n')
+				writer.writerow([entry, n_enzymes, enzyme, formula, '%g' % flux])
+		count += 1
+	return count
 
 def main():
 	text_out = open('scripts/pathway_combinatorics/pathway_combinatorics.txt', 'w')
@@ -1,6 +1,7 @@
 #!/usr/bin/python
 
 import itertools
+import numpy as np
 
 from Bio.Alphabet import DNAAlphabet
 from Bio.Alphabet.IUPAC import IUPACAmbiguousDNA
@@ -44,6 +45,20 @@ class AmbigousDNASeq(Seq):
         
         return Seq(self.tostring(), DNAAlphabet())
     
+    def GetExpander(self):
+        """Returns a ConcreteSeqExpander for this sequence."""
+        return ConcreteSeqExpander(''.join(self._seq_list),
+                                   self.AMBIGUOUS_BASE_MAP)
+    
+    def NumConcreteSeqs(self):
+        """Returns the number of concrete sequences denoted by this one."""
+        return self.GetExpander().NumVariants()
+    
+    def GetConcreteSeqAt(self, k):
+        """Returns the k-th concrete sequence (in the order of
+           AllConcreteSeqs) as a Bio.Seq.Seq object."""
+        return Seq(self.GetExpander().GetVariant(k), DNAAlphabet())
+    
     def AllConcreteSeqs(self):
         """An iterator over all the concrete sequences denoted by this
            ambiguous one.
@@ -51,25 +66,114 @@ class AmbigousDNASeq(Seq):
         Yields:
             Each possible concrete sequence as a Bio.Seq.Seq object.
         """
-        ambiguous_positions = self.AmbiguousPositions()
+        for chunk in self.GetExpander().IterVariants():
+            for row in chunk:
+                yield Seq(row.tostring(), DNAAlphabet())
+
+
+class ConcreteSeqExpander(object):
+    """Indexed expansion of an ambiguous DNA sequence.
+    
+    Sequences are handled as uint8 arrays of ASCII codes. The concrete
+    variants are numbered in the order of itertools.product over the
+    ambiguous positions (the last position changes fastest), so the k-th
+    variant is found by writing k in the mixed radix given by the number
+    of substitutions of each ambiguous position.
+    """
+    
+    def __init__(self, seq_str,
+                 ambiguous_base_map=AmbigousDNASeq.AMBIGUOUS_BASE_MAP):
+        seq_str = seq_str.upper()
+        self.template = np.fromstring(seq_str, dtype=np.uint8)
+        self.positions = [i for i, base in enumerate(seq_str)
+                          if base in ambiguous_base_map]
+        self.substitutions = [np.fromstring(''.join(ambiguous_base_map[seq_str[i]]),
+                                            dtype=np.uint8)
+                              for i in self.positions]
+        self.radices = [len(subs) for subs in self.substitutions]
         
-        ambiguous_position_ranges = []
-        for pos in ambiguous_positions:
-            ambig_base = self._seq_list[pos]
-            substitutions = self.AMBIGUOUS_BASE_MAP[ambig_base]
-            r = range(len(substitutions))
-            ambiguous_position_ranges.append(range(len(substitutions)))
+        # allowed[i, c] is True if the ASCII code c can appear at position i
+        self.allowed = np.zeros((len(seq_str), 256), dtype=bool)
+        self.allowed[np.arange(len(seq_str)), self.template] = True
+        for i, subs in zip(self.positions, self.substitutions):
+            self.allowed[i, subs] = True
+    
+    def NumVariants(self):
+        """Returns the number of concrete variants (a Python long if needed)."""
+        return reduce(lambda x, y: x * y, self.radices, 1)
+    
+    def GetVariant(self, k):
+        """Returns the k-th concrete variant as a string."""
+        n = self.NumVariants()
+        if not 0 <= k < n:
+            raise IndexError('Variant index %d out of range (%d variants)'
+                             % (k, n))
+        seq = self.template.copy()
+        for j in xrange(len(self.positions) - 1, -1, -1):
+            k, digit = divmod(k, self.radices[j])
+            seq[self.positions[j]] = self.substitutions[j][digit]
+        return seq.tostring()
+    
+    def GetVariants(self, start, stop):
+        """Returns variants start..stop-1 as a 2D uint8 array (one per row)."""
+        stop = min(stop, self.NumVariants())
+        if stop > np.iinfo(np.int64).max:
+            # the indices do not fit in int64, use Python longs instead
+            variants = np.empty((max(stop - start, 0), len(self.template)),
+                                dtype=np.uint8)
+            for i in xrange(len(variants)):
+                variants[i, :] = np.fromstring(self.GetVariant(start + i),
+                                               dtype=np.uint8)
+            return variants
+        
+        indices = np.arange(start, stop, dtype=np.int64)
+        variants = np.tile(self.template, (len(indices), 1))
+        for j in xrange(len(self.positions) - 1, -1, -1):
+            indices, digits = np.divmod(indices, self.radices[j])
+            variants[:, self.positions[j]] = self.substitutions[j][digits]
+        return variants
+    
+    def IterVariants(self, chunk_size=4096):
+        """Iterates over all the variants in chunks of 2D uint8 arrays."""
+        n = self.NumVariants()
+        # not xrange, since n might not fit in a C long
+        start = 0
+        while start < n:
+            yield self.GetVariants(start, start + chunk_size)
+            start += chunk_size
+    
+    def Matches(self, concrete_seqs):
+        """Checks which concrete sequences are denoted by this pattern.
         
-        for concrete_indices in itertools.product(*ambiguous_position_ranges):
-            new_seq_list = list(self._seq_list)
-            
-            for ambig_index, concrete_index in enumerate(concrete_indices):
-                pos = ambiguous_positions[ambig_index]
-                ambig_base = self._seq_list[pos]
-                substitution = self.AMBIGUOUS_BASE_MAP[ambig_base][concrete_index]
-                
-                new_seq_list[pos] = substitution
-            
-            yield Seq(''.join(new_seq_list), DNAAlphabet())
-                
-                
+        Args:
+            concrete_seqs: a list of strings, or a 2D uint8 array with one
+                sequence per row. Sequences of a different length than the
+                pattern never match.
+        
+        Returns:
+            A 1d boolean array.
+        """
+        L = len(self.template)
+        if not isinstance(concrete_seqs, np.ndarray):
+            same_length = np.array([len(s) == L for s in concrete_seqs],
+                                   dtype=bool)
+            seqs = np.zeros((len(concrete_seqs), L), dtype=np.uint8)
+            for i in np.flatnonzero(same_length):
+                seqs[i, :] = np.fromstring(concrete_seqs[i].upper(),
+                                           dtype=np.uint8)
+            return same_length & self.Matches(seqs)
+        
+        seqs = np.atleast_2d(concrete_seqs)
+        if seqs.shape[1] != L:
+            return np.zeros(seqs.shape[0], dtype=bool)
+        return self.allowed[np.arange(L), seqs].all(axis=1)
+    
+    def FindMatches(self, concrete_seq):
+        """Returns the start positions of the pattern in a longer sequence."""
+        seq = np.fromstring(concrete_seq.upper(), dtype=np.uint8)
+        L = len(self.template)
+        if len(seq) < L:
+            return []
+        windows = np.lib.stride_tricks.as_strided(
+            seq, shape=(len(seq) - L + 1, L), strides=(seq.strides[0],) * 2)
+        return list(np.flatnonzero(self.Matches(windows)))
@@ -38,8 +38,57 @@ class TestAmbigousDNASeq(unittest.TestCase):
         self.assertSeqsEqual(expected_seqs, ambig_seq.AllConcreteSeqs())
 
 
+class TestConcreteSeqExpander(unittest.TestCase):
+    
+    def setUp(self):
+        self.expander = ambiguous_seq.ConcreteSeqExpander('ACNGGVA')
+        self.expected_seqs = ['ACAGGGA', 'ACAGGCA', 'ACAGGAA',
+                              'ACGGGGA', 'ACGGGCA', 'ACGGGAA',
+                              'ACCGGGA', 'ACCGGCA', 'ACCGGAA',
+                              'ACTGGGA', 'ACTGGCA', 'ACTGGAA']
+    
+    def testGetVariant(self):
+        self.assertEqual(12, self.expander.NumVariants())
+        self.assertEqual(self.expected_seqs,
+                         map(self.expander.GetVariant, xrange(12)))
+        self.assertRaises(IndexError, self.expander.GetVariant, 12)
+        
+        expander = ambiguous_seq.ConcreteSeqExpander('N' * 50)
+        self.assertEqual(4 ** 50, expander.NumVariants())
+        self.assertEqual('T' * 50, expander.GetVariant(4 ** 50 - 1))
+    
+    def testIterVariants(self):
+        chunks = list(self.expander.IterVariants(chunk_size=5))
+        self.assertEqual([5, 5, 2], [len(c) for c in chunks])
+        self.assertEqual(self.expected_seqs,
+                         [row.tostring() for c in chunks for row in c])
+    
+    def testHugeVariants(self):
+        # more variants than fit in int64
+        expander = ambiguous_seq.ConcreteSeqExpander('N' * 40)
+        n = expander.NumVariants()
+        first = expander.IterVariants(chunk_size=3).next()
+        self.assertEqual(['A' * 40, 'A' * 39 + 'G', 'A' * 39 + 'C'],
+                         [row.tostring() for row in first])
+        
+        for start in [2 ** 63 - 2, n - 2]:
+            variants = expander.GetVariants(start, start + 4)
+            self.assertEqual([expander.GetVariant(start + i)
+                              for i in xrange(min(4, n - start))],
+                             [row.tostring() for row in variants])
+    
+    def testMatches(self):
+        self.assertEqual([True, True, False, False],
+                         list(self.expander.Matches(['ACTGGCA', 'actggaa',
+                                                     'ACTGGTA', 'ACTGG'])))
+        self.assertEqual([2, 11],
+                         self.expander.FindMatches('TTACAGGAACTACGGGGA'))
+
+
 def Suite():
-    return unittest.makeSuite(TestAmbigousDNASeq,'test')
+    return unittest.TestSuite([
+        unittest.makeSuite(TestAmbigousDNASeq,'test'),
+        unittest.makeSuite(TestConcreteSeqExpander,'test')])
     
 
 if __name__ == '__main__':
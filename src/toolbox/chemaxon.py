@@ -1,4 +1,4 @@
-import logging, itertools, subprocess, os
+import logging, itertools, subprocess, os, tempfile
 import numpy as np
 
 CXCALC_BIN = "/usr/bin/cxcalc"
@@ -6,14 +6,15 @@ CXCALC_BIN = "/usr/bin/cxcalc"
 class ChemAxonError(Exception):
     pass
 
-def RunCxcalc(args):
-    if not os.path.exists(CXCALC_BIN):
+def RunCxcalc(args, cxcalc_bin=None):
+    cxcalc_bin = cxcalc_bin or CXCALC_BIN
+    if not os.path.exists(cxcalc_bin):
         raise Exception("Jchem must be installed to calculate pKa data.")
     
-    debug_args = "ARGS: %s" % ' '.join([CXCALC_BIN] + args)
+    debug_args = "ARGS: %s" % ' '.join([cxcalc_bin] + args)
     logging.debug("\n" + debug_args)
-    p = subprocess.Popen([CXCALC_BIN] + args,
-                         executable=CXCALC_BIN, stdout=subprocess.PIPE)
+    p = subprocess.Popen([cxcalc_bin] + args,
+                         executable=cxcalc_bin, stdout=subprocess.PIPE)
     #p.wait()
     #os.remove(temp_fname)
     res = p.communicate()[0]
@@ -28,9 +29,32 @@ def ParsePkaOutput(s, n_acidic, n_basic, pH_list):
             A dictionary that maps the atom index to a list of pKas
             that are assigned to that atom.
     """
+    return _ParsePkaLine(s.split('\n')[1], n_acidic, n_basic, pH_list)
+
+def ParseBatchPkaOutput(s, n_molecules, n_acidic, n_basic, pH_list):
+    """
+        Parses the output of a cxcalc run on a file with several molecules.
+        The first column of every record is the (1-based) index of the
+        molecule in the input file.
+        
+        Returns:
+            A list with the result of ParsePkaOutput for each molecule,
+            or None for the molecules that ChemAxon failed on.
+    """
+    results = [None] * n_molecules
+    for pkaline in s.split('\n')[1:]:
+        if not pkaline.strip():
+            continue
+        try:
+            i = int(pkaline.split('\t')[0]) - 1
+            results[i] = _ParsePkaLine(pkaline, n_acidic, n_basic, pH_list)
+        except (ValueError, IndexError, ChemAxonError):
+            logging.debug("Cannot parse the cxcalc output: %s" % pkaline)
+    return results
+
+def _ParsePkaLine(pkaline, n_acidic, n_basic, pH_list):
     atom2pKa = {}
 
-    pkaline = s.split('\n')[1]
     splitline = pkaline.split('\t')
     splitline.pop(0)
     
@@ -62,6 +86,24 @@ def ParsePkaOutput(s, n_acidic, n_basic, pH_list):
     smiles_list = splitline
     return atom2pKa, smiles_list
 
+def _GetCxcalcArgs(n_acidic, n_basic, pH_list):
+    args = []
+    if n_acidic + n_basic > 0:
+        args += ['pka', '-a', str(n_acidic), '-b', str(n_basic),
+                 '-M', 'true', '-P', 'dynamic']
+    for pH in pH_list:
+        args += ['majorms', '--pH', str(pH), '-M', 'true']
+    return args
+
+def _GetAllPkas(atom2pKa, transform_multiples=False):
+    all_pKas = []
+    for pKa_list in atom2pKa.values():
+        all_pKas += [pKa for pKa, _ in pKa_list]
+    
+    if transform_multiples:
+        all_pKas = _TransformMultiples(all_pKas)
+    return sorted(all_pKas)
+
 def _GetDissociationConstants(molstring, n_acidic=10, n_basic=10, pH_list=None,
                               transform_multiples=False):
     """
@@ -73,25 +115,11 @@ def _GetDissociationConstants(molstring, n_acidic=10, n_basic=10, pH_list=None,
               at the given pH.
     """
     pH_list = pH_list or []
-    args = []
-    if n_acidic + n_basic > 0:
-        args += ['pka', '-a', str(n_acidic), '-b', str(n_basic),
-                 '-M', 'true', '-P', 'dynamic']
-    for pH in pH_list:
-        args += ['majorms', '--pH', str(pH), '-M', 'true']
-    args += [molstring]
+    args = _GetCxcalcArgs(n_acidic, n_basic, pH_list) + [molstring]
     
     output = RunCxcalc(args)
     atom2pKa, smiles_list = ParsePkaOutput(output, n_acidic, n_basic, pH_list)
-    
-    all_pKas = []
-    for pKa_list in atom2pKa.values():
-        all_pKas += [pKa for pKa, _ in pKa_list]
-    
-    if transform_multiples:
-        all_pKas = _TransformMultiples(all_pKas)
-        
-    return sorted(all_pKas), smiles_list
+    return _GetAllPkas(atom2pKa, transform_multiples), smiles_list
 
 def GetDissociationConstants(molstring, n_acidic=10, n_basic=10, mid_pH=7,
                              calculate_all_ms=False, transform_multiples=False):
@@ -117,20 +145,15 @@ def GetDissociationConstants(molstring, n_acidic=10, n_basic=10, mid_pH=7,
     if all_pKas == []:
         return [], major_ms
     
-    if calculate_all_ms:
-        pH_list = [all_pKas[0]-0.1]
-        for i in range(len(all_pKas)-1):
-            pH_list.append((all_pKas[i] + all_pKas[i+1]) * 0.5)
-        pH_list.append(all_pKas[-1]+0.1)
-        
-        _, smiles_list = _GetDissociationConstants(molstring, 0, 0, pH_list)
-    else: # find the index of the major pseudoisomer and use None for all the others
-        smiles_list = [None] * (len(all_pKas) + 1)
-        if mid_pH < min(all_pKas):
-            major_i = 0
-        else:
-            major_i = 1 + max([i for i, pKa in enumerate(all_pKas) if pKa < mid_pH])
-        smiles_list[major_i] = major_ms
+    if not calculate_all_ms:
+        return _MajorOnlyDissociationTable(all_pKas, major_ms, mid_pH), major_ms
+
+    pH_list = [all_pKas[0]-0.1]
+    for i in range(len(all_pKas)-1):
+        pH_list.append((all_pKas[i] + all_pKas[i+1]) * 0.5)
+    pH_list.append(all_pKas[-1]+0.1)
+    
+    _, smiles_list = _GetDissociationConstants(molstring, 0, 0, pH_list)
     
     diss_table = []
     for i, pKa in enumerate(all_pKas):
@@ -138,6 +161,64 @@ def GetDissociationConstants(molstring, n_acidic=10, n_basic=10, mid_pH=7,
     
     return diss_table, major_ms
 
+def _MajorOnlyDissociationTable(all_pKas, major_ms, mid_pH):
+    """
+        Finds the index of the major pseudoisomer and uses None for all
+        the others.
+    """
+    smiles_list = [None] * (len(all_pKas) + 1)
+    if mid_pH < min(all_pKas):
+        major_i = 0
+    else:
+        major_i = 1 + max([i for i, pKa in enumerate(all_pKas) if pKa < mid_pH])
+    smiles_list[major_i] = major_ms
+    
+    diss_table = []
+    for i, pKa in enumerate(all_pKas):
+        diss_table.append((pKa, smiles_list[i], smiles_list[i+1]))
+    return diss_table
+
+def GetBatchDissociationConstants(molstrings, n_acidic=10, n_basic=10,
+                                  mid_pH=7, transform_multiples=False,
+                                  cxcalc_bin=None):
+    """
+        Calculates the dissociation constants of many molecules with a
+        single cxcalc run (only the major pseudoisomer is returned, as in
+        GetDissociationConstants with calculate_all_ms=False).
+        
+        Arguments:
+            molstrings - a list of SMILES or InChI strings
+            cxcalc_bin - the cxcalc executable (default: CXCALC_BIN)
+        
+        Returns:
+            A list with a pair (diss_constants, major_ms) for each molecule,
+            or None for the molecules that ChemAxon failed on.
+    """
+    fd, input_fname = tempfile.mkstemp(suffix='.txt')
+    try:
+        os.write(fd, ''.join(s + '\n' for s in molstrings))
+        os.close(fd)
+        args = _GetCxcalcArgs(n_acidic, n_basic, [mid_pH]) + [input_fname]
+        output = RunCxcalc(args, cxcalc_bin)
+    finally:
+        os.remove(input_fname)
+    
+    results = []
+    for parsed in ParseBatchPkaOutput(output, len(molstrings),
+                                      n_acidic, n_basic, [mid_pH]):
+        if parsed is None:
+            results.append(None)
+            continue
+        atom2pKa, smiles_list = parsed
+        all_pKas = _GetAllPkas(atom2pKa, transform_multiples)
+        major_ms = smiles_list[0]
+        if all_pKas == []:
+            results.append(([], major_ms))
+        else:
+            results.append((_MajorOnlyDissociationTable(all_pKas, major_ms,
+                                                        mid_pH), major_ms))
+    return results
+
 def _TransformMultiples(all_pKas):
     """
         There are two ways to interpret the pKa values coming from ChemAxon.
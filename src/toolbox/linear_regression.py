@@ -76,6 +76,29 @@ class LinearRegression(object):
         P_L = U[:,r:] * (U[:,r:].T) # a projection matrix onto the null-space of A
         return x, P_C, P_L
 
+    @staticmethod
+    def LeastSquaresCovariance(A, y, eps=1e-10):
+        """
+            Estimates the covariance of x in the minimization of ||xA - y||,
+            where y is a row vector of observations.
+            
+            Returns:
+                x   - the regression result
+                cov - the covariance matrix of x, i.e. s^2 * pinv(A * A.T)
+                      where s^2 is the residual variance (using the
+                      rank of A as the number of degrees of freedom)
+        """
+        A = np.matrix(A)
+        y = np.matrix(y)
+        x, _P_C, _P_L = LinearRegression._LeastSquaresProjection(A, y, eps)
+        r = LinearRegression.MatrixRank(A, eps)
+        n_obs = A.shape[1]
+        resid = y - x * A
+        dof = max(n_obs - r, 1)
+        s2 = float(resid * resid.T) / dof
+        cov = s2 * np.linalg.pinv(A * A.T, rcond=eps)
+        return x, np.matrix(cov)
+
     @staticmethod
     def LeastSquaresWithFixedPoints(A, y, index2value):
         """
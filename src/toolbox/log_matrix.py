@@ -1,86 +1,175 @@
-from pylab import log, exp, zeros, ones, matrix, pi, nan
-from toolbox.util import log_sum_exp, log_subt_exp
+"""
+    Linear algebra in log space.
+
+    A matrix X is represented by a signed-log pair (L, S), where
+    L = log(|X|) (-inf for zero entries) and S = sign(X). This keeps
+    matrices whose entries span hundreds of orders of magnitude exact
+    in relative terms, where the plain values would over- or underflow.
+"""
+
+import numpy as np
+
+# the maximal number of elements in the temporary 3D array of log_dot
+MAX_BLOCK_ELEMENTS = 2 ** 22
 
-def log_regress(X, y):
-    return log_dot(log_dot(log_inv(log_dot(X.T,X)), X.T), y)
 
 def log_mat(X):
-    res = zeros(X.shape) * complex(0,0)
-    for i in range(X.shape[0]):
-        for j in range(X.shape[1]):
-            if (X[i,j] > 0):
-                res[i,j] = complex(log(X[i,j]), 0)
-            elif (X[i,j] < 0):
-                res[i,j] = complex(log(-X[i,j]), pi)
-            else:
-                res[i,j] = nan
-    return res
-
-def log_dot(X,Y):
-    if (X.shape[1] != Y.shape[0]):
-        raise Exception("The dimensions of the matrices do not match: (%d,%d) and (%d,%d)" % (X.shape[0], X.shape[1], Y.shape[0], Y.shape[1]))
-    R = zeros((X.shape[0], Y.shape[1]))
-    for i in range(X.shape[0]):
-        for j in range(Y.shape[1]):
-            R[i,j] = log_sum_exp([(X[i,k] + Y[k,j]) for k in range(X.shape[1])])
-    return R
+    """Converts a matrix to its signed-log representation (L, S)."""
+    X = np.array(X, dtype=float)
+    with np.errstate(divide='ignore'):
+        return np.log(np.abs(X)), np.sign(X)
+
+def exp_mat(X):
+    """Converts a signed-log pair (L, S) back to a regular matrix."""
+    L, S = X
+    return S * np.exp(L)
+
+def log_transpose(X):
+    L, S = X
+    return L.T, S.T
+
+def log_identity(n):
+    """Returns the signed-log representation of the n x n identity."""
+    return log_mat(np.eye(n))
+
+def log_add(X, Y):
+    """Returns X + Y, for signed-log pairs X and Y (with broadcasting)."""
+    (L1, S1), (L2, S2) = X, Y
+    M = np.maximum(L1, L2)
+    M_finite = np.where(np.isfinite(M), M, 0)
+    V = S1 * np.exp(L1 - M_finite) + S2 * np.exp(L2 - M_finite)
+    with np.errstate(divide='ignore'):
+        return M_finite + np.log(np.abs(V)), np.sign(V)
+
+def log_multiply(X, Y):
+    """Returns the elementwise product of signed-log pairs X and Y."""
+    (L1, S1), (L2, S2) = X, Y
+    return L1 + L2, S1 * S2
+
+def log_sum_exp(X, axis=None):
+    """Sums the values of a signed-log pair X along an axis."""
+    L, S = X
+    M = np.max(L, axis=axis, keepdims=True)
+    M_finite = np.where(np.isfinite(M), M, 0)
+    V = np.sum(S * np.exp(L - M_finite), axis=axis, keepdims=True)
+    with np.errstate(divide='ignore'):
+        L_sum, S_sum = M_finite + np.log(np.abs(V)), np.sign(V)
+    if axis is None:
+        return L_sum.item(), S_sum.item()
+    return L_sum.squeeze(axis=axis), S_sum.squeeze(axis=axis)
+
+def log_dot(X, Y, block_size=None):
+    """Returns the matrix product of signed-log pairs X and Y.
+
+    Each output entry is a log-sum-exp over the products of a row of X
+    and a column of Y, computed for a block of rows at a time.
+
+    Arguments:
+        block_size - the number of rows of X handled at once (by default,
+                     chosen so that the temporary array has at most
+                     MAX_BLOCK_ELEMENTS elements).
+    """
+    (LX, SX), (LY, SY) = X, Y
+    if LX.shape[1] != LY.shape[0]:
+        raise ValueError("The dimensions of the matrices do not match: "
+                         "(%d,%d) and (%d,%d)" % (LX.shape + LY.shape))
+    n, k = LX.shape
+    m = LY.shape[1]
+    if block_size is None:
+        block_size = max(1, MAX_BLOCK_ELEMENTS // max(1, k * m))
+
+    L = np.empty((n, m))
+    S = np.empty((n, m))
+    for i in xrange(0, n, block_size):
+        rows = slice(i, i + block_size)
+        cube = (LX[rows, :, np.newaxis] + LY[np.newaxis, :, :],
+                SX[rows, :, np.newaxis] * SY[np.newaxis, :, :])
+        L[rows, :], S[rows, :] = log_sum_exp(cube, axis=1)
+    return L, S
+
+def log_lu(X):
+    """LU decomposition with partial pivoting of a signed-log pair.
+
+    Returns:
+        (LU, perm, parity) - LU is a signed-log pair holding the unit lower
+        triangular factor below the diagonal and the upper triangular factor
+        on and above it, perm is the row permutation and parity is the sign
+        of the permutation. If X is singular, returns None instead of LU.
+    """
+    L, S = np.array(X[0], dtype=float), np.array(X[1], dtype=float)
+    n = L.shape[0]
+    if L.shape != (n, n):
+        raise ValueError("X is not a square matrix")
+    perm = np.arange(n)
+    parity = 1
+    for k in xrange(n):
+        p = k + np.argmax(np.where(S[k:, k] != 0, L[k:, k], -np.inf))
+        if S[p, k] == 0:
+            return None, perm, parity
+        if p != k:
+            L[[k, p], :], S[[k, p], :] = L[[p, k], :], S[[p, k], :]
+            perm[[k, p]] = perm[[p, k]]
+            parity = -parity
+
+        # the multipliers, and the update of the trailing submatrix
+        L[k+1:, k] -= L[k, k]
+        S[k+1:, k] *= S[k, k]
+        update = (L[k+1:, k, np.newaxis] + L[np.newaxis, k, k+1:],
+                  -S[k+1:, k, np.newaxis] * S[np.newaxis, k, k+1:])
+        L[k+1:, k+1:], S[k+1:, k+1:] = log_add((L[k+1:, k+1:], S[k+1:, k+1:]),
+                                               update)
+    return (L, S), perm, parity
 
 def log_det(X):
-    if (X.shape[0] != X.shape[1]):
-        raise Exception("X is not a square matrix so its determinant cannot be calculated")
-    
-    if (X.shape[0] == 1):
-        return X[0,0]
-    
-    if (X.shape[0] == 2): # X is a 2x2 matrix
-        return(log_subt_exp(X[0,0]+X[1,1], X[1,0]+X[0,1]))
-    
-    if (X.shape[0] == 3):    
-        s_plus = log_sum_exp([X[0,0]+X[1,1]+X[2,2], X[0,2]+X[1,0]+X[2,1], X[0,1]+X[1,2]+X[2,0]])
-        s_minus = log_sum_exp([X[0,1]+X[1,0]+X[2,2], X[0,2]+X[1,1]+X[2,0], X[0,0]+X[1,2]+X[2,1]])
-        return log_subt_exp(s_plus, s_minus)
-
-    raise Exception("log_det is only implemented for matrices of size < 4")
-
-def log_inv(X): # inverts a 3x3 matrix given by the logscale values
-    if (X.shape[0] != X.shape[1]):
-        raise Exception("X is not a square matrix and cannot be inverted")
-    
-    if (X.shape[0] == 1):
-        return matrix((-X[0,0]))
-    
-    ldet = log_det(X)
-    if (ldet == nan):
-        raise Exception("The determinant of X is 0, cannot calculate the inverse")
-     
-    if (X.shape[0] == 2): # X is a 2x2 matrix
-        I = (-log_det(X)) * ones((2,2))
-        I[0,0] += X[1,1]
-        I[0,1] += X[0,1] + complex(0, pi)
-        I[1,0] += X[1,0] + complex(0, pi)
-        I[1,1] += X[0,0]
-        return I
-    
-    if (X.shape[0] == 3): # X is a 3x3 matrix
-        I = (-log_det(X)) * ones((3,3))
-        I[0,0] += log_subt_exp(X[1,1]+X[2,2], X[1,2]+X[2,1])
-        I[0,1] += log_subt_exp(X[0,2]+X[2,1], X[0,1]+X[2,2])
-        I[0,2] += log_subt_exp(X[0,1]+X[1,2], X[0,2]+X[1,1])
-        I[1,0] += log_subt_exp(X[2,0]+X[1,2], X[1,0]+X[2,2])
-        I[1,1] += log_subt_exp(X[0,0]+X[2,2], X[0,2]+X[2,0])
-        I[1,2] += log_subt_exp(X[0,2]+X[1,0], X[0,0]+X[1,2])
-        I[2,0] += log_subt_exp(X[1,0]+X[2,1], X[2,0]+X[1,1])
-        I[2,1] += log_subt_exp(X[2,0]+X[0,1], X[0,0]+X[2,1])
-        I[2,2] += log_subt_exp(X[0,0]+X[1,1], X[0,1]+X[1,0])
-        return I
-    
-    raise Exception("log_inv is only implemented for matrices of size < 4")
+    """Returns the determinant of a signed-log pair as (log|det|, sign)."""
+    LU, _perm, parity = log_lu(X)
+    if LU is None:
+        return -np.inf, 0.0
+    L, S = LU
+    return np.sum(np.diag(L)), parity * np.prod(np.diag(S))
+
+def log_solve(A, B):
+    """Solves A * X = B for signed-log pairs A (n x n) and B (n x m)."""
+    LU, perm, _parity = log_lu(A)
+    if LU is None:
+        raise np.linalg.LinAlgError("The matrix is singular")
+    L, S = LU
+    n = L.shape[0]
+    YL, YS = np.array(B[0], dtype=float)[perm, :], np.array(B[1], dtype=float)[perm, :]
+
+    # forward substitution with the unit lower triangular factor
+    for i in xrange(1, n):
+        s = log_dot((L[i:i+1, :i], -S[i:i+1, :i]), (YL[:i, :], YS[:i, :]))
+        YL[i, :], YS[i, :] = log_add((YL[i, :], YS[i, :]), (s[0][0], s[1][0]))
+
+    # back substitution with the upper triangular factor
+    for i in xrange(n - 1, -1, -1):
+        if i < n - 1:
+            s = log_dot((L[i:i+1, i+1:], -S[i:i+1, i+1:]),
+                        (YL[i+1:, :], YS[i+1:, :]))
+            YL[i, :], YS[i, :] = log_add((YL[i, :], YS[i, :]),
+                                         (s[0][0], s[1][0]))
+        YL[i, :] -= L[i, i]
+        YS[i, :] *= S[i, i]
+    return YL, YS
+
+def log_inv(X):
+    """Returns the inverse of a square signed-log pair."""
+    return log_solve(X, log_identity(X[0].shape[0]))
+
+def log_regress(X, y):
+    """Least-squares regression in log space.
+
+    Solves (X' * X) * beta = X' * y for any design matrix X (n x p) with
+    full column rank, where X and y are signed-log pairs.
+    """
+    Xt = log_transpose(X)
+    return log_solve(log_dot(Xt, X), log_dot(Xt, y))
+
 
 if (__name__ == '__main__'):
-    X = matrix([[2,1,-5],[3,1,2],[3,4,1]])*10
-    M = log_dot(X.T,X)
-    print M
-    print log_inv(M)
-    print exp(log_dot(M, log_inv(M)))
-    
-    
+    X = log_mat(np.array([[2, 1, -5], [3, 1, 2], [3, 4, 1]]) * 10)
+    M = log_dot(log_transpose(X), X)
+    print exp_mat(M)
+    print exp_mat(log_inv(M))
+    print exp_mat(log_dot(M, log_inv(M)))
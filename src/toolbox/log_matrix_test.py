@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from toolbox import log_matrix
+
+
+class TestLogMatrix(unittest.TestCase):
+    
+    def setUp(self):
+        self.X = np.array([[2., 1., -5.], [3., 1., 2.], [3., 4., 1.]]) * 10
+        self.log_X = log_matrix.log_mat(self.X)
+    
+    def testLogMat(self):
+        L, S = self.log_X
+        self.assertEqual([1, 1, -1], S[0, :].tolist())
+        self.assertAlmostEqual(np.log(50), L[0, 2])
+        np.testing.assert_allclose(self.X, log_matrix.exp_mat(self.log_X))
+    
+    def testLogDot(self):
+        Y = np.array([[1., 0.], [-2., 3.], [0.5, 0.]])
+        for block_size in (None, 1, 2):
+            XY = log_matrix.log_dot(self.log_X, log_matrix.log_mat(Y),
+                                    block_size=block_size)
+            np.testing.assert_allclose(np.dot(self.X, Y),
+                                       log_matrix.exp_mat(XY), atol=1e-12)
+    
+    def testLogDet(self):
+        log_det, sign = log_matrix.log_det(self.log_X)
+        self.assertAlmostEqual(np.linalg.det(self.X), sign * np.exp(log_det))
+        
+        singular = log_matrix.log_mat([[1, 2], [2, 4]])
+        self.assertEqual((-np.inf, 0), log_matrix.log_det(singular))
+        self.assertRaises(np.linalg.LinAlgError, log_matrix.log_inv, singular)
+    
+    def testLogInv(self):
+        for n in xrange(1, 6):
+            X = np.random.RandomState(n).randn(n, n)
+            np.testing.assert_allclose(
+                np.linalg.inv(X), log_matrix.exp_mat(log_matrix.log_inv(log_matrix.log_mat(X))),
+                rtol=1e-8, atol=1e-10)
+    
+    def testLogRegress(self):
+        # the values of X and y are far outside the range of a float
+        rand = np.random.RandomState(0)
+        X = rand.randn(20, 4)
+        beta = np.array([[1.], [-2.], [3.], [0.5]])
+        L_X, S_X = log_matrix.log_mat(X)
+        L_y, S_y = log_matrix.log_mat(np.dot(X, beta))
+        L_b, S_b = log_matrix.log_regress((L_X + 1000, S_X), (L_y + 2000, S_y))
+        np.testing.assert_allclose(beta, log_matrix.exp_mat((L_b - 1000, S_b)))
+
+
+def Suite():
+    return unittest.makeSuite(TestLogMatrix, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
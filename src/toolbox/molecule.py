@@ -405,33 +405,50 @@ class Molecule(object):
             Returns the relative potentials of pseudoisomers,
             relative to the most abundant one at pH 7.
         """
-        from pygibbs.dissociation_constants import DissociationTable
         from toolbox import chemaxon
 
-        diss_table = DissociationTable()
         try:
-            pKa_table, major_ms = chemaxon.GetDissociationConstants(molstring, 
+            result = chemaxon.GetDissociationConstants(molstring, 
                 mid_pH=mid_pH, transform_multiples=transform_multiples)
-
-            mol = Molecule.FromSmiles(major_ms)
-            nH, z = mol.GetHydrogensAndCharge()
-            diss_table.SetMolString(nH, nMg=0, s=major_ms)
-            diss_table.SetCharge(nH, z, nMg=0)
-            
-            pKa_higher = [x for x in pKa_table if mid_pH < x[0] < max_pKa]
-            pKa_lower = [x for x in pKa_table if mid_pH > x[0] > min_pKa]
-            for i, (pKa, _, smiles_above) in enumerate(sorted(pKa_higher)):
-                diss_table.AddpKa(pKa, nH_below=(nH-i), nH_above=(nH-i-1),
-                                  nMg=0, ref='ChemAxon', T=T)
-                diss_table.SetMolString((nH-i-1), nMg=0, s=smiles_above)
-    
-            for i, (pKa, smiles_below, _) in enumerate(sorted(pKa_lower, reverse=True)):
-                diss_table.AddpKa(pKa, nH_below=(nH+i+1), nH_above=(nH+i),
-                                  nMg=0, ref='ChemAxon', T=T)
-                diss_table.SetMolString((nH+i+1), nMg=0, s=smiles_below)
         except chemaxon.ChemAxonError:
+            result = None
+        return Molecule._DissociationTableFromPkas(molstring, fmt, result,
+            mid_pH, min_pKa, max_pKa, T)
+
+    @staticmethod
+    def _DissociationTableFromPkas(molstring, fmt, result, mid_pH=default_pH,
+                                   min_pKa=0, max_pKa=14, T=default_T):
+        """
+            Builds the dissociation table from the ChemAxon result,
+            a pair (pKa table, major pseudoisomer SMILES) as returned by
+            chemaxon.GetDissociationConstants, or None if ChemAxon failed
+            (and then the molecule itself is the only pseudoisomer).
+        """
+        from pygibbs.dissociation_constants import DissociationTable
+
+        diss_table = DissociationTable()
+        if result is None:
             mol = Molecule._FromFormat(molstring, fmt)
             diss_table.SetOnlyPseudoisomerMolecule(mol)
+            return diss_table
+
+        pKa_table, major_ms = result
+        mol = Molecule.FromSmiles(major_ms)
+        nH, z = mol.GetHydrogensAndCharge()
+        diss_table.SetMolString(nH, nMg=0, s=major_ms)
+        diss_table.SetCharge(nH, z, nMg=0)
+        
+        pKa_higher = [x for x in pKa_table if mid_pH < x[0] < max_pKa]
+        pKa_lower = [x for x in pKa_table if mid_pH > x[0] > min_pKa]
+        for i, (pKa, _, smiles_above) in enumerate(sorted(pKa_higher)):
+            diss_table.AddpKa(pKa, nH_below=(nH-i), nH_above=(nH-i-1),
+                              nMg=0, ref='ChemAxon', T=T)
+            diss_table.SetMolString((nH-i-1), nMg=0, s=smiles_above)
+
+        for i, (pKa, smiles_below, _) in enumerate(sorted(pKa_lower, reverse=True)):
+            diss_table.AddpKa(pKa, nH_below=(nH+i+1), nH_above=(nH+i),
+                              nMg=0, ref='ChemAxon', T=T)
+            diss_table.SetMolString((nH+i+1), nMg=0, s=smiles_below)
             
         return diss_table
 
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+
+import json
+import logging
+import itertools
+import multiprocessing
+
+from toolbox import chemaxon
+
+
+class PkaCache(object):
+    """A persistent cache of ChemAxon dissociation constants.
+
+    The results are stored in a database table, keyed by the molecule string
+    (which should be canonical, e.g. a KEGG InChI or a canonical SMILES)
+    together with the settings used to calculate them. Molecules that
+    ChemAxon failed on are cached too, so they are not tried again.
+    """
+
+    def __init__(self, db, table_name='pka_cache'):
+        self.db = db
+        self.table_name = table_name
+        self.db.CreateTable(self.table_name, """
+            molstring TEXT, settings TEXT, diss_constants TEXT,
+            major_ms TEXT""", drop_if_exists=False)
+        self.db.CreateIndex(self.table_name + '_idx', self.table_name,
+                            'molstring, settings', unique=True,
+                            drop_if_exists=False)
+
+    def Get(self, molstrings, settings, chunk_size=500):
+        """Returns a dictionary from molstring to the cached result, for all
+           the molstrings that are in the cache (see PkaPipeline.Run)."""
+        results = {}
+        molstrings = list(molstrings)
+        for i in xrange(0, len(molstrings), chunk_size):
+            chunk = molstrings[i:i+chunk_size]
+            query = ("SELECT molstring, diss_constants, major_ms FROM %s "
+                     "WHERE settings=? AND molstring IN (%s)" %
+                     (self.table_name, ','.join(['?'] * len(chunk))))
+            for molstring, diss_constants, major_ms in \
+                    self.db.Execute(query, [settings] + chunk):
+                if diss_constants is None:
+                    results[molstring] = None
+                else:
+                    diss_constants = [tuple(x) for x in json.loads(diss_constants)]
+                    results[molstring] = (diss_constants, major_ms)
+        return results
+
+    def Put(self, results, settings):
+        """Writes many results and commits them together.
+
+        Args:
+            results: a list of (molstring, result) pairs.
+            settings: the settings string the results were calculated with.
+        """
+        for molstring, result in results:
+            if result is None:
+                row = [molstring, settings, None, None]
+            else:
+                diss_constants, major_ms = result
+                row = [molstring, settings, json.dumps(diss_constants), major_ms]
+            self.db.Execute("INSERT OR REPLACE INTO %s VALUES(?,?,?,?)" %
+                            self.table_name, row)
+        self.db.Commit()
+
+
+def _RunBatch(args):
+    """Calculates the dissociation constants of one batch of molecules.
+
+    If cxcalc fails on the batch as a whole, every molecule is tried on its
+    own so that a single bad molecule does not fail the others.
+    """
+    molstrings, kwargs = args
+    try:
+        return zip(molstrings,
+                   chemaxon.GetBatchDissociationConstants(molstrings, **kwargs))
+    except chemaxon.ChemAxonError:
+        if len(molstrings) == 1:
+            return [(molstrings[0], None)]
+    return sum([_RunBatch(([molstring], kwargs)) for molstring in molstrings], [])
+
+
+class PkaPipeline(object):
+    """Calculates the dissociation constants of many molecules.
+
+    The molecules are sent to cxcalc in batches, several batches are run in
+    parallel by a process pool, and the main process is the only one that
+    writes to the cache (one commit per finished batch).
+    """
+
+    def __init__(self, cache=None, n_processes=1, batch_size=50,
+                 n_acidic=10, n_basic=10, mid_pH=7,
+                 transform_multiples=False, cxcalc_bin=None):
+        """
+            Arguments:
+                cache       - a PkaCache (or None for no caching)
+                n_processes - the number of cxcalc runs in parallel
+                              (None for the number of CPUs)
+                batch_size  - the number of molecules in each cxcalc run
+                cxcalc_bin  - the cxcalc executable (default: chemaxon.CXCALC_BIN)
+
+            The other arguments are passed to chemaxon.GetDissociationConstants.
+        """
+        self.cache = cache
+        self.n_processes = n_processes
+        self.batch_size = batch_size
+        self.kwargs = {'n_acidic': n_acidic, 'n_basic': n_basic,
+                       'mid_pH': mid_pH,
+                       'transform_multiples': transform_multiples,
+                       'cxcalc_bin': cxcalc_bin}
+        self.settings = 'a=%d;b=%d;pH=%g;transform=%d' % \
+            (n_acidic, n_basic, mid_pH, transform_multiples)
+
+    def IterResults(self, molstrings):
+        """Calculates the dissociation constants of a list of molecules.
+
+        Yields:
+            Lists of (molstring, result) pairs: first all the cached results,
+            then the results of each batch as soon as it is done. A result is
+            a pair (diss_constants, major_ms) as returned by
+            chemaxon.GetDissociationConstants, or None if ChemAxon failed.
+        """
+        molstrings = sorted(set(molstrings))
+        if self.cache is not None:
+            cached = self.cache.Get(molstrings, self.settings)
+            logging.info("%d out of %d molecules are cached" %
+                         (len(cached), len(molstrings)))
+            if cached:
+                yield sorted(cached.iteritems())
+            molstrings = [m for m in molstrings if m not in cached]
+
+        batches = [(molstrings[i:i+self.batch_size], self.kwargs)
+                   for i in xrange(0, len(molstrings), self.batch_size)]
+        if not batches:
+            return
+
+        if self.n_processes == 1:
+            pool = None
+            batch_results = itertools.imap(_RunBatch, batches)
+        else:
+            pool = multiprocessing.Pool(self.n_processes)
+            batch_results = pool.imap_unordered(_RunBatch, batches)
+
+        try:
+            for i, results in enumerate(batch_results):
+                logging.info("Completed batch %d out of %d" % (i+1, len(batches)))
+                if self.cache is not None:
+                    self.cache.Put(results, self.settings)
+                yield results
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def Run(self, molstrings):
+        """Returns a dictionary from molstring to result (see IterResults)."""
+        results = {}
+        for batch in self.IterResults(molstrings):
+            results.update(batch)
+        return results
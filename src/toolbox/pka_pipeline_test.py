@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from toolbox import chemaxon
+from toolbox.database import SqliteDatabase
+from toolbox.pka_pipeline import PkaCache, PkaPipeline
+
+
+# A stand-in for cxcalc, which gives every molecule an acidic pKa of 4.5
+# and a basic pKa of 9.5 (and itself as the major pseudoisomer), fails on
+# molecules containing an 'X', and logs one line for every run.
+STUB_CXCALC = """#!%(python)s
+import sys
+args = sys.argv[1:]
+n_acidic = int(args[args.index('-a') + 1])
+n_basic = int(args[args.index('-b') + 1])
+n_pH = args.count('majorms')
+open(%(log)r, 'a').write('run\\n')
+if args[-1].endswith('.txt'):
+    molstrings = [l.strip() for l in open(args[-1])]
+else:
+    molstrings = [args[-1]]
+print 'id\\theader'
+for i, molstring in enumerate(molstrings):
+    if 'X' in molstring:
+        continue
+    fields = ['4.5'] + [''] * (n_acidic - 1) + ['9.5'] + [''] * (n_basic - 1)
+    fields += ['1,2'] + [molstring] * n_pH
+    print '\\t'.join([str(i + 1)] + fields)
+"""
+
+
+class TestPkaPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log_fname = os.path.join(self.tmpdir, 'cxcalc.log')
+        self.cxcalc_bin = os.path.join(self.tmpdir, 'cxcalc')
+        open(self.cxcalc_bin, 'w').write(
+            STUB_CXCALC % {'python': sys.executable, 'log': self.log_fname})
+        os.chmod(self.cxcalc_bin, 0755)
+        self.db = SqliteDatabase(os.path.join(self.tmpdir, 'cache.sqlite'))
+        self.molstrings = ['CC', 'CCO', 'CCN', 'OCCO', 'NCCN']
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _NumRuns(self):
+        if not os.path.exists(self.log_fname):
+            return 0
+        return len(open(self.log_fname).readlines())
+
+    def testBatchMatchesSingle(self):
+        old_cxcalc_bin = chemaxon.CXCALC_BIN
+        chemaxon.CXCALC_BIN = self.cxcalc_bin
+        try:
+            single = [chemaxon.GetDissociationConstants(m)
+                      for m in self.molstrings]
+        finally:
+            chemaxon.CXCALC_BIN = old_cxcalc_bin
+        batch = chemaxon.GetBatchDissociationConstants(
+            self.molstrings, cxcalc_bin=self.cxcalc_bin)
+        self.assertEqual(single, batch)
+        self.assertEqual(([(4.5, None, 'CC'), (9.5, 'CC', None)], 'CC'),
+                         batch[0])
+        self.assertEqual(len(self.molstrings) + 1, self._NumRuns())
+
+    def testCache(self):
+        pipeline = PkaPipeline(cache=PkaCache(self.db), batch_size=2,
+                               cxcalc_bin=self.cxcalc_bin)
+        results = pipeline.Run(self.molstrings + ['CXC'])
+        self.assertEqual(set(self.molstrings + ['CXC']), set(results))
+        self.assertEqual(None, results['CXC'])
+        # one run per batch, and the failures are cached too
+        self.assertEqual(3, self._NumRuns())
+
+        cached = PkaPipeline(cache=PkaCache(self.db), batch_size=2,
+                             cxcalc_bin=self.cxcalc_bin)
+        self.assertEqual(results, cached.Run(self.molstrings + ['CXC']))
+        self.assertEqual(3, self._NumRuns())
+
+        other_pH = PkaPipeline(cache=PkaCache(self.db), batch_size=10,
+                               mid_pH=3, cxcalc_bin=self.cxcalc_bin)
+        self.assertEqual(([(4.5, 'CC', None), (9.5, None, None)], 'CC'),
+                         other_pH.Run(['CC'])['CC'])
+        self.assertEqual(4, self._NumRuns())
+
+    def testPool(self):
+        pipeline = PkaPipeline(n_processes=2, batch_size=2,
+                               cxcalc_bin=self.cxcalc_bin)
+        serial = PkaPipeline(n_processes=1, batch_size=2,
+                             cxcalc_bin=self.cxcalc_bin)
+        self.assertEqual(serial.Run(self.molstrings),
+                         pipeline.Run(self.molstrings))
+
+
+def Suite():
+    return unittest.makeSuite(TestPkaPipeline, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
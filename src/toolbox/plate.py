@@ -2,6 +2,8 @@
 
 import numpy
 
+from toolbox import smoothing
+
 
 class TimedMeasurement(object):
     """Measurement with an associated time."""
@@ -74,6 +76,29 @@ class Plate96(object):
         readings = numpy.array(readings)
         times = numpy.array(times)
         return times, readings, numpy.array(labels)
+
+    def SmoothReading(self, reading_label, sigma=None, window_size=None):
+        """Smooths the readings of all the wells at once.
+        
+        Args:
+            reading_label: the reading to smooth.
+            sigma: if given, the width of a Gaussian kernel in time units
+                (which handles irregular and per-well reading times).
+            window_size: otherwise, the (odd) number of readings in a
+                moving average window.
+        
+        Returns:
+            A 3-tuple (times, smoothed readings, labels), like SelectReading.
+        """
+        if reading_label not in self.reading_labels:
+            return []
+        
+        times, readings, labels = self.SelectReading(reading_label)
+        if sigma is not None:
+            smoothed = smoothing.GaussianSmooth(times, readings, sigma=sigma)
+        else:
+            smoothed = smoothing.MovingAverage(readings, window_size or 3)
+        return times, smoothed, labels
     
     
     
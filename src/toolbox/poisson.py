@@ -1,26 +1,67 @@
 import pylab
-import random
+import numpy as np
+from scipy.special import gammaln
+
+
+def SimulateOccupancy(n_buckets, n_balls, n_iterations=1000, k=1):
+    """Simulates dropping balls uniformly into buckets.
+
+    All the iterations are drawn at once, as one multinomial sample of the
+    bucket counts per iteration.
+
+    Returns:
+        A 1d array with the number of buckets holding exactly k balls
+        in each iteration.
+    """
+    pvals = np.ones(n_buckets) / n_buckets
+    buckets = np.random.multinomial(n_balls, pvals, size=n_iterations)
+    return (buckets == k).sum(axis=1)
 
 def Simulate(n_buckets, n_balls, n_iterations=1000):
-    result_list = []
-    for _ in xrange(n_iterations):
-        buckets = pylab.zeros((n_buckets))
-        for _ in xrange(n_balls):
-            k = int(random.random() * n_buckets)
-            buckets[k] += 1
-        n_single = len(pylab.find(buckets == 1))
-        result_list.append(n_single)
-        
-    return pylab.mean(result_list)
+    """Returns the simulated mean number of singly-occupied buckets."""
+    return pylab.mean(SimulateOccupancy(n_buckets, n_balls, n_iterations))
+
+def _LogProbOccupancy(n_buckets, n_balls, ks):
+    """The log-probability that each bucket in a given set of len(ks)
+    buckets holds exactly ks[i] balls."""
+    n_balls = np.asarray(n_balls, dtype=float)
+    rest = n_balls - sum(ks)
+    log_p = (gammaln(n_balls + 1) - gammaln(rest + 1)
+             - sum(gammaln(k + 1) for k in ks)
+             - sum(ks) * np.log(n_buckets))
+    if n_buckets > len(ks):
+        log_p += rest * np.log1p(-float(len(ks)) / n_buckets)
+    else:
+        log_p = np.where(rest == 0, log_p, -np.inf)
+    return np.where(rest >= 0, log_p, -np.inf)
+
+def ExpectedOccupancy(n_buckets, n_balls, k=1):
+    """The expected number of buckets holding exactly k balls.
+
+    Args:
+        n_buckets: the number of buckets.
+        n_balls: the number of balls (a number or an array).
+        k: the occupancy to count (1 for singly-occupied buckets).
+    """
+    return n_buckets * np.exp(_LogProbOccupancy(n_buckets, n_balls, [k]))
+
+def OccupancyVariance(n_buckets, n_balls, k=1):
+    """The variance of the number of buckets holding exactly k balls."""
+    mean = ExpectedOccupancy(n_buckets, n_balls, k)
+    if n_buckets == 1:
+        return mean - mean ** 2
+    pairs = n_buckets * (n_buckets - 1) * np.exp(
+        _LogProbOccupancy(n_buckets, n_balls, [k, k]))
+    return np.maximum(mean + pairs - mean ** 2, 0)
 
 def MultiSimulate(n_buckets, n_iterations=1000):
-    averages = pylab.zeros((2*n_buckets))
-    for n_balls in xrange(len(averages)):
-        averages[n_balls] = Simulate(n_buckets, n_balls, n_iterations)
-    pylab.plot(range(len(averages)), averages)
-    pylab.show() 
-    
+    n_balls = np.arange(2 * n_buckets)
+    averages = np.array([Simulate(n_buckets, n, n_iterations) for n in n_balls])
+    expected = ExpectedOccupancy(n_buckets, n_balls)
+    pylab.plot(n_balls, averages, label='simulated')
+    pylab.plot(n_balls, expected, label='expected')
+    pylab.legend()
+    pylab.show()
+
 if __name__ == "__main__":
     MultiSimulate(49, 1000)
-        
-        
\ No newline at end of file
@@ -0,0 +1,39 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from toolbox import poisson
+
+
+class TestOccupancy(unittest.TestCase):
+    
+    def testSmallCases(self):
+        # 2 balls in 2 buckets: 1 of 2 ways leaves both singly-occupied
+        self.assertAlmostEqual(1.0, poisson.ExpectedOccupancy(2, 2))
+        self.assertAlmostEqual(1.0, poisson.OccupancyVariance(2, 2))
+        self.assertAlmostEqual(0.5, poisson.ExpectedOccupancy(2, 2, k=2))
+        self.assertEqual(0, poisson.ExpectedOccupancy(3, 1, k=2))
+        
+    def testAgainstSimulation(self):
+        np.random.seed(0)
+        for n_buckets, n_balls in [(10, 5), (49, 49), (96, 200)]:
+            counts = poisson.SimulateOccupancy(n_buckets, n_balls, 20000)
+            mean = poisson.ExpectedOccupancy(n_buckets, n_balls)
+            var = poisson.OccupancyVariance(n_buckets, n_balls)
+            self.assertTrue(abs(counts.mean() - mean) < 0.02 * mean)
+            self.assertTrue(abs(counts.var() - var) < 0.05 * var)
+    
+    def testLargeN(self):
+        n_buckets = 10 ** 7
+        expected = poisson.ExpectedOccupancy(n_buckets, [0, n_buckets])
+        self.assertEqual(0, expected[0])
+        self.assertAlmostEqual(np.exp(-1), expected[1] / n_buckets, 6)
+
+
+def Suite():
+    return unittest.makeSuite(TestOccupancy, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@ import pylab
 import numpy
 from scipy import stats
 
+from toolbox import smoothing
+
 
 
 def ZeroMatRows(mat):
@@ -161,14 +163,7 @@ class ReporterActivityCalculator(object):
 
     def _MovingAverage(self, array_like):
         """Calculates the activities from levels."""
-        side_size = (self.window_size - 1) / 2
-        
-        N = len(array_like)
-        averaged = numpy.zeros(N)
-        for i in xrange(side_size, N - side_size):
-            averaged[i] = numpy.mean(array_like[i-side_size:i+side_size+1])
-    
-        return averaged
+        return smoothing.MovingAverage(array_like, self.window_size, fill=0)
     
     def SmoothAllActivities(self, activities):
         """Smooths all activities.
@@ -179,12 +174,7 @@ class ReporterActivityCalculator(object):
         Returns:
             smoothed activities matrix
         """
-        Nr, Nc = activities.shape
-        smooth_activities = numpy.zeros((Nr, Nc))
-        for i in xrange(Nr):
-            ac = activities[i,:]
-            smooth_activities[i, :] = self._MovingAverage(ac)
-        return smooth_activities
+        return self._MovingAverage(activities)
     
     def CalculateAllMaxActivities(self, culture_levels, activities):
         """Calculates the maximal activities for all conditions.
@@ -1,11 +1,11 @@
-from Bio import Entrez, SeqIO
+#!/usr/bin/python
+
 import sys
+import numpy as np
+from Bio import SeqIO
+
+from toolbox.ambiguous_seq import AmbigousDNASeq
 
-Entrez.email = 'elad.noor@weizmann.ac.il'
-handle = Entrez.efetch(db="nucleotide", rettype="fasta", id="48994873")
-seq_record = SeqIO.read(handle, "fasta")
-handle.close()
-print "%s with %d nucleotides" % (seq_record.id, len(seq_record.seq))
 
 restriction_enzymes = {'EcoRI':['GAATTC'],\
                        'EcoRII':['CCAGG','CCTGG'],\
@@ -31,8 +31,196 @@ restriction_enzymes = {'EcoRI':['GAATTC'],\
                        'StuI':['AGGCCT'],\
                        'SbaI':['TCTAGA']}
 
-sys.stdout.write("%8s | %8s | %5s | %5s\n" % ("NAME", "RS", "SITES", "Average Length"))
-for (name, recognition_sites) in restriction_enzymes.iteritems():
-    for rs in recognition_sites:
-        num_fragments = seq_record.seq.count(rs)
-        sys.stdout.write("%8s | %8s | %5d | %5d\n" % (name, rs, num_fragments, len(seq_record.seq)/num_fragments))
\ No newline at end of file
+IUPAC_COMPLEMENT = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A',
+                    'R': 'Y', 'Y': 'R', 'K': 'M', 'M': 'K',
+                    'S': 'S', 'W': 'W', 'B': 'V', 'V': 'B',
+                    'D': 'H', 'H': 'D', 'N': 'N'}
+
+BASES = 'ACGT'
+
+IUPAC_BASES = dict((base, (base,)) for base in BASES)
+IUPAC_BASES.update(AmbigousDNASeq.AMBIGUOUS_BASE_MAP)
+
+# the index in BASES of every (upper or lower case) byte, 4 for other bytes
+_BASE_CODES = np.empty(256, dtype=np.uint8)
+_BASE_CODES.fill(len(BASES))
+for _code, _base in enumerate(BASES):
+    _BASE_CODES[ord(_base)] = _BASE_CODES[ord(_base.lower())] = _code
+
+
+def ReverseComplement(site):
+    """Returns the reverse complement of an IUPAC (ambiguous) DNA site."""
+    return ''.join(IUPAC_COMPLEMENT[b] for b in reversed(site.upper()))
+
+
+class RestrictionScanner(object):
+    """Finds the recognition sites of many enzymes in a sequence.
+
+    The sequence is encoded once as a NumPy array, and the positions of its
+    k-mers are sorted into buckets. Every site then only checks the
+    positions in the buckets of its most specific k bases, one base at a
+    time, so the cost of each enzyme grows with the number of candidate
+    positions rather than with the length of the sequence. Degenerate bases
+    are bit masks over A, C, G and T, so no site needs to be expanded beyond
+    those k bases. Sites shorter than k are checked at every position.
+    """
+
+    KMER_LENGTH = 4
+
+    def __init__(self, enzymes=restriction_enzymes):
+        """Initialize the scanner.
+
+        Args:
+            enzymes: a dictionary from enzyme name to a list of IUPAC
+                recognition sites.
+        """
+        self.enzymes = sorted(enzymes.keys())
+        self.k = self.KMER_LENGTH
+
+        # (enzyme index, base masks, k-mer offset, k-mer codes, the other
+        # positions in the order they are checked)
+        self._sites = []
+        for e, name in enumerate(self.enzymes):
+            for site in enzymes[name]:
+                for strand_site in sorted(set([site.upper(),
+                                               ReverseComplement(site)])):
+                    self._sites.append(self._CompileSite(e, strand_site))
+        self.max_site_length = max([len(site[1]) for site in self._sites] or [1])
+
+    def _CompileSite(self, e, site):
+        """Returns the entry of one site (on one strand) in self._sites."""
+        masks = np.array([sum(1 << BASES.index(concrete)
+                              for concrete in IUPAC_BASES[base])
+                          for base in site], dtype=np.uint8)
+        if len(masks) < self.k:
+            return (e, masks, 0, None, range(len(masks)))
+
+        windows = [self._KmerCodes(masks[i:i + self.k])
+                   for i in xrange(len(masks) - self.k + 1)]
+        offset = min(xrange(len(windows)), key=lambda i: len(windows[i]))
+        checks = [j for j in xrange(len(masks))
+                  if not offset <= j < offset + self.k]
+        # the least ambiguous bases first, to drop most candidates early
+        checks.sort(key=lambda j: bin(masks[j]).count('1'))
+        return (e, masks, offset, windows[offset], checks)
+
+    @staticmethod
+    def _KmerCodes(masks):
+        """Returns the codes of all the k-mers matching the base masks."""
+        kmers = np.zeros(1, dtype=np.int64)
+        for mask in masks:
+            allowed = [c for c in xrange(len(BASES)) if (mask >> c) & 1]
+            kmers = (kmers[:, np.newaxis] * 4 + allowed).ravel()
+        return kmers
+
+    @staticmethod
+    def FromBiopython(enzyme_names=None):
+        """Create a scanner for enzymes from the Bio.Restriction tables.
+
+        Args:
+            enzyme_names: a list of enzyme names (default: all enzymes with
+                a plain IUPAC site).
+        """
+        from Bio import Restriction
+        if enzyme_names is None:
+            enzyme_list = [enz for enz in Restriction.AllEnzymes
+                           if enz.site and set(enz.site) <= set(IUPAC_BASES)]
+        else:
+            enzyme_list = [getattr(Restriction, name) for name in enzyme_names]
+        return RestrictionScanner(dict((str(enz), [enz.site])
+                                       for enz in enzyme_list))
+
+    def Scan(self, seq, circular=False):
+        """Finds all the recognition sites in a sequence.
+
+        Args:
+            seq: a DNA sequence (a string or a Bio.Seq.Seq). Bases other
+                than A, C, G and T never match.
+            circular: True for circular sequences (e.g. plasmids), to also
+                find the sites that span the origin.
+
+        Returns:
+            A dictionary from enzyme name to a sorted array of the 0-based
+            start positions of its sites (a palindromic site is reported
+            once).
+        """
+        seq = str(seq)
+        n = len(seq)
+        if circular:
+            seq += seq[:self.max_site_length - 1]
+        codes = _BASE_CODES[np.array(bytearray(seq), dtype=np.uint8)]
+
+        # the code of the k-mer starting at every position, with all the
+        # k-mers that have other bases in a bucket of their own
+        n_kmers = max(len(codes) - self.k + 1, 0)
+        kmers = np.zeros(n_kmers, dtype=np.int64)
+        valid = np.ones(n_kmers, dtype=bool)
+        for j in xrange(self.k):
+            base_codes = codes[j:j + n_kmers]
+            kmers = kmers * 4 + (base_codes & 3)
+            valid &= base_codes < 4
+        kmers[~valid] = 4 ** self.k
+        order = np.argsort(kmers)
+        bounds = np.hstack([0, np.cumsum(np.bincount(kmers,
+                                                     minlength=4 ** self.k + 1))])
+
+        hits = [[np.zeros(0, dtype=int)] for _ in self.enzymes]
+        for e, masks, offset, kmer_codes, checks in self._sites:
+            last = len(codes) - len(masks)
+            if kmer_codes is None:
+                pos = np.arange(max(last + 1, 0))
+            else:
+                pos = np.hstack([order[bounds[x]:bounds[x + 1]]
+                                 for x in kmer_codes]) - offset
+                pos = pos[(pos >= 0) & (pos <= last)]
+            for j in checks:
+                pos = pos[(masks[j] >> codes[pos + j]) & 1 == 1]
+            hits[e].append(pos[pos < n])
+
+        return dict((name, np.unique(np.hstack(hits[e])))
+                    for e, name in enumerate(self.enzymes))
+
+    @staticmethod
+    def FragmentLengths(positions, seq_length, circular=False):
+        """Returns the lengths of the fragments of a digest.
+
+        The sequence is assumed to be cut at the start of every site.
+
+        Args:
+            positions: the sorted site positions of one enzyme.
+            seq_length: the length of the sequence.
+            circular: True for circular sequences (e.g. plasmids).
+        """
+        positions = np.asarray(positions, dtype=int)
+        if len(positions) == 0:
+            return np.array([seq_length])
+        if circular:
+            return np.diff(np.hstack([positions, positions[0] + seq_length]))
+        return np.diff(np.hstack([0, positions, seq_length]))
+
+    def Digest(self, seq, circular=False):
+        """Returns a dictionary from enzyme name to (site positions,
+           fragment lengths)."""
+        result = {}
+        for name, positions in self.Scan(seq, circular).iteritems():
+            result[name] = (positions,
+                            self.FragmentLengths(positions, len(seq), circular))
+        return result
+
+    def DigestFasta(self, fasta_filename, circular=False):
+        """Digests every record of a FASTA file with all the enzymes.
+
+        Returns:
+            A dictionary from record ID to the result of Digest.
+        """
+        return dict((record.id, self.Digest(record.seq, circular))
+                    for record in SeqIO.parse(open(fasta_filename), 'fasta'))
+
+
+if __name__ == "__main__":
+    scanner = RestrictionScanner()
+    for record in SeqIO.parse(open(sys.argv[1]), 'fasta'):
+        print "%s with %d nucleotides" % (record.id, len(record.seq))
+        sys.stdout.write("%8s | %5s | %5s\n" % ("NAME", "SITES", "Average Length"))
+        for name, (positions, fragments) in sorted(scanner.Digest(record.seq).iteritems()):
+            sys.stdout.write("%8s | %5d | %5d\n" % (name, len(positions), np.mean(fragments)))
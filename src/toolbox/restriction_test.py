@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+import re
+import unittest
+import numpy as np
+
+from toolbox import restriction
+
+
+class TestRestrictionScanner(unittest.TestCase):
+    
+    def setUp(self):
+        self.scanner = restriction.RestrictionScanner(
+            {'EcoRI': ['GAATTC'], 'HinfI': ['GANTC'], 'HgaI': ['GACGC']})
+    
+    def testReverseComplement(self):
+        self.assertEqual('GAATTC', restriction.ReverseComplement('GAATTC'))
+        self.assertEqual('GCGTC', restriction.ReverseComplement('gacgc'))
+        self.assertEqual('GGNRTA', restriction.ReverseComplement('TAYNCC'))
+    
+    def testScan(self):
+        #      0         1         2         3
+        #      0123456789012345678901234567890123
+        seq = 'GAATTCAAGACTCAAGCGTCNNGACGCgaattc'
+        sites = self.scanner.Scan(seq)
+        self.assertEqual([0, 27], list(sites['EcoRI']))
+        self.assertEqual([8], list(sites['HinfI']))
+        self.assertEqual([15, 22], list(sites['HgaI']))
+    
+    def testScanBruteForce(self):
+        rand = np.random.RandomState(0)
+        seq = ''.join(rand.choice(list('ACGTacgtN'), size=2000))
+        sites = self.scanner.Scan(seq)
+        for name, site in [('EcoRI', 'GAATTC'), ('HinfI', 'GA[ACGT]TC'),
+                           ('HgaI', 'GACGC|GCGTC')]:
+            expected = [m.start() for m in
+                        re.finditer('(?=%s)' % site, seq.upper())]
+            self.assertEqual(expected, list(sites[name]))
+    
+    def testCircular(self):
+        #      0         1
+        #      01234567890123
+        seq = 'TTCAAAGACGCAGAA'
+        self.assertEqual([], list(self.scanner.Scan(seq)['EcoRI']))
+        sites = self.scanner.Scan(seq, circular=True)
+        self.assertEqual([12], list(sites['EcoRI']))
+        self.assertEqual([6], list(sites['HgaI']))
+        _, fragments = self.scanner.Digest(seq, circular=True)['EcoRI']
+        self.assertEqual([15], list(fragments))
+    
+    def testDigest(self):
+        seq = 'AAGAATTCAAAGAATTC'
+        positions, fragments = self.scanner.Digest(seq)['EcoRI']
+        self.assertEqual([2, 11], list(positions))
+        self.assertEqual([2, 9, 6], list(fragments))
+        _, fragments = self.scanner.Digest(seq, circular=True)['EcoRI']
+        self.assertEqual([9, 8], list(fragments))
+        _, fragments = self.scanner.Digest(seq)['HgaI']
+        self.assertEqual([17], list(fragments))
+
+
+def Suite():
+    return unittest.makeSuite(TestRestrictionScanner, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,22 @@ import logging
 import unittest
 
 from toolbox import ambiguous_seq_test
+from toolbox import log_matrix_test
+from toolbox import pka_pipeline_test
+from toolbox import poisson_test
 from toolbox import random_seq_test
+from toolbox import restriction_test
+from toolbox import smoothing_test
 
 
 def main():
     test_modules = (ambiguous_seq_test,
-                    random_seq_test)
+                    log_matrix_test,
+                    pka_pipeline_test,
+                    poisson_test,
+                    random_seq_test,
+                    restriction_test,
+                    smoothing_test)
     
     modules_str = ', '.join(m.__name__ for m in test_modules)
     print 'Running test suites from modules %s' % modules_str
@@ -3,22 +3,121 @@ from scipy import linalg
 import numpy as np
 
 
+def MovingAverage(values, window_size=3, fill=None):
+    """Calculates the moving average along the last axis.
+
+    Uses cumulative sums, so every row of a matrix (e.g. every well of a
+    plate) is averaged in one pass regardless of the window size.
+
+    Args:
+        values: a 1d array, or a 2d array with one series per row.
+        window_size: the size of the window to average over.
+            Must be an odd number.
+        fill: the value of the points too close to the edges to have a full
+            window. If None, they keep their original values.
+
+    Returns:
+        An array of the same shape with the averaged points.
+    """
+    assert (window_size % 2) == 1
+    side_size = (window_size - 1) / 2
+
+    values = np.asarray(values)
+    if fill is None:
+        averaged = values.copy()
+    else:
+        averaged = np.empty(values.shape)
+        averaged.fill(fill)
+
+    N = values.shape[-1]
+    if N < window_size:
+        return averaged
+
+    cumsum = np.zeros(values.shape[:-1] + (N + 1,))
+    np.cumsum(values, axis=-1, out=cumsum[..., 1:])
+    window_sums = cumsum[..., window_size:] - cumsum[..., :-window_size]
+    averaged[..., side_size:N-side_size] = window_sums / float(window_size)
+    return averaged
+
+
+def GaussianSmooth(xs, ys, x_out=None, sigma=1.0, truncate=4.0):
+    """Smooths samples with a truncated Gaussian kernel.
+
+    The samples may be on an irregular grid. Only samples within
+    truncate * sigma of each output point are used, and they are found by
+    binary search on the sorted xs, so the cost grows with the number of
+    samples in a window rather than with the total number of samples.
+
+    Args:
+        xs: the sorted sample positions, a 1d array shared by all series or
+            a 2d array with one row per series (e.g. per-well times).
+        ys: the sample values, a 1d array or a 2d array with one series per
+            row.
+        x_out: the points at which to evaluate the smoothed series, a 1d
+            array shared by all series. The default is xs.
+        sigma: the width of the Gaussian kernel.
+        truncate: the kernel is cut off at this many sigmas. If None, all
+            samples are used.
+
+    Returns:
+        An array with one smoothed series per row of ys (1d if ys is 1d).
+        Points with no samples within the window are NaN.
+    """
+    ys = np.asarray(ys, dtype=float)
+    Y = np.atleast_2d(ys)
+    n_series, n = Y.shape
+    X = np.array(np.broadcast_to(np.asarray(xs, dtype=float), Y.shape))
+    if x_out is None:
+        Q = X
+    else:
+        x_out = np.asarray(x_out, dtype=float)
+        Q = np.array(np.broadcast_to(x_out, (n_series, x_out.size)))
+
+    if truncate is None:
+        # the window of every output point is its whole series
+        lo = np.repeat(n * np.arange(n_series).reshape(n_series, 1),
+                       Q.shape[1], axis=1)
+        hi = lo + n
+    else:
+        radius = truncate * sigma
+        x_min = min(X.min(), Q.min())
+        x_max = max(X.max(), Q.max())
+
+        # shift every series to its own range, so that a single binary
+        # search over the flattened samples finds the windows of all of them.
+        step = (x_max - x_min) + 2 * radius + 1.0
+        offsets = step * np.arange(n_series).reshape(n_series, 1)
+        flat_X = (X + offsets).ravel()
+        lo = np.searchsorted(flat_X, Q + offsets - radius, side='left')
+        hi = np.searchsorted(flat_X, Q + offsets + radius, side='right')
+
+    width = max(1, (hi - lo).max())
+    idx = lo[..., np.newaxis] + np.arange(width)
+    in_window = idx < hi[..., np.newaxis]
+    idx = np.minimum(idx, Y.size - 1)
+
+    diffs = X.ravel()[idx] - Q[..., np.newaxis]
+    weights = np.exp(-diffs ** 2 / (2 * sigma ** 2)) * in_window
+    with np.errstate(invalid='ignore'):
+        smoothed = (weights * Y.ravel()[idx]).sum(-1) / weights.sum(-1)
+
+    if ys.ndim == 1:
+        return smoothed[0]
+    return smoothed
 
 
 class WeightedAverageSmoother(object):
-    
-    def __init__(self, xs, ys, sigma=1):
-        self.xs = np.array(xs)
-        self.ys = np.array(ys)
+
+    # truncate defaults to None, i.e. a weighted average of all the samples,
+    # so that points far from the data are still extrapolated.
+    def __init__(self, xs, ys, sigma=1, truncate=None):
+        order = np.argsort(xs)
+        self.xs = np.array(xs)[order]
+        self.ys = np.array(ys)[order]
         self.sigma = sigma
+        self.truncate = truncate
         self.n = len(xs)
-    
-    def _GetY(self, x):
-        diffs = np.abs(self.xs - x)
-        dists = np.exp(diffs ** 2 / (2*self.sigma ** 2))
-        sims = 1.0 / dists
-        weights = sims / np.sum(sims)
-        return np.sum(np.dot(self.ys, weights))
-    
+
     def __call__(self, xs):
-        return np.array(map(self._GetY, xs))
\ No newline at end of file
+        return GaussianSmooth(self.xs, self.ys, xs, sigma=self.sigma,
+                              truncate=self.truncate)
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+
+import unittest
+import numpy as np
+
+from toolbox import smoothing
+
+
+class TestSmoothing(unittest.TestCase):
+    
+    def testMovingAverage(self):
+        values = np.array([1., 2., 6., 4., 5., 9.])
+        self.assertEqual([1, 3, 4, 5, 6, 9],
+                         smoothing.MovingAverage(values, 3).tolist())
+        self.assertEqual([0, 0, 3.6, 5.2, 0, 0],
+                         smoothing.MovingAverage(values, 5, fill=0).tolist())
+        
+        plate = np.vstack([values, 2 * values])
+        smoothed = smoothing.MovingAverage(plate, 3)
+        self.assertEqual([2, 6, 8, 10, 12, 18], smoothed[1, :].tolist())
+    
+    def testGaussianSmooth(self):
+        xs = np.array([0., 0.5, 3., 3.1, 10.])
+        ys = np.array([1., 3., 2., 4., 5.])
+        smoothed = smoothing.GaussianSmooth(xs, ys, sigma=1.0, truncate=None)
+        for x, y in zip(xs, smoothed):
+            weights = np.exp(-(xs - x) ** 2 / 2.0)
+            self.assertAlmostEqual(np.dot(weights, ys) / weights.sum(), y)
+        
+        # with a truncated window, far points are ignored
+        smoothed = smoothing.GaussianSmooth(xs, ys, [10., 20.], sigma=1.0)
+        self.assertEqual(5, smoothed[0])
+        self.assertTrue(np.isnan(smoothed[1]))
+    
+    def testGaussianSmoothEndpoints(self):
+        # without truncation, even the farthest sample must be used
+        rand = np.random.RandomState(0)
+        sigma = 200.0
+        for _ in xrange(50):
+            xs = np.sort(rand.uniform(0, 10, size=(3, 7)) ** 3, axis=1) / 7.3
+            ys = rand.uniform(-1, 1, size=(3, 7))
+            x_out = np.array([xs.min(), xs.max()])
+            smoothed = smoothing.GaussianSmooth(xs, ys, x_out, sigma=sigma,
+                                                truncate=None)
+            for i in xrange(xs.shape[0]):
+                for j, x in enumerate(x_out):
+                    weights = np.exp(-(xs[i, :] - x) ** 2 / (2 * sigma ** 2))
+                    expected = np.dot(weights, ys[i, :]) / weights.sum()
+                    self.assertAlmostEqual(expected, smoothed[i, j], 12)
+    
+    def testWeightedAverageSmoother(self):
+        xs = np.log([1e-4, 1e-3, 1e-2, 1e-1])
+        ys = np.array([1., 2., 4., 3.])
+        # points far from the data are still a weighted average by default
+        x_out = [np.log(1e-4), 5.0]
+        smoothed = smoothing.WeightedAverageSmoother(xs, ys, sigma=0.7)(x_out)
+        for x, y in zip(x_out, smoothed):
+            weights = np.exp(-(xs - x) ** 2 / (2 * 0.7 ** 2))
+            self.assertAlmostEqual(np.dot(weights, ys) / weights.sum(), y)
+        
+        smoothed = smoothing.WeightedAverageSmoother(xs, ys, sigma=0.7,
+                                                     truncate=4.0)(x_out)
+        self.assertTrue(np.isnan(smoothed[1]))
+    
+    def testGaussianSmoothPerWellTimes(self):
+        times = np.array([[0., 1., 2., 3.], [0., 10., 20., 30.]])
+        readings = np.array([[1., 2., 3., 4.], [1., 2., 3., 4.]])
+        smoothed = smoothing.GaussianSmooth(times, readings, sigma=0.1)
+        np.testing.assert_allclose(readings, smoothed)
+        smoothed = smoothing.GaussianSmooth(times, readings, sigma=5.0)
+        np.testing.assert_allclose(readings[1, :], smoothed[1, :], atol=0.2)
+        self.assertTrue(abs(smoothed[0, 0] - 1) > 0.5)
+
+
+def Suite():
+    return unittest.makeSuite(TestSmoothing, 'test')
+    
+
+if __name__ == '__main__':
+    unittest.main()
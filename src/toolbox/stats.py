@@ -1,6 +1,8 @@
 import numpy as np
 import scipy.stats as st
 
+from toolbox import smoothing
+
 
 def MovingAverage(array_like, window_size=3):
     """Calculates the moving average of the array.
@@ -13,15 +15,7 @@ def MovingAverage(array_like, window_size=3):
     Returns:
         A 1d numpy array of the same length with the averaged points.
     """
-    assert (window_size % 2) == 1
-    side_size = (window_size - 1) / 2
-    
-    N = len(array_like)
-    averaged = array_like.copy()
-    for i in xrange(side_size, N - side_size):
-        averaged[i] = np.mean(array_like[i-side_size:i+side_size+1])
-        
-    return averaged
+    return smoothing.MovingAverage(array_like, window_size)
 
 
 def MeanWithConfidenceInterval(Y, confidence=0.95):